@@ -2,7 +2,8 @@ import contextlib
 import logging
 from collections.abc import AsyncIterator
 from typing import Any
-from database_tools.tools.event_store import InMemoryEventStore
+from database_tools.tools.event_store import InMemoryEventStore, SQLiteEventStore
+import anyio
 import click
 import json
 import mcp.types as types
@@ -12,7 +13,21 @@ from starlette.applications import Starlette
 from starlette.middleware.cors import CORSMiddleware
 from starlette.routing import Mount
 from starlette.types import Receive, Scope, Send
-from database_tools.tools.liqubase import LiquibaseUtils, DatabaseUtil
+from database_tools.tools.liqubase import LiquibaseUtils, DatabaseUtil, MAX_AFFECTED_ROWS
+from database_tools.tools.cursors import get_cursor_registry
+from database_tools.tools.executor import (
+    ToolExecutor,
+    TOOL_WORKERS,
+    DB_CONCURRENCY,
+    LIQUIBASE_CONCURRENCY,
+    LIQUIBASE_LANE,
+)
+from database_tools.tools.workspace import get_workspace_manager
+from database_tools.tools.sandbox import get_sandbox_manager
+from database_tools.tools.embedded import get_embedded_validator
+from database_tools.tools.engines import get_engine_registry
+from database_tools.tools.privileges import get_privilege_cache
+from database_tools.tools.runner import RUNNER, POOL_SIZE, create_runner, set_runner
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -31,7 +46,55 @@ logger = logging.getLogger(__name__)
     default=False,
     help="Enable JSON responses instead of SSE streams",
 )
-def main(port: int, log_level: str, json_response: bool,) -> int:
+@click.option(
+    "--tool-workers",
+    default=TOOL_WORKERS,
+    help="Max number of blocking tool calls (liquibase/database) running at once",
+)
+@click.option(
+    "--db-concurrency",
+    default=DB_CONCURRENCY,
+    help="Max number of read-only queries running at once against the same database",
+)
+@click.option(
+    "--liquibase-concurrency",
+    default=LIQUIBASE_CONCURRENCY,
+    help="Max number of liquibase validations running at once against the same database",
+)
+@click.option(
+    "--runner",
+    default=RUNNER,
+    type=click.Choice(["subprocess", "pool"]),
+    help="How to run liquibase: a new process per call, or a pool of warm worker processes",
+)
+@click.option(
+    "--runner-pool-size",
+    default=POOL_SIZE,
+    help="Number of warm liquibase worker processes when --runner=pool",
+)
+@click.option(
+    "--event-store",
+    default="memory",
+    type=click.Choice(["memory", "sqlite"]),
+    help="Event store for stream resumability: in-memory, or SQLite (survives restarts, shared by workers)",
+)
+@click.option(
+    "--event-store-path",
+    default="/tmp/database_tools_events.db",
+    help="SQLite database file when --event-store=sqlite",
+)
+def main(
+    port: int,
+    log_level: str,
+    json_response: bool,
+    tool_workers: int,
+    db_concurrency: int,
+    liquibase_concurrency: int,
+    runner: str,
+    runner_pool_size: int,
+    event_store: str,
+    event_store_path: str,
+) -> int:
     # 配置日志
     logging.basicConfig(
         level=getattr(logging, log_level.upper()),
@@ -39,6 +102,16 @@ def main(port: int, log_level: str, json_response: bool,) -> int:
     )
 
     app = Server("mcp-streamable")
+    # 阻塞的工具调用在工作线程中执行, 不阻塞事件循环
+    executor = ToolExecutor(
+        workers=tool_workers,
+        db_concurrency=db_concurrency,
+        liquibase_concurrency=liquibase_concurrency,
+    )
+    # 清理上次进程被强制结束时遗留的工作目录
+    get_workspace_manager().purge_stale()
+    liquibase_runner = create_runner(runner, size=runner_pool_size)
+    set_runner(liquibase_runner)
 
     @app.call_tool()
     async def call_tool(name: str, arguments: dict[str, Any]) -> list[types.ContentBlock]:
@@ -58,7 +131,60 @@ def main(port: int, log_level: str, json_response: bool,) -> int:
             logger.debug(f"execute changeSet {liquibase_script}")
 
             liquibaseTool = LiquibaseUtils(db_config=db_config, liquibase_script=liquibase_script)
-            result = liquibaseTool.execute_liquibase()
+            result = await executor.run(db_config, liquibaseTool.execute_liquibase, lane=LIQUIBASE_LANE)
+            return [
+                types.TextContent(
+                    type="text",
+                    text=json.dumps(result),
+                )
+            ]
+        elif name == "validate-liquibase-changelog":
+            changesets = arguments.get("changesets") or []
+            db_config = arguments.get("db_config")
+            try:
+                liquibase_script = LiquibaseUtils.build_changelog(changesets)
+            except ValueError as e:
+                return [types.TextContent(type="text", text=json.dumps({"status": "error", "message": str(e)}))]
+
+            await ctx.session.send_log_message(
+                    level="info",
+                    data=f"批量验证 {len(changesets)} 个changeSet",
+                    logger="notification_stream",
+                    related_request_id=ctx.request_id,
+                )
+            progress_token = ctx.meta.progressToken if ctx.meta else None
+
+            async def notify(progress: float, total: float, message: str):
+                if progress_token is not None:
+                    await ctx.session.send_progress_notification(
+                        progress_token, progress, total, message=message, related_request_id=ctx.request_id
+                    )
+                await ctx.session.send_log_message(
+                    level="info",
+                    data=message,
+                    logger="notification_stream",
+                    related_request_id=ctx.request_id,
+                )
+
+            # 进度回调在执行 liquibase 的线程中调用, 通过 token 回到事件循环发送通知
+            token = anyio.lowlevel.current_token()
+
+            def on_progress(progress: float, total: float, message: str):
+                try:
+                    anyio.from_thread.run(notify, progress, total, message, token=token)
+                except Exception as e:
+                    logger.debug(f"send progress failed: {e}")
+
+            liquibaseTool = LiquibaseUtils(db_config=db_config, liquibase_script=liquibase_script)
+            result = await executor.run(
+                db_config, liquibaseTool.validate_changelog, on_progress, lane=LIQUIBASE_LANE
+            )
+            await ctx.session.send_log_message(
+                    level="info",
+                    data=f"批量验证完成: 通过 {result['passed']} 个, 失败 {result['failed']} 个, 未完成验证 {result['unverified']} 个, 未执行 {result['not_run']} 个",
+                    logger="notification_stream",
+                    related_request_id=ctx.request_id,
+                )
             return [
                 types.TextContent(
                     type="text",
@@ -79,7 +205,7 @@ def main(port: int, log_level: str, json_response: bool,) -> int:
             logger.debug(f"execute changeSet {change_sets}")
 
             liquibaseTool = LiquibaseUtils(db_config=db_config, liquibase_script=change_sets)
-            result = liquibaseTool.check_changeset()
+            result = await executor.run(db_config, liquibaseTool.check_changeset, lane=LIQUIBASE_LANE)
             return [
                 types.TextContent(
                     type="text",
@@ -90,6 +216,9 @@ def main(port: int, log_level: str, json_response: bool,) -> int:
             # 处理数据库查询
             query_sql = arguments.get("query_sql")
             db_config = arguments.get("db_config", None)
+            mode = arguments.get("mode", "capped")
+            page_size = int(arguments.get("page_size", MAX_AFFECTED_ROWS))
+            cursor = arguments.get("cursor")
             
             # 发送查询开始日志
             await ctx.session.send_log_message(
@@ -102,7 +231,13 @@ def main(port: int, log_level: str, json_response: bool,) -> int:
             try:
                 # 执行数据库查询
                 db = DatabaseUtil(db_config)
-                result = db.query_result_of_prod_by_sql(query_sql)
+                if cursor:
+                    # 分页查询读取下一页
+                    result = await executor.run(db_config, DatabaseUtil.fetch_page, cursor, page_size)
+                else:
+                    result = await executor.run(
+                        db_config, db.query_result_of_prod_by_sql, query_sql, mode, page_size
+                    )
                 
                 # 发送查询完成日志
                 await ctx.session.send_log_message(
@@ -112,7 +247,7 @@ def main(port: int, log_level: str, json_response: bool,) -> int:
                     related_request_id=ctx.request_id,
                 )
                 
-                return [types.TextContent(type="text", text=json.dumps(result))]
+                return [types.TextContent(type="text", text=json.dumps(result, default=str))]
                 
             except Exception as e:
                 error_msg = f"Database query failed: {str(e)}"
@@ -123,6 +258,29 @@ def main(port: int, log_level: str, json_response: bool,) -> int:
                     related_request_id=ctx.request_id,
                 )
                 return [types.TextContent(type="text", text=error_msg)]
+        elif name == "estimate-affected-rows":
+            change_sql = arguments.get("change_sql")
+            db_config = arguments.get("db_config")
+            try:
+                db = DatabaseUtil(db_config)
+                result = await executor.run(db_config, db.estimate_affected_rows, change_sql)
+                if result["status"] == "success":
+                    await ctx.session.send_log_message(
+                        level="info",
+                        data=f"估算影响{result['estimated_rows']}条记录, 索引 {result['index']}, 全表扫描 {result['full_scan']}",
+                        logger="database",
+                        related_request_id=ctx.request_id,
+                    )
+                return [types.TextContent(type="text", text=json.dumps(result, default=str))]
+            except Exception as e:
+                error_msg = f"Estimate affected rows failed: {str(e)}"
+                await ctx.session.send_log_message(
+                    level="error",
+                    data=error_msg,
+                    logger="database",
+                    related_request_id=ctx.request_id,
+                )
+                return [types.TextContent(type="text", text=error_msg)]
         elif name == "create_change_id":
             # 处理数据库查询
             db_name = arguments.get("db_name")
@@ -137,7 +295,8 @@ def main(port: int, log_level: str, json_response: bool,) -> int:
             
             try:
                 # 执行数据库查询
-                result = LiquibaseUtils.create_liquibase_change_id(db_name)
+                # 预留序号时会等待 sqlite 的写锁, 放到线程中执行, 不阻塞事件循环
+                result = await anyio.to_thread.run_sync(LiquibaseUtils.create_liquibase_change_id, db_name)
                 
                 # 发送查询完成日志
                 await ctx.session.send_log_message(
@@ -159,6 +318,42 @@ def main(port: int, log_level: str, json_response: bool,) -> int:
                     related_request_id=ctx.request_id,
                 )
                 return [types.TextContent(type="text", text=error_msg)]
+        elif name == "schema-fingerprint":
+            db_config = arguments.get("db_config")
+            try:
+                db = DatabaseUtil(db_config)
+                result = await executor.run(db_config, db.schema_fingerprint)
+                return [types.TextContent(type="text", text=json.dumps(result))]
+            except Exception as e:
+                error_msg = f"schema fingerprint failed: {str(e)}"
+                await ctx.session.send_log_message(
+                    level="error",
+                    data=error_msg,
+                    logger="database",
+                    related_request_id=ctx.request_id,
+                )
+                return [types.TextContent(type="text", text=error_msg)]
+        elif name == "server-stats":
+            result = {
+                "executor": executor.stats(),
+                "runner": liquibase_runner.stats(),
+                "workspaces": get_workspace_manager().stats(),
+                "sandboxes": get_sandbox_manager().stats(),
+                "embedded": get_embedded_validator().stats(),
+                "engines": get_engine_registry().stats(),
+                "privileges": get_privilege_cache().stats(),
+                "cursors": get_cursor_registry().stats(),
+                "event_store": store.stats(),
+            }
+            return [types.TextContent(type="text", text=json.dumps(result))]
+        elif name == "invalidate-privilege-cache":
+            db_config = arguments.get("db_config")
+            if db_config:
+                db_info = json.loads(db_config)
+                get_privilege_cache().invalidate(db_info["db_url"], db_info["username"])
+            else:
+                get_privilege_cache().invalidate()
+            return [types.TextContent(type="text", text=json.dumps({"status": "success"}))]
         else:
             return [types.TextContent(type="text", text=f"Unknown tool: {name}")]
 
@@ -189,6 +384,26 @@ UPDATE t_users SET nick_name='Tom', open_id=1 WHERE id=1;
                     },
                 },
             ),
+            types.Tool(
+                name="validate-liquibase-changelog",
+                description=("批量验证多个changeSet: 合并为一个changelog只执行一次更新和回滚, 返回每个changeSet的结果(success/error/unverified/not_run), 执行过程中发送进度通知"),
+                strict=True,
+                inputSchema={
+                    "type": "object",
+                    "required": ["changesets", "db_config"],
+                    "properties": {
+                        "changesets": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "changeSet 脚本列表, 每个脚本的格式与 validate-liquibase-script 的 liquibase_script 相同, changeSet 的 作者:id 不能重复",
+                        },
+                        "db_config": {
+                            "type": "string",
+                            "description": "数据库配置的json串(数据库地址、用户和密码){'db_url':'localhost:3306','db_name':'applier','username':'root', 'pwd':'Admin@123'}",
+                        }
+                    },
+                },
+            ),
             types.Tool(
                 name="query-affected-data-of-update",
                 description="查询变更sql对应的查询语句影响的行数，为回滚作准备",
@@ -200,6 +415,19 @@ UPDATE t_users SET nick_name='Tom', open_id=1 WHERE id=1;
                         "query_sql": {
                             "type": "string",
                             "description": "查询更新语句影响的数据量"
+                        },
+                        "mode": {
+                            "type": "string",
+                            "enum": ["capped", "count", "paged"],
+                            "description": "capped(默认): 最多返回100条, 超过100条时 truncated 为 true; count: 只返回影响的记录数; paged: 分页返回全部记录",
+                        },
+                        "page_size": {
+                            "type": "integer",
+                            "description": "paged 模式每页的记录数, 默认100",
+                        },
+                        "cursor": {
+                            "type": "string",
+                            "description": "paged 模式读取下一页时传入上一页返回的 cursor",
                         },
                          "db_config": {
                             "type": "string",
@@ -208,6 +436,25 @@ UPDATE t_users SET nick_name='Tom', open_id=1 WHERE id=1;
                     },
                 },
             ),
+            types.Tool(
+                name="estimate-affected-rows",
+                description="用 EXPLAIN 估算 UPDATE/DELETE 在生产数据库影响的行数(不执行查询), 返回估算行数、使用的索引和是否全表扫描",
+                strict=True,
+                inputSchema={
+                    "type": "object",
+                    "required": ["change_sql", "db_config"],
+                    "properties": {
+                        "change_sql": {
+                            "type": "string",
+                            "description": "变更的 UPDATE/DELETE 语句",
+                        },
+                        "db_config": {
+                            "type": "string",
+                            "description": "数据库配置{'db_url':'localhost:3306','db_name':'applier','username':'readonly', 'pwd':'Admin@123'}",
+                        }
+                    },
+                },
+            ),
             types.Tool(
                 name="create_change_id",
                 description="在同一个变更的数据库中保持唯一的id",
@@ -222,16 +469,54 @@ UPDATE t_users SET nick_name='Tom', open_id=1 WHERE id=1;
                         }
                     },
                 },
+            ),
+            types.Tool(
+                name="schema-fingerprint",
+                description="计算数据库表结构的指纹, 表结构变化时指纹随之变化(供客户端缓存使用, 生成changeSet时无需调用)",
+                strict=True,
+                inputSchema={
+                    "type": "object",
+                    "required": ["db_config"],
+                    "properties": {
+                        "db_config": {
+                            "type": "string",
+                            "description": "数据库配置的json串{'db_url':'localhost:3306','db_name':'applier','username':'root', 'pwd':'Admin@123'}",
+                        }
+                    },
+                },
+            ),
+            types.Tool(
+                name="server-stats",
+                description="查看服务的运行指标(工具执行线程、liquibase 执行器、工作目录、沙箱库、数据库连接池、事件存储), 用于排查问题, 生成changeSet时无需调用",
+                strict=True,
+                inputSchema={"type": "object", "properties": {}},
+            ),
+            types.Tool(
+                name="invalidate-privilege-cache",
+                description="用户权限变更后清除只读权限检查的缓存, 不传 db_config 时清除全部, 生成changeSet时无需调用",
+                strict=True,
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "db_config": {
+                            "type": "string",
+                            "description": "数据库配置的json串{'db_url':'localhost:3306','db_name':'applier','username':'readonly', 'pwd':'Admin@123'}",
+                        }
+                    },
+                },
             )
         ]
 
     # 创建事件存储（用于恢复）
-    event_store = InMemoryEventStore()
+    if event_store == "sqlite":
+        store = SQLiteEventStore(event_store_path)
+    else:
+        store = InMemoryEventStore()
 
     # 创建会话管理器
     session_manager = StreamableHTTPSessionManager(
         app=app,
-        event_store=event_store,  # 启用恢复功能
+        event_store=store,  # 启用恢复功能
         json_response=json_response,
     )
 
@@ -248,6 +533,12 @@ UPDATE t_users SET nick_name='Tom', open_id=1 WHERE id=1;
                 yield
             finally:
                 logger.info("Application shutting down...")
+                liquibase_runner.close()
+                get_cursor_registry().close_all()
+                get_sandbox_manager().close_all()
+                if isinstance(store, SQLiteEventStore):
+                    await store.close()
+                get_engine_registry().dispose_all()
 
     # 创建 ASGI 应用
     starlette_app = Starlette(
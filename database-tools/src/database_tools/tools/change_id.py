@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import contextlib
+import threading
+from datetime import datetime
+
+# 保存 changeSet 序号的 sqlite 文件, 同一台机器上的所有 worker 共用
+CHANGE_ID_DB = os.getenv("DATABASE_TOOLS_CHANGE_ID_DB", "/tmp/database_tools_change_ids.db")
+# 每个进程一次预留的序号个数
+CHANGE_ID_BLOCK = int(os.getenv("DATABASE_TOOLS_CHANGE_ID_BLOCK", "20"))
+
+
+class ChangeIdAllocator:
+    """
+    按 (数据库名称, 日期) 分配 changeSet 序号
+
+    序号保存在 sqlite 中, 重启后继续递增, 多个 worker 之间不会重复。
+    每个进程一次从 sqlite 预留一段序号(block), 用完才再次预留,
+    大部分分配只在内存中完成, 并发生成时不会排队等待文件锁。
+    进程退出时没有用完的序号会被跳过, 序号保证唯一和递增, 不保证连续。
+    """
+
+    def __init__(self, path: str = CHANGE_ID_DB, block_size: int = CHANGE_ID_BLOCK):
+        self.path = path
+        self.block_size = max(1, block_size)
+        # (数据库名称, 日期) -> [下一个序号, 预留的结束序号(不含)]
+        self._blocks: dict[tuple[str, str], list[int]] = {}
+        self._locks: dict[tuple[str, str], threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        # sqlite3 连接的 with 只提交事务, 不会关闭连接
+        with contextlib.closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS change_id_sequences ("
+                "db_name TEXT NOT NULL, day TEXT NOT NULL, next_value INTEGER NOT NULL, "
+                "PRIMARY KEY (db_name, day))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _lock_for(self, key: tuple[str, str]) -> threading.Lock:
+        with self._locks_lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def allocate(self, db_name: str, day: str | None = None) -> int:
+        """分配一个序号, day 格式为 YYYYMMDD, 默认为当天"""
+        day = day or datetime.now().strftime("%Y%m%d")
+        key = (db_name, day)
+        with self._lock_for(key):
+            block = self._blocks.get(key)
+            if block is None or block[0] >= block[1]:
+                block = self._blocks[key] = self._reserve(db_name, day)
+            value = block[0]
+            block[0] += 1
+            return value
+
+    def _reserve(self, db_name: str, day: str) -> list[int]:
+        """在 sqlite 中原子地预留一段序号"""
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE 立即获取写锁, 多个进程同时预留时排队
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT next_value FROM change_id_sequences WHERE db_name = ? AND day = ?",
+                (db_name, day),
+            ).fetchone()
+            start = row[0] if row else 1
+            conn.execute(
+                "INSERT INTO change_id_sequences (db_name, day, next_value) VALUES (?, ?, ?) "
+                "ON CONFLICT (db_name, day) DO UPDATE SET next_value = excluded.next_value",
+                (db_name, day, start + self.block_size),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return [start, start + self.block_size]
+
+
+_allocator: ChangeIdAllocator | None = None
+_allocator_lock = threading.Lock()
+
+
+def get_change_id_allocator() -> ChangeIdAllocator:
+    """进程级共享的序号分配器"""
+    global _allocator
+    with _allocator_lock:
+        if _allocator is None:
+            _allocator = ChangeIdAllocator()
+        return _allocator
@@ -0,0 +1,133 @@
+import os
+import uuid
+import logging
+import threading
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+# 验证使用的 DATABASECHANGELOG / DATABASECHANGELOGLOCK 表:
+# request 每次调用使用独立的表, 调用结束后删除; shared 使用 liquibase 默认的表
+CHANGELOG_TABLES = os.getenv("DATABASE_TOOLS_CHANGELOG_TABLES", "request")
+# 独立表的表名前缀, 用于识别和清理遗留的表
+CHANGELOG_TABLE_PREFIX = os.getenv("DATABASE_TOOLS_CHANGELOG_TABLE_PREFIX", "dbcl_")
+# 清理多久以前遗留的独立表(秒), 进程被强制结束时表来不及删除
+STALE_TABLE_AGE = int(os.getenv("DATABASE_TOOLS_STALE_CHANGELOG_TABLE_AGE", "86400"))
+# 验证结束时还有变更没有回滚, changelog 表改名为 <前缀>kept_xxx 保留, 不会被清理
+KEPT_TABLE_INFIX = "kept_"
+
+
+def _like_prefix(prefix: str) -> str:
+    """LIKE 中转义前缀里的 _"""
+    return prefix.replace("\\", "\\\\").replace("_", "\\_").replace("%", "\\%") + "%"
+
+
+class ChangelogTables:
+    """
+    一次验证使用的 changelog 表和锁表
+
+    通过 --database-changelog-table-name / --database-changelog-lock-table-name 传给 liquibase,
+    并发的验证各自持有自己的锁, 历史记录互不影响, 回滚只会回滚本次执行的 changeSet。
+    """
+
+    def __init__(self, mode: str = CHANGELOG_TABLES, prefix: str = CHANGELOG_TABLE_PREFIX):
+        self.mode = mode
+        if mode == "shared":
+            self.changelog = self.lock = self.kept = None
+        else:
+            suffix = uuid.uuid4().hex[:12]
+            self.changelog = f"{prefix}{suffix}"
+            self.lock = f"{prefix}{suffix}_lock"
+            self.kept = f"{prefix}{KEPT_TABLE_INFIX}{suffix}"
+
+    def args(self) -> list[str]:
+        """liquibase 的命令行参数"""
+        if self.changelog is None:
+            return []
+        return [
+            f"--database-changelog-table-name={self.changelog}",
+            f"--database-changelog-lock-table-name={self.lock}",
+        ]
+
+    def applied_count(self, engine) -> int:
+        """changelog 表中还没有回滚的 changeSet 数, 表不存在(liquibase 没有执行)时为 0"""
+        if self.changelog is None:
+            return 0
+        try:
+            with engine.connect() as conn:
+                return conn.execute(text(f"SELECT COUNT(*) FROM {self.changelog}")).scalar() or 0
+        except SQLAlchemyError:
+            return 0
+
+    def release(self, engine):
+        """
+        验证结束时调用: 变更都已回滚时删除表,
+        否则保留 changelog 表(改名为 <前缀>kept_xxx), 库中的变更仍有记录, 只删除锁表
+        """
+        if self.changelog is None:
+            return
+        applied = self.applied_count(engine)
+        if not applied:
+            self.drop(engine)
+            return
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {self.changelog} RENAME TO {self.kept}"))
+                conn.execute(text(f"DROP TABLE IF EXISTS {self.lock}"))
+        except SQLAlchemyError as e:
+            logger.warning(f"保留 changelog 表 {self.changelog} 失败: {e}")
+            return
+        logger.warning(f"验证后还有{applied}个 changeSet 没有回滚, 记录保留在 changelog 表 {self.kept}")
+
+    def drop(self, engine):
+        """删除本次验证的表, 失败时只记录日志"""
+        if self.changelog is None:
+            return
+        try:
+            with engine.begin() as conn:
+                for table in (self.changelog, self.lock):
+                    conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        except SQLAlchemyError as e:
+            logger.warning(f"删除 changelog 表 {self.changelog} 失败: {e}")
+
+
+_purged: set[tuple] = set()
+_purged_lock = threading.Lock()
+
+
+def purge_stale_tables(
+    engine, key: tuple, db_name: str, prefix: str = CHANGELOG_TABLE_PREFIX, max_age: int = STALE_TABLE_AGE
+) -> int:
+    """
+    删除遗留的独立 changelog 表, 每个进程对同一个库只清理一次
+    保留的 <前缀>kept_ 表记录着没有回滚的变更, 不会删除
+
+    Returns:
+        删除的表数
+    """
+    with _purged_lock:
+        if key in _purged:
+            return 0
+        _purged.add(key)
+    pattern = _like_prefix(prefix)
+    kept = _like_prefix(prefix + KEPT_TABLE_INFIX)
+    try:
+        with engine.begin() as conn:
+            tables = conn.execute(
+                text(
+                    "SELECT TABLE_NAME FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = :db AND TABLE_NAME LIKE :pattern "
+                    "AND TABLE_NAME NOT LIKE :kept "
+                    "AND CREATE_TIME < NOW() - INTERVAL :age SECOND"
+                ),
+                {"db": db_name, "pattern": pattern, "kept": kept, "age": max_age},
+            ).scalars().all()
+            for table in tables:
+                conn.execute(text(f"DROP TABLE IF EXISTS `{table}`"))
+    except SQLAlchemyError as e:
+        logger.warning(f"清理遗留的 changelog 表失败: {e}")
+        return 0
+    if tables:
+        logger.info(f"清理遗留的 changelog 表 {tables}")
+    return len(tables)
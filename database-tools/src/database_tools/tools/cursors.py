@@ -0,0 +1,139 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from sqlalchemy import text
+from database_tools.tools.engines import ENGINE_POOL_SIZE, ENGINE_MAX_OVERFLOW
+
+logger = logging.getLogger(__name__)
+
+# 分页查询的游标多久没有读取就关闭(秒)
+CURSOR_TTL = float(os.getenv("DATABASE_TOOLS_CURSOR_TTL", "60"))
+# 同时打开的游标数, 每个游标占用一个数据库连接,
+# 小于每个库的连接池容量, 游标占满时其它查询仍有连接可用
+_POOL_CAPACITY = ENGINE_POOL_SIZE + ENGINE_MAX_OVERFLOW
+MAX_CURSORS = max(
+    1, min(int(os.getenv("DATABASE_TOOLS_MAX_CURSORS", str(_POOL_CAPACITY - 1))), _POOL_CAPACITY - 1)
+)
+
+
+class _Cursor:
+    __slots__ = ("conn", "result", "last_used", "fetched", "lock")
+
+    def __init__(self, conn, result):
+        self.conn = conn
+        self.result = result
+        self.last_used = time.time()
+        self.fetched = 0
+        self.lock = threading.Lock()
+
+    def close(self, finished: bool = False):
+        """
+        关闭游标并归还连接
+
+        没有读完时关闭 SSCursor 会把剩余的结果全部读完再丢弃,
+        所以直接作废连接(断开与数据库的连接), 不归还到连接池
+        """
+        if finished:
+            try:
+                self.result.close()
+            finally:
+                self.conn.close()
+            return
+        try:
+            self.conn.invalidate()
+        finally:
+            self.conn.close()
+
+
+class CursorRegistry:
+    """
+    分页查询使用的服务端游标
+
+    第一页打开游标(pymysql 的 SSCursor, 不会把全部结果读到内存),
+    返回续读的 token, 之后每次调用用 token 读取下一页, 读完或超时后关闭游标、归还连接。
+    """
+
+    def __init__(self, ttl: float = CURSOR_TTL, max_cursors: int = MAX_CURSORS):
+        self.ttl = ttl
+        self.max_cursors = max_cursors
+        self._cursors: dict[str, _Cursor] = {}
+        self._lock = threading.Lock()
+
+    def open(self, engine, sql: str) -> str:
+        with self._lock:
+            self._prune()
+            if len(self._cursors) >= self.max_cursors:
+                raise RuntimeError("打开的分页查询过多, 请先读完或等待之前的分页查询超时")
+        conn = engine.connect().execution_options(stream_results=True)
+        try:
+            result = conn.execute(text(sql))
+        except Exception:
+            conn.close()
+            raise
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._cursors[token] = _Cursor(conn, result)
+        return token
+
+    def fetch(self, token: str, size: int) -> dict:
+        """
+        读取下一页
+
+        Returns:
+            {"data": [...], "offset": 本页第一条的序号, "cursor": 下一页的 token, 读完时为 None}
+        """
+        with self._lock:
+            self._prune()
+            cursor = self._cursors.get(token)
+        if cursor is None:
+            raise KeyError("分页查询已经结束或超时, 请重新查询")
+        with cursor.lock:
+            rows = cursor.result.mappings().fetchmany(size)
+            offset = cursor.fetched
+            cursor.fetched += len(rows)
+            cursor.last_used = time.time()
+            done = len(rows) < size
+        if done:
+            self.close(token, finished=True)
+        return {
+            "data": [dict(row) for row in rows],
+            "offset": offset,
+            "cursor": None if done else token,
+        }
+
+    def close(self, token: str, finished: bool = False):
+        with self._lock:
+            cursor = self._cursors.pop(token, None)
+        if cursor is not None:
+            cursor.close(finished)
+
+    def _prune(self):
+        now = time.time()
+        expired = [
+            token
+            for token, cursor in self._cursors.items()
+            if now - cursor.last_used > self.ttl and not cursor.lock.locked()
+        ]
+        for token in expired:
+            logger.info(f"关闭超时的分页查询 {token}")
+            self._cursors.pop(token).close()
+
+    def close_all(self):
+        with self._lock:
+            cursors = list(self._cursors.values())
+            self._cursors.clear()
+        for cursor in cursors:
+            cursor.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"open": len(self._cursors), "max": self.max_cursors}
+
+
+_cursor_registry = CursorRegistry()
+
+
+def get_cursor_registry() -> CursorRegistry:
+    return _cursor_registry
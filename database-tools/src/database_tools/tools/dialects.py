@@ -0,0 +1,68 @@
+from dataclasses import dataclass
+from urllib.parse import quote
+
+
+@dataclass(frozen=True)
+class Dialect:
+    """
+    数据库类型对应的 JDBC 驱动和连接串
+
+    URL 模板中可以使用 db_config 的字段 {db_url} {db_name} {username} {pwd},
+    sqlite 的 db_url 为文件路径。
+    """
+
+    name: str
+    jdbc_driver: str
+    jdbc_url: str
+    # 没有 SQLAlchemy 驱动时为 None, 不能使用查询类的工具
+    sqlalchemy_url: str | None
+    # 嵌入式快速验证时 H2 使用的兼容模式, None 表示不支持快速验证
+    h2_mode: str | None = None
+
+    def jdbc_url_for(self, db_info: dict) -> str:
+        return self.jdbc_url.format(**db_info)
+
+    def sqlalchemy_url_for(self, db_info: dict) -> str:
+        if self.sqlalchemy_url is None:
+            raise ValueError(f"{self.name} 不支持查询类的工具")
+        return self.sqlalchemy_url.format(
+            **{**db_info, "username": quote(db_info.get("username", "")), "pwd": quote(db_info.get("pwd", ""))}
+        )
+
+
+DIALECTS = {
+    "mysql": Dialect(
+        "mysql",
+        "com.mysql.cj.jdbc.Driver",
+        "jdbc:mysql://{db_url}/{db_name}",
+        "mysql+pymysql://{username}:{pwd}@{db_url}/{db_name}",
+        h2_mode="MySQL",
+    ),
+    "postgresql": Dialect(
+        "postgresql",
+        "org.postgresql.Driver",
+        "jdbc:postgresql://{db_url}/{db_name}",
+        "postgresql+psycopg://{username}:{pwd}@{db_url}/{db_name}",
+    ),
+    # db_url 为 H2 的连接地址, 如 tcp://localhost:9090/mem:dev(examples/start-h2)
+    "h2": Dialect("h2", "org.h2.Driver", "jdbc:h2:{db_url}", None),
+    "sqlite": Dialect("sqlite", "org.sqlite.JDBC", "jdbc:sqlite:{db_url}", "sqlite:///{db_url}"),
+}
+
+# 页面和旧配置中使用的名称
+_ALIASES = {
+    "postgre": "postgresql",
+    "postgres": "postgresql",
+    "pg": "postgresql",
+    "mariadb": "mysql",
+}
+
+
+def get_dialect(name: str | None) -> Dialect:
+    """根据 db_config 的 dialect 获取数据库类型, 不填写时为 mysql"""
+    key = (name or "mysql").lower()
+    key = _ALIASES.get(key, key)
+    dialect = DIALECTS.get(key)
+    if dialect is None:
+        raise ValueError(f"不支持的数据库类型: {name}, 支持 {', '.join(DIALECTS)}")
+    return dialect
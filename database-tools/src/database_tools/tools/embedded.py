@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+import subprocess
+from database_tools.tools.dialects import get_dialect
+from database_tools.tools.runner import get_runner
+from database_tools.tools.sandbox import create_backend, ddl_digest
+from database_tools.tools.workspace import get_workspace_manager
+
+logger = logging.getLogger(__name__)
+
+# 是否先在嵌入式 H2 数据库中快速验证, 全部通过时不再到开发库验证, 否则仍到开发库验证
+EMBEDDED_FAST_PATH = os.getenv("DATABASE_TOOLS_EMBEDDED_FAST_PATH", "off")
+# 缓存的表结构多久重新读取一次(秒)
+EMBEDDED_DDL_TTL = float(os.getenv("DATABASE_TOOLS_EMBEDDED_DDL_TTL", "600"))
+
+_H2_OPTIONS = "DATABASE_TO_LOWER=TRUE;CASE_INSENSITIVE_IDENTIFIERS=TRUE"
+
+
+class EmbeddedValidator:
+    """
+    在 liquibase 进程内的 H2 数据库中验证 changeSet 的语法和回滚
+
+    按目标库缓存的表结构建好 H2 模板库(兼容模式与目标库一致), 每次验证复制一份到工作目录,
+    执行 update-testing-rollback。H2 不启动服务, 也不访问开发库, 比远程验证快得多。
+    """
+
+    def __init__(self, root: str | None = None, ddl_ttl: float = EMBEDDED_DDL_TTL):
+        self.root = root or get_workspace_manager().shared_dir("embedded")
+        self.ddl_ttl = ddl_ttl
+        # 目标库 -> (读取时间, 表结构版本)
+        self._versions: dict[tuple, tuple[float, str]] = {}
+        # (表结构版本, 兼容模式) -> 模板库路径(不含 .mv.db), 建模板失败时为 None
+        self._templates: dict[tuple[str, str], str | None] = {}
+        # 每个目标库和每个模板各自的锁, 读取表结构和建模板时不阻塞其它库
+        self._locks: dict[tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.skipped = 0
+
+    @staticmethod
+    def _cmd(db_path: str, mode: str, search_path: str, change_log_file: str, *command: str) -> list[str]:
+        return [
+            "liquibase",
+            "--driver=org.h2.Driver",
+            f"--changeLogFile={change_log_file}",
+            f"--url=jdbc:h2:file:{db_path};MODE={mode};{_H2_OPTIONS}",
+            "--username=sa",
+            "--password=",
+            f"--searchPath={search_path}",
+            *command,
+        ]
+
+    def _lock_for(self, key: tuple) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _template(self, db_config: str, mode: str) -> str | None:
+        db_info = json.loads(db_config)
+        key = (db_info["db_url"], db_info["db_name"], mode)
+        backend = create_backend(db_config)
+        ddl = None
+        with self._lock_for(("ddl", *key)):
+            with self._lock:
+                cached = self._versions.get(key)
+            if cached is None or time.time() - cached[0] > self.ddl_ttl:
+                ddl = backend.fetch_ddl()
+                version = ddl_digest(ddl)
+                with self._lock:
+                    self._versions[key] = (time.time(), version)
+            else:
+                version = cached[1]
+        # 表结构相同的库共用一个模板, 同一个模板只建一次
+        with self._lock_for(("template", version, mode)):
+            with self._lock:
+                if (version, mode) in self._templates:
+                    return self._templates[(version, mode)]
+            if ddl is None:
+                ddl = backend.fetch_ddl()
+            path = os.path.join(self.root, f"template_{version[:16]}_{mode.lower()}")
+            template = path if self._build_template(path, mode, ddl) else None
+            with self._lock:
+                self._templates[(version, mode)] = template
+            return template
+
+    def _build_template(self, path: str, mode: str, ddl: list[tuple[str, str]]) -> bool:
+        """用一个 changeSet 在 H2 中创建全部表, 表结构不兼容 H2 时返回 False(跳过快速验证)"""
+        for suffix in (".mv.db", ".trace.db"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        with get_workspace_manager().workspace("embedded_seed") as workspace:
+            seed = "--liquibase formatted sql\n\n--changeset embedded:seed splitStatements:true endDelimiter:;\n"
+            seed += "".join(f"{create_sql};\n" for _, create_sql in ddl)
+            workspace.write_file("seed.sql", seed)
+            cmd = self._cmd(
+                path, mode, workspace.path, "seed.sql",
+                "--database-changelog-table-name=embedded_seed_changelog",
+                "--database-changelog-lock-table-name=embedded_seed_changelog_lock",
+                "update",
+            )
+            output = get_runner().run(cmd)
+            if output.returncode != 0:
+                workspace.mark_failed()
+                logger.warning(f"表结构不兼容 H2({mode}), 跳过快速验证: {output.stderr[-500:]}")
+                return False
+        return True
+
+    def run(self, db_config: str, liquibase_script: str) -> subprocess.CompletedProcess | None:
+        """
+        在嵌入式数据库中执行 update-testing-rollback
+
+        Returns:
+            liquibase 的执行结果, 目标库不支持快速验证或建模板失败时返回 None
+        """
+        dialect = get_dialect(json.loads(db_config).get("dialect"))
+        if dialect.h2_mode is None:
+            self.skipped += 1
+            return None
+        try:
+            template = self._template(db_config, dialect.h2_mode)
+        except Exception as e:
+            logger.warning(f"读取表结构失败, 跳过快速验证: {e}")
+            template = None
+        if template is None:
+            self.skipped += 1
+            return None
+        self.runs += 1
+        with get_workspace_manager().workspace("embedded") as workspace:
+            db_path = os.path.join(workspace.path, "embedded")
+            shutil.copyfile(f"{template}.mv.db", f"{db_path}.mv.db")
+            workspace.write_file("changelog.sql", f"--liquibase formatted sql\n\n{liquibase_script}")
+            cmd = self._cmd(
+                db_path, dialect.h2_mode, workspace.path, "changelog.sql", "--log-level=INFO", "update-testing-rollback"
+            )
+            output = get_runner().run(cmd)
+            if output.returncode != 0:
+                workspace.mark_failed()
+        return output
+
+    def stats(self) -> dict:
+        with self._lock:
+            templates = sum(1 for path in self._templates.values() if path)
+        return {"enabled": EMBEDDED_FAST_PATH == "on", "runs": self.runs, "skipped": self.skipped, "templates": templates}
+
+
+_embedded_validator: EmbeddedValidator | None = None
+_embedded_lock = threading.Lock()
+
+
+def get_embedded_validator() -> EmbeddedValidator:
+    """进程级共享的嵌入式验证器"""
+    global _embedded_validator
+    with _embedded_lock:
+        if _embedded_validator is None:
+            _embedded_validator = EmbeddedValidator()
+        return _embedded_validator
@@ -0,0 +1,185 @@
+import os
+import time
+import logging
+import threading
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+# 每个数据库的连接池大小
+ENGINE_POOL_SIZE = int(os.getenv("DATABASE_TOOLS_ENGINE_POOL_SIZE", "2"))
+# 连接池满后最多额外创建的连接数
+ENGINE_MAX_OVERFLOW = int(os.getenv("DATABASE_TOOLS_ENGINE_MAX_OVERFLOW", "2"))
+# 等待空闲连接的最长时间(秒)
+ENGINE_POOL_TIMEOUT = float(os.getenv("DATABASE_TOOLS_ENGINE_POOL_TIMEOUT", "10"))
+# 连接最长使用时间(秒), 避免被 MySQL 的 wait_timeout 断开
+ENGINE_POOL_RECYCLE = int(os.getenv("DATABASE_TOOLS_ENGINE_POOL_RECYCLE", "1800"))
+# 多久没有使用的 engine 会被释放(秒)
+ENGINE_IDLE_TTL = float(os.getenv("DATABASE_TOOLS_ENGINE_IDLE_TTL", "600"))
+# 最多保留的 engine 数
+MAX_ENGINES = int(os.getenv("DATABASE_TOOLS_MAX_ENGINES", "32"))
+
+
+class _TimedQueuePool(QueuePool):
+    """记录从连接池获取连接的耗时(包括新建连接)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - start
+            self.waits += 1
+            self.wait_seconds += elapsed
+            self.max_wait_seconds = max(self.max_wait_seconds, elapsed)
+
+
+class _EngineEntry:
+    __slots__ = ("engine", "url", "created_at", "last_used", "uses")
+
+    def __init__(self, engine: Engine, url: str):
+        self.engine = engine
+        self.url = url
+        self.created_at = time.time()
+        self.last_used = time.time()
+        self.uses = 0
+
+
+class EngineRegistry:
+    """
+    进程级的 SQLAlchemy engine 注册表
+
+    按 (地址, 库名, 用户, 方言) 复用 engine 和它的连接池,
+    避免每次工具调用都重新建立 TCP 连接和 MySQL 握手, 也避免 engine 泄漏。
+    长时间没有使用的 engine 在下一次获取时释放。
+    """
+
+    def __init__(
+        self,
+        pool_size: int = ENGINE_POOL_SIZE,
+        max_overflow: int = ENGINE_MAX_OVERFLOW,
+        pool_timeout: float = ENGINE_POOL_TIMEOUT,
+        pool_recycle: int = ENGINE_POOL_RECYCLE,
+        idle_ttl: float = ENGINE_IDLE_TTL,
+        max_engines: int = MAX_ENGINES,
+    ):
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_timeout = pool_timeout
+        self.pool_recycle = pool_recycle
+        self.idle_ttl = idle_ttl
+        self.max_engines = max_engines
+        self._engines: dict[tuple, _EngineEntry] = {}
+        self._lock = threading.Lock()
+        self._created = 0
+        self._evicted = 0
+
+    def get(self, key: tuple, url: str) -> Engine:
+        """
+        获取 engine, 不存在或连接地址(如密码)变化时重新创建
+
+        Args:
+            key: (地址, 库名, 用户, 方言)
+            url: SQLAlchemy 连接地址
+        """
+        with self._lock:
+            self._evict_idle()
+            entry = self._engines.get(key)
+            if entry is not None and entry.url != url:
+                self._dispose(key)
+                entry = None
+            if entry is None:
+                if len(self._engines) >= self.max_engines:
+                    self._evict_lru()
+                entry = _EngineEntry(self._create(url), url)
+                self._engines[key] = entry
+                self._created += 1
+            entry.last_used = time.time()
+            entry.uses += 1
+            return entry.engine
+
+    def _create(self, url: str) -> Engine:
+        return create_engine(
+            url,
+            poolclass=_TimedQueuePool,
+            pool_size=self.pool_size,
+            max_overflow=self.max_overflow,
+            pool_timeout=self.pool_timeout,
+            pool_recycle=self.pool_recycle,
+            pool_pre_ping=True,
+        )
+
+    def _dispose(self, key: tuple):
+        entry = self._engines.pop(key)
+        entry.engine.dispose()
+        self._evicted += 1
+
+    def _evict_idle(self):
+        now = time.time()
+        expired = [
+            key
+            for key, entry in self._engines.items()
+            if now - entry.last_used > self.idle_ttl and entry.engine.pool.checkedout() == 0
+        ]
+        for key in expired:
+            logger.info(f"释放空闲的数据库连接 {key}")
+            self._dispose(key)
+
+    def _evict_lru(self):
+        idle = [
+            (entry.last_used, key)
+            for key, entry in self._engines.items()
+            if entry.engine.pool.checkedout() == 0
+        ]
+        if idle:
+            self._dispose(min(idle)[1])
+
+    def dispose_all(self):
+        """关闭所有连接(服务退出时调用)"""
+        with self._lock:
+            for key in list(self._engines):
+                self._dispose(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            engines = []
+            for key, entry in self._engines.items():
+                pool = entry.engine.pool
+                engines.append(
+                    {
+                        "host": key[0],
+                        "db_name": key[1],
+                        "username": key[2],
+                        "dialect": key[3],
+                        "uses": entry.uses,
+                        "idle_seconds": round(time.time() - entry.last_used, 1),
+                        "pool_size": pool.size(),
+                        "checked_out": pool.checkedout(),
+                        "checked_in": pool.checkedin(),
+                        "overflow": pool.overflow(),
+                        "avg_wait_ms": (
+                            round(pool.wait_seconds / pool.waits * 1000, 2) if pool.waits else 0
+                        ),
+                        "max_wait_ms": round(pool.max_wait_seconds * 1000, 2),
+                    }
+                )
+            return {
+                "engines": engines,
+                "created": self._created,
+                "evicted": self._evicted,
+            }
+
+
+_registry = EngineRegistry()
+
+
+def get_engine_registry() -> EngineRegistry:
+    return _registry
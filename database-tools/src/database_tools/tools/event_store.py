@@ -1,14 +1,20 @@
 """
-In-memory event store for demonstrating resumability functionality.
+Event stores for MCP stream resumability.
 
-This is a simple implementation intended for examples and testing,
-not for production use where a persistent storage solution would be more appropriate.
+InMemoryEventStore keeps a bounded window of recent events per process;
+SQLiteEventStore persists events so they survive restarts and can be shared
+by workers on the same host.
 """
 
+import time
+import uuid
+import sqlite3
+import asyncio
 import logging
-from collections import deque
-from dataclasses import dataclass
-from uuid import uuid4
+import threading
+from collections import OrderedDict, deque
+
+import anyio
 
 from mcp.server.streamable_http import EventCallback, EventId, EventMessage, EventStore, StreamId
 from mcp.types import JSONRPCMessage
@@ -16,15 +22,50 @@ from mcp.types import JSONRPCMessage
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+def _split_event_id(event_id: EventId) -> tuple[StreamId, int] | None:
+    """Splits a ``<stream_id>:<seq>`` event ID, returns None for foreign IDs."""
+    stream_id, sep, seq = str(event_id).rpartition(":")
+    if not sep or not seq.isdigit():
+        return None
+    return stream_id, int(seq)
+
+
 class EventEntry:
     """
     Represents an event entry in the event store.
+
+    The message is kept pre-serialized, which is far smaller than the
+    JSONRPCMessage object graph and is what gets sent on replay anyway.
     """
 
-    event_id: EventId
-    stream_id: StreamId
-    message: JSONRPCMessage
+    __slots__ = ("seq", "data")
+
+    def __init__(self, seq: int, data: bytes | None):
+        self.seq = seq
+        self.data = data
+
+    @property
+    def size(self) -> int:
+        return len(self.data) if self.data is not None else 0
+
+
+class _Stream:
+    """Events of one stream; the event with sequence ``seq`` is at ``events[seq - first_seq]``."""
+
+    __slots__ = ("events", "first_seq", "next_seq", "bytes", "last_used")
+
+    def __init__(self):
+        self.events: deque[EventEntry] = deque()
+        self.first_seq = 1
+        self.next_seq = 1
+        self.bytes = 0
+        self.last_used = time.monotonic()
+
+    def pop_oldest(self) -> EventEntry:
+        entry = self.events.popleft()
+        self.first_seq += 1
+        self.bytes -= entry.size
+        return entry
 
 
 class InMemoryEventStore(EventStore):
@@ -33,41 +74,65 @@ class InMemoryEventStore(EventStore):
     This is primarily intended for examples and testing, not for production use
     where a persistent storage solution would be more appropriate.
 
-    This implementation keeps only the last N events per stream for memory efficiency.
+    Event IDs are ``<stream_id>:<seq>``, so a replay jumps straight to the
+    position after the last event instead of scanning the stream.
+    Memory is bounded by keeping only the last N events per stream, dropping
+    streams that have been idle longer than ``stream_ttl`` and evicting the
+    oldest events of the least recently used streams above ``max_bytes``.
     """
 
-    def __init__(self, max_events_per_stream: int = 100):
+    def __init__(
+        self,
+        max_events_per_stream: int = 100,
+        stream_ttl: float = 600,
+        max_bytes: int = 64 * 1024 * 1024,
+        sweep_interval: float = 30,
+    ):
         """Initialize the event store.
 
         Args:
             max_events_per_stream: Maximum number of events to keep per stream
+            stream_ttl: Streams without new events for this many seconds are dropped
+            max_bytes: Maximum total size of stored messages across all streams
+            sweep_interval: Minimum seconds between two idle-stream sweeps
         """
         self.max_events_per_stream = max_events_per_stream
-        # for maintaining last N events per stream
-        self.streams: dict[StreamId, deque[EventEntry]] = {}
-        # event_id -> EventEntry for quick lookup
-        self.event_index: dict[EventId, EventEntry] = {}
+        self.stream_ttl = stream_ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        # least recently used stream first
+        self.streams: OrderedDict[StreamId, _Stream] = OrderedDict()
+        self.resident_bytes = 0
+        self.evicted_events = 0
+        self.evicted_streams = 0
+        self._last_sweep = time.monotonic()
 
-    async def store_event(self, stream_id: StreamId, message: JSONRPCMessage) -> EventId:
-        """Stores an event with a generated event ID."""
-        event_id = str(uuid4())
-        event_entry = EventEntry(event_id=event_id, stream_id=stream_id, message=message)
+    async def store_event(self, stream_id: StreamId, message: JSONRPCMessage | None) -> EventId:
+        """Stores an event with a ``<stream_id>:<seq>`` event ID."""
+        now = time.monotonic()
+        if now - self._last_sweep >= self.sweep_interval:
+            self._evict_idle_streams(now)
 
-        # Get or create deque for this stream
-        if stream_id not in self.streams:
-            self.streams[stream_id] = deque(maxlen=self.max_events_per_stream)
+        stream = self.streams.get(stream_id)
+        if stream is None:
+            stream = self.streams[stream_id] = _Stream()
+        else:
+            self.streams.move_to_end(stream_id)
+        stream.last_used = now
 
-        # If deque is full, the oldest event will be automatically removed
-        # We need to remove it from the event_index as well
-        if len(self.streams[stream_id]) == self.max_events_per_stream:
-            oldest_event = self.streams[stream_id][0]
-            self.event_index.pop(oldest_event.event_id, None)
+        data = message.model_dump_json(by_alias=True, exclude_none=True).encode() if message is not None else None
+        entry = EventEntry(stream.next_seq, data)
+        stream.next_seq += 1
+        stream.events.append(entry)
+        stream.bytes += entry.size
+        self.resident_bytes += entry.size
 
-        # Add new event
-        self.streams[stream_id].append(event_entry)
-        self.event_index[event_id] = event_entry
+        if len(stream.events) > self.max_events_per_stream:
+            self._evict_event(stream)
+        if self.resident_bytes > self.max_bytes:
+            self._enforce_memory_cap(stream_id)
 
-        return event_id
+        return f"{stream_id}:{entry.seq}"
 
     async def replay_events_after(
         self,
@@ -75,21 +140,268 @@ class InMemoryEventStore(EventStore):
         send_callback: EventCallback,
     ) -> StreamId | None:
         """Replays events that occurred after the specified event ID."""
-        if last_event_id not in self.event_index:
+        parsed = _split_event_id(last_event_id)
+        stream = self.streams.get(parsed[0]) if parsed else None
+        if stream is None or not stream.first_seq <= parsed[1] < stream.next_seq:
             logger.warning(f"Event ID {last_event_id} not found in store")
             return None
 
-        # Get the stream and find events after the last one
-        last_event = self.event_index[last_event_id]
-        stream_id = last_event.stream_id
-        stream_events = self.streams.get(last_event.stream_id, deque())
+        stream_id, seq = parsed
+        # Index straight into the tail (deque indexing is cheap near the ends);
+        # copy it first, new events may be stored while sending
+        offset = seq - stream.first_seq + 1
+        events = [stream.events[i] for i in range(offset, len(stream.events))]
+        for event in events:
+            if event.data is not None:
+                message = JSONRPCMessage.model_validate_json(event.data)
+                await send_callback(EventMessage(message, f"{stream_id}:{event.seq}"))
+        return stream_id
 
-        # Events in deque are already in chronological order
-        found_last = False
-        for event in stream_events:
-            if found_last:
-                await send_callback(EventMessage(event.message, event.event_id))
-            elif event.event_id == last_event_id:
-                found_last = True
+    def _evict_event(self, stream: _Stream):
+        entry = stream.pop_oldest()
+        self.resident_bytes -= entry.size
+        self.evicted_events += 1
 
+    def _evict_stream(self, stream_id: StreamId):
+        stream = self.streams.pop(stream_id)
+        self.resident_bytes -= stream.bytes
+        self.evicted_events += len(stream.events)
+        self.evicted_streams += 1
+
+    def _evict_idle_streams(self, now: float):
+        self._last_sweep = now
+        # streams are ordered by last use, stop at the first active one
+        while self.streams:
+            stream_id, stream = next(iter(self.streams.items()))
+            if now - stream.last_used < self.stream_ttl:
+                break
+            self._evict_stream(stream_id)
+
+    def _enforce_memory_cap(self, current: StreamId):
+        """Evicts the oldest events of the least recently used streams."""
+        while self.resident_bytes > self.max_bytes and self.streams:
+            stream_id, stream = next(iter(self.streams.items()))
+            if stream_id == current:
+                # only the active stream is left, trim it but keep its latest event
+                while self.resident_bytes > self.max_bytes and len(stream.events) > 1:
+                    self._evict_event(stream)
+                break
+            self._evict_stream(stream_id)
+
+    def stats(self) -> dict:
+        return {
+            "store": "memory",
+            "streams": len(self.streams),
+            "events": sum(len(stream.events) for stream in self.streams.values()),
+            "bytes": self.resident_bytes,
+            "evicted_events": self.evicted_events,
+            "evicted_streams": self.evicted_streams,
+        }
+
+
+class SQLiteEventStore(EventStore):
+    """
+    Persistent EventStore backed by a local SQLite database in WAL mode.
+
+    MCP stream IDs are request IDs, which repeat across sessions, restarts and
+    workers sharing the database. Events are therefore stored under a stream key
+    that is unique to this store instance; a new key is started for every
+    priming event (the start of an SSE stream). The EventStore interface does not
+    pass the session, so two sessions using the same request ID at the same time
+    in one process still share a key.
+
+    Event IDs are ``<stream_key>:<seq>`` with a sequence number per key that only
+    this store assigns, so replay is a range scan on the (stream_key, seq) primary
+    key and a plain INSERT never overwrites another writer's events.
+    Events are buffered and inserted in batches; the buffer is flushed when it
+    reaches ``batch_size``, after ``flush_interval`` seconds, or before a replay.
+    Retention is enforced by age, total event count and total message bytes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 64,
+        flush_interval: float = 0.05,
+        max_age: float = 3600,
+        max_events: int = 100_000,
+        max_bytes: int = 256 * 1024 * 1024,
+        prune_every: int = 20,
+    ):
+        """Initialize the event store.
+
+        Args:
+            path: SQLite database file, shared by all workers on the host
+            batch_size: Number of buffered events that triggers a flush
+            flush_interval: Maximum seconds an event stays in the buffer
+            max_age: Events older than this many seconds are deleted
+            max_events: Maximum number of events kept across all streams
+            max_bytes: Maximum total size of stored messages
+            prune_every: Enforce retention once every N flushes
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_age = max_age
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.prune_every = prune_every
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db_lock = threading.Lock()
+        with self._db_lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stream_events ("
+                "stream_key TEXT NOT NULL, seq INTEGER NOT NULL, stream_id TEXT NOT NULL, "
+                "created_at REAL NOT NULL, size INTEGER NOT NULL, message TEXT, "
+                "PRIMARY KEY (stream_key, seq))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_stream_events_created ON stream_events (created_at)"
+            )
+
+        self._instance = uuid.uuid4().hex[:16]
+        self._stream_count = 0
+        # current stream key of each MCP stream ID
+        self._keys: dict[StreamId, str] = {}
+        self._next_seq: dict[str, int] = {}
+        self._last_used: dict[str, float] = {}
+        self._pending: list[tuple[str, int, StreamId, float, int, str | None]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._flush_tasks: set[asyncio.Task] = set()
+        self._flushes = 0
+
+    async def store_event(self, stream_id: StreamId, message: JSONRPCMessage | None) -> EventId:
+        """Buffers an event and returns its ``<stream_key>:<seq>`` ID."""
+        # No await before the sequence number is taken, so concurrent calls never share one
+        key = self._keys.get(stream_id)
+        if key is None or message is None:
+            self._stream_count += 1
+            key = self._keys[stream_id] = f"{self._instance}-{self._stream_count}"
+        seq = self._next_seq.get(key, 1)
+        self._next_seq[key] = seq + 1
+        self._last_used[key] = time.time()
+
+        data = message.model_dump_json(by_alias=True, exclude_none=True) if message is not None else None
+        self._pending.append((key, seq, stream_id, time.time(), len(data or ""), data))
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self._schedule_flush)
+        return f"{key}:{seq}"
+
+    def _schedule_flush(self):
+        # Keep a reference, the event loop only holds a weak one to running tasks
+        self._flush_handle = None
+        task = asyncio.get_running_loop().create_task(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self):
+        """Writes buffered events in one transaction."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        self._flushes += 1
+        prune = self._flushes % self.prune_every == 0
+        await anyio.to_thread.run_sync(self._write, rows, prune)
+        if prune:
+            # Forget sequence counters of streams whose events have expired
+            expired_before = time.time() - self.max_age
+            expired = {key for key, last_used in self._last_used.items() if last_used < expired_before}
+            for key in expired:
+                del self._last_used[key]
+                self._next_seq.pop(key, None)
+            for stream_id, key in list(self._keys.items()):
+                if key in expired:
+                    del self._keys[stream_id]
+
+    async def replay_events_after(
+        self,
+        last_event_id: EventId,
+        send_callback: EventCallback,
+    ) -> StreamId | None:
+        """Replays events of the same stream key with a higher sequence number."""
+        parsed = _split_event_id(last_event_id)
+        if parsed is None:
+            logger.warning(f"Event ID {last_event_id} not found in store")
+            return None
+        await self.flush()
+        key, seq = parsed
+        found = await anyio.to_thread.run_sync(self._read_after, key, seq)
+        if found is None:
+            logger.warning(f"Event ID {last_event_id} not found in store")
+            return None
+        stream_id, rows = found
+        for event_seq, data in rows:
+            if data is not None:
+                message = JSONRPCMessage.model_validate_json(data)
+                await send_callback(EventMessage(message, f"{key}:{event_seq}"))
         return stream_id
+
+    async def close(self):
+        await self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+    def _write(self, rows: list, prune: bool):
+        with self._db_lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO stream_events (stream_key, seq, stream_id, created_at, size, message) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                if prune:
+                    self._prune()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _read_after(self, key: str, seq: int) -> tuple[StreamId, list] | None:
+        """Returns the MCP stream ID and the events after ``seq``, None if the event is unknown."""
+        with self._db_lock:
+            found = self._conn.execute(
+                "SELECT stream_id FROM stream_events WHERE stream_key = ? AND seq = ?", (key, seq)
+            ).fetchone()
+            if found is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT seq, message FROM stream_events WHERE stream_key = ? AND seq > ? ORDER BY seq",
+                (key, seq),
+            ).fetchall()
+        return found[0], rows
+
+    def _prune(self):
+        self._conn.execute("DELETE FROM stream_events WHERE created_at < ?", (time.time() - self.max_age,))
+        self._conn.execute(
+            "DELETE FROM stream_events WHERE rowid <= "
+            "(SELECT rowid FROM stream_events ORDER BY rowid DESC LIMIT 1 OFFSET ?)",
+            (self.max_events,),
+        )
+        self._conn.execute(
+            "DELETE FROM stream_events WHERE rowid <= (SELECT rowid FROM "
+            "(SELECT rowid, SUM(size) OVER (ORDER BY rowid DESC) AS total FROM stream_events) "
+            "WHERE total > ? ORDER BY rowid DESC LIMIT 1)",
+            (self.max_bytes,),
+        )
+
+    def stats(self) -> dict:
+        with self._db_lock:
+            count, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM stream_events"
+            ).fetchone()
+        return {
+            "store": "sqlite",
+            "events": count,
+            "bytes": size,
+            "pending": len(self._pending),
+            "streams": len(self._next_seq),
+        }
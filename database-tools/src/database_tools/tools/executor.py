@@ -0,0 +1,108 @@
+import os
+import json
+import functools
+import anyio
+from database_tools.tools.changelog_tables import CHANGELOG_TABLES
+
+# 同时执行的阻塞工具调用数(liquibase 进程、数据库查询)
+TOOL_WORKERS = int(os.getenv("DATABASE_TOOLS_WORKERS", "8"))
+# 同一个目标数据库同时执行的只读查询数
+DB_CONCURRENCY = int(os.getenv("DATABASE_TOOLS_DB_CONCURRENCY", "4"))
+# 同一个目标数据库同时执行的 liquibase 验证数
+# 每次验证使用独立的 changelog 表和锁表时可以并发;
+# 共用 liquibase 默认的表时只能一个 liquibase 持有 DATABASECHANGELOGLOCK, 默认串行
+LIQUIBASE_CONCURRENCY = int(
+    os.getenv("DATABASE_TOOLS_LIQUIBASE_CONCURRENCY", "1" if CHANGELOG_TABLES == "shared" else "4")
+)
+
+# 调度的通道: 只读查询和 liquibase 验证分别限制并发, 互不阻塞
+QUERY_LANE = "query"
+LIQUIBASE_LANE = "liquibase"
+
+
+def db_key(db_config) -> str:
+    """
+    根据 db_config 生成目标数据库的标识(地址/库名)
+    无法解析时所有调用共享同一个标识
+    """
+    try:
+        db_info = json.loads(db_config) if isinstance(db_config, str) else db_config
+        return f"{db_info['db_url']}/{db_info['db_name']}"
+    except (TypeError, ValueError, KeyError):
+        return "default"
+
+
+class ToolExecutor:
+    """
+    在工作线程中执行阻塞的工具调用
+
+    liquibase 的 subprocess.run 和 SQLAlchemy 查询都是阻塞调用,
+    直接在 call_tool 中执行会卡住事件循环, 其它会话的请求、通知和 list_tools 都要等待。
+    这里用全局的 CapacityLimiter 限制总线程数, 再按 (目标数据库, 通道) 限制并发,
+    同一个库上的 liquibase 验证不会占满线程, 也不会阻塞同一个库的只读查询。
+    """
+
+    def __init__(
+        self,
+        workers: int = TOOL_WORKERS,
+        db_concurrency: int = DB_CONCURRENCY,
+        liquibase_concurrency: int = LIQUIBASE_CONCURRENCY,
+    ):
+        self.workers = max(1, workers)
+        self.db_concurrency = max(1, db_concurrency)
+        self.lane_concurrency = {
+            QUERY_LANE: self.db_concurrency,
+            LIQUIBASE_LANE: max(1, liquibase_concurrency),
+        }
+        self._limiter: anyio.CapacityLimiter | None = None
+        self._db_limiters: dict[tuple[str, str], anyio.CapacityLimiter] = {}
+        self._waiting: dict[tuple[str, str], int] = {}
+
+    def _get_limiter(self) -> anyio.CapacityLimiter:
+        # CapacityLimiter 需要在事件循环中创建
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(self.workers)
+        return self._limiter
+
+    def _get_db_limiter(self, key: tuple[str, str]) -> anyio.CapacityLimiter:
+        limiter = self._db_limiters.get(key)
+        if limiter is None:
+            limiter = anyio.CapacityLimiter(self.lane_concurrency.get(key[1], self.db_concurrency))
+            self._db_limiters[key] = limiter
+        return limiter
+
+    async def run(self, db_config, func, *args, lane: str = QUERY_LANE, **kwargs):
+        """
+        在工作线程中执行 func(*args, **kwargs), 同一个目标数据库同一通道的调用超过并发数时排队
+        """
+        key = (db_key(db_config), lane)
+        db_limiter = self._get_db_limiter(key)
+        self._waiting[key] = self._waiting.get(key, 0) + 1
+        waiting = True
+        try:
+            async with db_limiter:
+                self._waiting[key] -= 1
+                waiting = False
+                return await anyio.to_thread.run_sync(
+                    functools.partial(func, *args, **kwargs),
+                    limiter=self._get_limiter(),
+                )
+        finally:
+            if waiting:
+                # 排队时被取消
+                self._waiting[key] -= 1
+
+    def stats(self) -> dict:
+        limiter = self._get_limiter()
+        return {
+            "workers": self.workers,
+            "busy": limiter.borrowed_tokens,
+            "lanes": self.lane_concurrency,
+            "databases": {
+                f"{key[0]}#{key[1]}": {
+                    "running": limiter.borrowed_tokens,
+                    "waiting": self._waiting.get(key, 0),
+                }
+                for key, limiter in self._db_limiters.items()
+            },
+        }
@@ -0,0 +1,234 @@
+import os
+import re
+
+# 估算值在 [限制/倍数, 限制*倍数] 之间时, 建议再精确统计一次
+ESTIMATE_MARGIN = float(os.getenv("DATABASE_TOOLS_ESTIMATE_MARGIN", "2"))
+
+# 这些访问方式最多命中一行, 估算值就是精确值
+_EXACT_ACCESS_TYPES = {"system", "const", "eq_ref"}
+# 全表扫描或全索引扫描
+_FULL_SCAN_TYPES = {"ALL", "index"}
+
+_IDENT = r"(?:`[^`]+`|\w+)"
+# 表引用: [库.]表 [[AS] 别名]
+_TABLE_REF_RE = re.compile(
+    rf"\s*({_IDENT}(?:\s*\.\s*{_IDENT})?)(?:\s+(?:AS\s+)?({_IDENT}))?", re.IGNORECASE
+)
+# SET 赋值左边带表名前缀的列: 表.列
+_QUALIFIED_COLUMN_RE = re.compile(rf"\s*({_IDENT})\s*\.\s*{_IDENT}\s*$")
+_MODIFIERS_RE = re.compile(r"^(?:(?:LOW_PRIORITY|QUICK|IGNORE)\b\s*)+", re.IGNORECASE)
+# 表名后面可能出现、但不是别名的关键字
+_NOT_ALIAS = {
+    "JOIN", "INNER", "LEFT", "RIGHT", "CROSS", "NATURAL", "STRAIGHT_JOIN", "ON", "USING",
+    "SET", "WHERE", "ORDER", "LIMIT", "USE", "FORCE", "IGNORE", "PARTITION", "GROUP", "HAVING",
+}
+
+
+def _find_keyword(sql: str, keyword: str, start: int = 0) -> int:
+    """
+    查找第一个不在引号、括号中的关键字, 返回下标, 找不到返回 -1
+    """
+    pattern = re.compile(rf"{keyword}\b", re.IGNORECASE)
+    depth = 0
+    quote = None
+    i = start
+    while i < len(sql):
+        char = sql[i]
+        if quote:
+            if char == "\\" and quote != "`":
+                i += 2
+                continue
+            if char == quote:
+                quote = None
+        elif char in ("'", '"', "`"):
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth == 0 and (i == 0 or not (sql[i - 1].isalnum() or sql[i - 1] == "_")):
+            if pattern.match(sql, i):
+                return i
+        i += 1
+    return -1
+
+
+def to_select_sql(sql: str) -> str:
+    """
+    把 UPDATE/DELETE 改写为查询相同记录的 SELECT, SELECT 原样返回
+
+    UPDATE t SET a=1 WHERE id=1        -> SELECT * FROM t WHERE id=1
+    UPDATE a JOIN b ON .. SET .. WHERE -> SELECT * FROM a JOIN b ON .. WHERE ..
+    DELETE FROM t WHERE id=1           -> SELECT * FROM t WHERE id=1
+    DELETE a FROM a JOIN b ON .. WHERE -> SELECT * FROM a JOIN b ON .. WHERE ..
+    """
+    sql = sql.strip().rstrip(";").strip()
+    verb = sql.split(None, 1)[0].upper() if sql else ""
+    if verb == "SELECT":
+        return sql
+    if verb == "UPDATE":
+        set_pos = _find_keyword(sql, "SET")
+        if set_pos < 0:
+            raise ValueError("UPDATE 语句缺少 SET")
+        tables = sql[len("UPDATE"):set_pos].strip()
+        tables = re.sub(r"^(LOW_PRIORITY\s+|IGNORE\s+)+", "", tables, flags=re.IGNORECASE)
+        where_pos = _find_keyword(sql, "WHERE", set_pos)
+        if where_pos < 0:
+            for keyword in ("ORDER", "LIMIT"):
+                where_pos = _find_keyword(sql, keyword, set_pos)
+                if where_pos >= 0:
+                    break
+        rest = sql[where_pos:] if where_pos >= 0 else ""
+        return f"SELECT * FROM {tables} {rest}".strip()
+    if verb == "DELETE":
+        from_pos = _find_keyword(sql, "FROM")
+        if from_pos < 0:
+            raise ValueError("DELETE 语句缺少 FROM")
+        rest = sql[from_pos + len("FROM"):].strip()
+        # DELETE FROM a USING a JOIN b ... 的多表写法
+        using_pos = _find_keyword(rest, "USING")
+        if using_pos >= 0:
+            rest = rest[using_pos + len("USING"):].strip()
+        return f"SELECT * FROM {rest}"
+    raise ValueError(f"只支持 UPDATE/DELETE/SELECT 语句: {sql[:50]}")
+
+
+_LIMIT_RE = re.compile(r"\s*(\d+)\s*(?:,\s*(\d+)\s*|OFFSET\s+(\d+)\s*)?$", re.IGNORECASE)
+
+
+def limit_sql(sql: str, limit: int) -> str:
+    """
+    限制 SELECT 最多返回 limit 行: 没有 LIMIT 时追加, 已有更大的 LIMIT 时替换
+    不包一层子查询, 多表 JOIN 的 SELECT * 有重复的列名时也能执行
+
+    SELECT * FROM t                 -> SELECT * FROM t LIMIT 101
+    SELECT * FROM t LIMIT 500       -> SELECT * FROM t LIMIT 101
+    SELECT * FROM t LIMIT 20, 500   -> SELECT * FROM t LIMIT 20, 101
+    """
+    sql = sql.strip().rstrip(";").strip()
+    limit_pos = _find_keyword(sql, "LIMIT")
+    if limit_pos < 0:
+        return f"{sql} LIMIT {limit}"
+    match = _LIMIT_RE.match(sql, limit_pos + len("LIMIT"))
+    if match is None:
+        raise ValueError(f"无法识别的 LIMIT: {sql[limit_pos:][:50]}")
+    first, count, offset = match.groups()
+    head = sql[:limit_pos].rstrip()
+    if count is not None:
+        return f"{head} LIMIT {first}, {min(int(count), limit)}"
+    if offset is not None:
+        return f"{head} LIMIT {min(int(first), limit)} OFFSET {offset}"
+    return f"{head} LIMIT {min(int(first), limit)}"
+
+
+def to_count_sql(sql: str) -> str:
+    """
+    统计 SELECT 返回的行数: 把查询的列替换为 COUNT(*), 用原来的 FROM/WHERE 统计
+
+    有 DISTINCT/GROUP BY/HAVING/UNION/LIMIT 时替换列会改变结果, 仍包一层子查询统计
+    """
+    sql = sql.strip().rstrip(";").strip()
+    from_pos = _find_keyword(sql, "FROM")
+    wrapped = re.match(r"SELECT\s+(DISTINCT|ALL\b)", sql, re.IGNORECASE) or any(
+        _find_keyword(sql, keyword) >= 0 for keyword in ("GROUP", "HAVING", "UNION", "LIMIT")
+    )
+    if from_pos < 0 or wrapped or not re.match(r"SELECT\b", sql, re.IGNORECASE):
+        return f"SELECT COUNT(*) FROM ({sql}) AS affected_rows"
+    return f"SELECT COUNT(*) {sql[from_pos:]}"
+
+
+def _unquote(name: str) -> str:
+    return name.strip().strip("`").lower()
+
+
+def _first_table(tables: str) -> str | None:
+    """表引用列表中第一张表在 EXPLAIN 中的名称: 有别名时为别名, 否则为不带库名的表名"""
+    match = _TABLE_REF_RE.match(tables)
+    if match is None:
+        return None
+    alias = match.group(2)
+    if alias and alias.upper() not in _NOT_ALIAS:
+        return _unquote(alias)
+    return _unquote(re.split(r"\s*\.\s*", match.group(1))[-1])
+
+
+def target_table(sql: str) -> str | None:
+    """
+    变更的目标表在 EXPLAIN 结果 table 列中的名称, 无法确定时返回 None
+
+    UPDATE a JOIN b ON .. SET b.x=1  -> b (SET 中带表名前缀时取第一个)
+    UPDATE t AS x SET a=1            -> x
+    DELETE a FROM a JOIN b ON ..     -> a
+    DELETE FROM db.t WHERE ..        -> t
+    """
+    sql = sql.strip().rstrip(";").strip()
+    verb = sql.split(None, 1)[0].upper() if sql else ""
+    if verb == "UPDATE":
+        set_pos = _find_keyword(sql, "SET")
+        if set_pos < 0:
+            return None
+        # 第一个赋值的列带表名前缀时, 以该表为目标表
+        match = _QUALIFIED_COLUMN_RE.match(sql[set_pos + len("SET"):].split("=", 1)[0])
+        if match:
+            return _unquote(match.group(1))
+        return _first_table(_MODIFIERS_RE.sub("", sql[len("UPDATE"):set_pos].strip()))
+    if verb == "DELETE":
+        from_pos = _find_keyword(sql, "FROM")
+        if from_pos < 0:
+            return None
+        # DELETE a FROM a JOIN b 的多表写法, 目标表写在 FROM 之前
+        targets = _MODIFIERS_RE.sub("", sql[len("DELETE"):from_pos].strip())
+        if targets:
+            return _first_table(targets)
+        return _first_table(sql[from_pos + len("FROM"):])
+    if verb == "SELECT":
+        from_pos = _find_keyword(sql, "FROM")
+        return _first_table(sql[from_pos + len("FROM"):]) if from_pos >= 0 else None
+    return None
+
+
+def summarize_explain(rows: list[dict], limit: int, target: str | None = None) -> dict:
+    """
+    汇总 EXPLAIN 的结果
+
+    Args:
+        rows: EXPLAIN 的每一行(字段 table/type/possible_keys/key/rows/filtered)
+        limit: 单条变更允许影响的最大记录数
+        target: 变更的目标表在 EXPLAIN 中的名称(target_table 的结果), 不传时取第一张表
+    """
+    tables = []
+    for row in rows:
+        row = {str(k).lower(): v for k, v in row.items()}
+        tables.append(
+            {
+                "table": row.get("table"),
+                "type": row.get("type"),
+                "possible_keys": row.get("possible_keys"),
+                "key": row.get("key"),
+                "rows": int(row.get("rows") or 0),
+                "filtered": float(row.get("filtered") or 100),
+                "extra": row.get("extra"),
+            }
+        )
+    if not tables:
+        return {"estimated_rows": 0, "examined_rows": 0, "full_scan": False, "index": None,
+                "exact": True, "needs_exact_count": False, "tables": []}
+
+    # 估算命中的行数 = 目标表的扫描行数 * 过滤比例, 找不到目标表时取第一张表
+    matched = [t for t in tables if target is not None and _unquote(str(t["table"] or "")) == target]
+    target = matched[0] if matched else tables[0]
+    estimated = int(round(target["rows"] * target["filtered"] / 100))
+    exact = all(t["type"] in _EXACT_ACCESS_TYPES for t in tables)
+    if exact:
+        estimated = min(estimated, 1)
+    full_scan = any(t["type"] in _FULL_SCAN_TYPES for t in tables)
+    needs_exact_count = not exact and limit / ESTIMATE_MARGIN <= estimated <= limit * ESTIMATE_MARGIN
+    return {
+        "estimated_rows": estimated,
+        "examined_rows": sum(t["rows"] for t in tables),
+        "full_scan": full_scan,
+        "index": target["key"],
+        "exact": exact,
+        "needs_exact_count": needs_exact_count,
+        "tables": tables,
+    }
@@ -1,13 +1,113 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from dataclasses import dataclass
+import os
 import json
 import re
+import hashlib
 import subprocess
+import contextlib
+from collections import Counter
 from datetime import datetime
-from urllib.parse import quote
 from sqlalchemy.exc import SQLAlchemyError, OperationalError, ProgrammingError
+from database_tools.tools.runner import get_runner
+from database_tools.tools.engines import get_engine_registry
+from database_tools.tools.privileges import get_privilege_cache
+from database_tools.tools.cursors import get_cursor_registry
+from database_tools.tools.explain import to_select_sql, summarize_explain, target_table, limit_sql, to_count_sql
+from database_tools.tools.change_id import get_change_id_allocator
+from database_tools.tools.workspace import get_workspace_manager
+from database_tools.tools.changelog_tables import ChangelogTables, purge_stale_tables
+from database_tools.tools.sandbox import SANDBOX, get_sandbox_manager
+from database_tools.tools.dialects import get_dialect
+from database_tools.tools.embedded import EMBEDDED_FAST_PATH, get_embedded_validator
 
-CHANGESET_ID = {}
+# 验证方式: update-testing-rollback 一次调用完成 更新 -> 回滚 -> 再更新,
+# 在开发库上验证时结束后再用 rollback-count 回滚, 库中不留下变更;
+# update-rollback 为分别调用 update 和 rollbackCount 1
+VALIDATE_MODE = os.getenv("LIQUIBASE_VALIDATE_MODE", "update-testing-rollback")
+
+# 单条变更允许影响的最大记录数, 与提示词中的限制一致
+MAX_AFFECTED_ROWS = int(os.getenv("DATABASE_TOOLS_MAX_AFFECTED_ROWS", "100"))
+# 分页查询每页最多返回的记录数
+MAX_PAGE_SIZE = int(os.getenv("DATABASE_TOOLS_MAX_PAGE_SIZE", "500"))
+
+_CHANGESET_RE = re.compile(r"^--changeset\s+([^:\s]+):(\S+)", re.MULTILINE)
+_RUNNING_RE = re.compile(r"Running Changeset:\s*(\S+)")
+_ROLLING_BACK_RE = re.compile(r"Rolling Back Changeset:\s*(\S+)")
+_RAN_RE = re.compile(r"ChangeSet\s+(\S+)\s+ran successfully")
+_FAILED_RE = re.compile(r"Migration failed for change\s?set\s+(\S+)", re.IGNORECASE)
+
+
+def _changeset_key(identifier: str) -> tuple[str, str]:
+    """
+    liquibase 输出中的 changeSet 标识为 文件::id::作者, 返回 (id, 作者)
+    """
+    parts = identifier.rstrip(":").split("::")
+    if len(parts) >= 3:
+        return parts[-2], parts[-1]
+    return identifier, ""
+
+
+def split_changesets(liquibase_script: str) -> tuple[str, list[dict]]:
+    """
+    按 --changeset 拆分脚本
+
+    Returns:
+        (第一个 changeSet 之前的内容, [{"id", "author", "script"}])
+    """
+    matches = list(_CHANGESET_RE.finditer(liquibase_script))
+    if not matches:
+        return liquibase_script, []
+    items = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(liquibase_script)
+        items.append(
+            {"id": match.group(2), "author": match.group(1), "script": liquibase_script[match.start():end]}
+        )
+    return liquibase_script[:matches[0].start()], items
+
+
+class ChangesetProgress:
+    """
+    根据 liquibase 的输出行跟踪每个 changeSet 的验证进度
+
+    update-testing-rollback 对每个 changeSet 依次 更新 -> 回滚 -> 再更新, 每个 changeSet 共 3 步,
+    每完成一步(或失败)调用 callback(已完成步数, 总步数, 描述)
+    """
+
+    STEPS = 3
+
+    def __init__(self, liquibase_script: str, callback):
+        self.callback = callback
+        self.total = len(_CHANGESET_RE.findall(liquibase_script)) * self.STEPS
+        self.done = 0
+        self._runs: dict[tuple[str, str], int] = {}
+
+    def _step(self, message: str):
+        self.done = min(self.done + 1, self.total)
+        self.callback(self.done, self.total, message)
+
+    def feed(self, line: str):
+        match = _RAN_RE.search(line)
+        if match:
+            key = _changeset_key(match.group(1))
+            runs = self._runs[key] = self._runs.get(key, 0) + 1
+            self._step(f"changeSet {key[1]}:{key[0]} " + ("更新成功" if runs == 1 else "回滚后再次更新成功, 验证通过"))
+            return
+        match = _ROLLING_BACK_RE.search(line)
+        if match:
+            key = _changeset_key(match.group(1))
+            self._step(f"changeSet {key[1]}:{key[0]} 回滚")
+            return
+        match = _FAILED_RE.search(line)
+        if match:
+            key = _changeset_key(match.group(1))
+            self.callback(self.done, self.total, f"changeSet {key[1]}:{key[0]} 验证失败")
+
+    def reject(self, item: dict):
+        """嵌入式数据库验证失败的 changeSet, 不再到开发库验证"""
+        self.done = min(self.done + self.STEPS, self.total)
+        self.callback(self.done, self.total, f"changeSet {item['author']}:{item['id']} {item['message']}")
 
 
 class LiquibaseUtils:
@@ -16,46 +116,350 @@ class LiquibaseUtils:
         self.db_config = db_config
         self.liquibase_script = liquibase_script
 
-    def execute_liquibase(self) -> str:
-        """
-        使用 Liquibase 执行 changeLog 变更文件。
-        验证大模型生成回滚语句是否有效
-        """
-
-        db_info = json.loads(self.db_config)
-        url = db_info["db_url"]
-        db_name = db_info["db_name"]
+    def _build_cmd(
+        self,
+        search_path: str,
+        change_log_file: str,
+        *command: str,
+        tables: ChangelogTables | None = None,
+        target: str | None = None,
+    ) -> list[str]:
+        # target 为实际执行的库(沙箱库), 默认为 db_config
+        db_info = json.loads(target or self.db_config)
+        dialect = get_dialect(db_info.get("dialect"))
         db_user = db_info["username"]
         db_pwd = db_info["pwd"]
-        db_url = f"jdbc:mysql://{url}/{db_name}"
-        change_log_file = self.create_change_file(db_name, self.liquibase_script)
-        cmd = [
+        db_url = dialect.jdbc_url_for(db_info)
+        return [
             "liquibase",
-            f"--driver=com.mysql.cj.jdbc.Driver",
+            f"--driver={dialect.jdbc_driver}",
             f"--changeLogFile={change_log_file}",
             f"--url={db_url}",
             f"--username={db_user}",
             f"--password={db_pwd}",
-            f"--searchPath=.",
-            f"update"
+            f"--searchPath={search_path}",
+            *(tables.args() if tables else []),
+            *command,
         ]
 
-        rollback_cmd = [
-            "liquibase",
-            f"--driver=com.mysql.cj.jdbc.Driver",
-            f"--changeLogFile={change_log_file}",
-            f"--url={db_url}",
-            f"--username={db_user}",
-            f"--password={db_pwd}",
-            f"--searchPath=. ",
-            f"rollbackCount",
-            f"1"
+    @contextlib.contextmanager
+    def _validation_env(self, db_name: str):
+        """
+        一次验证的工作目录、changelog 表和执行的库, 结束时删除或归还
+
+        开启沙箱时租用目标库的沙箱库执行, 沙箱库由本次验证独占, 使用 liquibase 默认的 changelog 表,
+        归还时会删除; 否则在 db_config 的开发库上使用独立的 changelog 表,
+        结束时表中没有记录(变更都已回滚)才删除, 否则保留以便追查留在开发库中的变更。
+        """
+        if SANDBOX == "on":
+            with get_sandbox_manager().lease(self.db_config) as sandbox:
+                with get_workspace_manager().workspace(db_name) as workspace:
+                    yield workspace, ChangelogTables("shared"), sandbox.db_config
+            return
+
+        dialect = get_dialect(json.loads(self.db_config).get("dialect"))
+        # 没有 SQLAlchemy 驱动时无法删除独立的表, 使用默认的 changelog 表
+        tables = ChangelogTables() if dialect.sqlalchemy_url else ChangelogTables("shared")
+        engine = None
+        if tables.changelog is not None:
+            db = DatabaseUtil(self.db_config)
+            engine = db.get_engine()
+            if dialect.name == "mysql":
+                purge_stale_tables(engine, db.engine_key(), db_name)
+        try:
+            with get_workspace_manager().workspace(db_name) as workspace:
+                yield workspace, tables, self.db_config
+        finally:
+            if engine is not None:
+                # 还有变更没有回滚时保留 changelog 表, 否则删除
+                tables.release(engine)
+
+    def execute_liquibase(self) -> dict:
+        """
+        使用 Liquibase 执行 changeLog 变更文件。
+        验证大模型生成回滚语句是否有效
+        """
+        if VALIDATE_MODE == "update-rollback":
+            return self._execute_update_rollback()
+        result = self.validate_changesets()
+        return {"status": result["status"], "message": result["message"]}
+
+    def validate_changesets(self, on_progress=None) -> dict:
+        """
+        用一次 update-testing-rollback 验证 liquibase_script 中的所有 changeSet
+        一个 liquibase 进程完成 更新 -> 回滚 -> 再更新, 只启动一次 JVM、获取一次 changelog 锁,
+        在开发库上验证时再用 rollback-count 回滚通过的 changeSet, 重试和结果缓存不受影响
+
+        开启 EMBEDDED_FAST_PATH 时先在嵌入式 H2 数据库中验证, 只用来提前拒绝:
+        H2 中失败的 changeSet 直接返回错误, 其它 changeSet 仍到开发库(或沙箱库)验证, 以开发库的结果为准。
+        H2 只有表结构没有数据, UPDATE/DELETE 影响 0 行、sqlCheck 看到的是空表, 通过不代表在开发库也能通过
+
+        Args:
+            on_progress: 每个 changeSet 每完成一步调用 on_progress(已完成步数, 总步数, 描述)
+
+        Returns:
+            status/message 为整体结果, changesets 为每个 changeSet 的结果
+        """
+        progress = ChangesetProgress(self.liquibase_script, on_progress) if on_progress else None
+        embedded = self._embedded_fast_path() if EMBEDDED_FAST_PATH == "on" else None
+        rejected = {}
+        if embedded is not None:
+            rejected = {
+                (item["id"], item["author"]): item for item in embedded["changesets"] if item["status"] == "error"
+            }
+        if not rejected:
+            return self._validate_script(self.liquibase_script, progress)
+
+        if progress is not None:
+            for item in rejected.values():
+                progress.reject(item)
+        header, items = split_changesets(self.liquibase_script)
+        remaining = [item for item in items if (item["id"], item["author"]) not in rejected]
+        messages = [item["message"] for item in rejected.values()]
+        result = {"changesets": []}
+        if remaining:
+            result = self._validate_script(header + "".join(item["script"] for item in remaining), progress)
+            messages.append(result["message"])
+        result["message"] = "\n".join(messages)
+        checked = {(item["id"], item["author"]): item for item in result["changesets"]}
+        result["changesets"] = [
+            rejected.get((item["id"], item["author"])) or checked[(item["id"], item["author"])] for item in items
+        ]
+        result["status"] = "error"
+        return result
+
+    def _embedded_fast_path(self) -> dict | None:
+        """
+        在嵌入式数据库中验证, 返回与 _validate_script 相同格式的结果(stage 为 embedded)
+        不支持快速验证时返回 None
+        """
+        output = get_embedded_validator().run(self.db_config, self.liquibase_script)
+        if output is None:
+            return None
+        print(output.stdout)
+        print(output.stderr)
+        changesets = [
+            {**item, "stage": "embedded"}
+            for item in self.parse_changeset_results(
+                self.liquibase_script, f"{output.stdout}\n{output.stderr}", output.returncode
+            )
         ]
+        for item in changesets:
+            if item["status"] == "error":
+                item["message"] = f"嵌入式数据库验证失败: {item['message']}"
+        if changesets and all(item["status"] == "success" for item in changesets):
+            return {"status": "success", "message": output.stdout, "changesets": changesets}
+        return {"status": "error", "message": output.stderr or output.stdout, "changesets": changesets}
+
+    def _validate_script(self, liquibase_script: str, progress: ChangesetProgress | None = None) -> dict:
+        """在开发库(或沙箱库)上验证"""
+        db_name = json.loads(self.db_config)["db_name"]
+        with self._validation_env(db_name) as (workspace, tables, target):
+            change_log_file = self.create_change_file(db_name, liquibase_script, workspace.path)
+            # INFO 日志中才有 "ran successfully", 用于解析每个 changeSet 的结果
+            cmd = self._build_cmd(
+                workspace.path,
+                change_log_file,
+                "--log-level=INFO",
+                "update-testing-rollback",
+                tables=tables,
+                target=target,
+            )
+            print("执行命令:", " ".join(cmd))
+            liquibase_output = get_runner().run(cmd, on_output=progress.feed if progress else None)
+            print(liquibase_output.stdout)
+            print(liquibase_output.stderr)
+
+            changesets, applied = self.parse_changeset_states(
+                liquibase_script,
+                f"{liquibase_output.stdout}\n{liquibase_output.stderr}",
+                liquibase_output.returncode,
+            )
+            # update-testing-rollback 结束时变更是执行状态, 沙箱库归还时会重置;
+            # 开发库不会重置, 只能再启动一次 liquibase 回滚 changelog 表中仍有记录的 changeSet
+            cleanup_error = None
+            if SANDBOX != "on" and applied:
+                cleanup_error = self._rollback_applied(workspace.path, change_log_file, applied, tables, target)
+            result = {"changesets": changesets}
+            if changesets and all(item["status"] == "success" for item in changesets):
+                result["status"] = "success"
+                result["message"] = liquibase_output.stdout
+            else:
+                result["status"] = "error"
+                result["message"] = liquibase_output.stderr or liquibase_output.stdout
+                if liquibase_output.returncode == 0:
+                    result["message"] = "没有执行任何changeSet, 请检查changeSet格式或是否已经执行过"
+                workspace.mark_failed()
+            if cleanup_error is not None:
+                result["message"] = f"{result['message']}\n验证后回滚开发库中的变更失败: {cleanup_error}"
+                workspace.mark_failed()
+        return result
+
+    def _rollback_applied(
+        self, search_path: str, change_log_file: str, count: int, tables: ChangelogTables, target: str
+    ) -> str | None:
+        """
+        回滚验证后留在库中的 count 个 changeSet, 失败时返回错误信息
+        changelog 表中最后执行的 count 个就是本次验证的 changeSet
+        """
+        cmd = self._build_cmd(
+            search_path, change_log_file, "rollback-count", f"--count={count}", tables=tables, target=target
+        )
+        print("执行命令:", " ".join(cmd))
+        output = get_runner().run(cmd)
+        print(output.stdout)
+        print(output.stderr)
+        if output.returncode != 0:
+            return output.stderr or output.stdout
+        return None
+
+    def validate_changelog(self, on_progress=None) -> dict:
+        """
+        批量验证: 多个 changeSet 合并为一个 changelog, 只执行一次更新和回滚
+        在 validate_changesets 的结果上增加各状态的数量
+        """
+        result = self.validate_changesets(on_progress)
+        counts = Counter(item["status"] for item in result["changesets"])
+        result["total"] = len(result["changesets"])
+        result["passed"] = counts["success"]
+        result["failed"] = counts["error"]
+        result["not_run"] = counts["not_run"]
+        result["unverified"] = counts["unverified"]
+        return result
+
+    @staticmethod
+    def build_changelog(changesets: list[str]) -> str:
+        """
+        把多个 changeSet 脚本合并为一个 changelog, 去掉各自的 --liquibase formatted sql 头
+
+        Raises:
+            ValueError: 脚本中没有 changeSet, 或 changeSet 的 id 和作者重复
+        """
+        if not changesets:
+            raise ValueError("请提供需要验证的changeSet")
+        parts = []
+        seen = set()
+        for i, changeset in enumerate(changesets, 1):
+            lines = [
+                line for line in changeset.strip().splitlines()
+                if line.strip().lower() != "--liquibase formatted sql"
+            ]
+            script = "\n".join(lines).strip()
+            keys = [(change_id, author) for author, change_id in _CHANGESET_RE.findall(script)]
+            if not keys:
+                raise ValueError(f"第{i}个脚本缺少 --changeset 作者:id")
+            for key in keys:
+                if key in seen:
+                    raise ValueError(f"第{i}个脚本的 changeSet {key[1]}:{key[0]} 重复")
+                seen.add(key)
+            parts.append(script)
+        return "\n\n".join(parts) + "\n"
+
+    @staticmethod
+    def parse_changeset_results(liquibase_script: str, output: str, returncode: int) -> list[dict]:
+        """根据 liquibase 的输出解析每个 changeSet 的执行结果, 见 parse_changeset_states"""
+        return LiquibaseUtils.parse_changeset_states(liquibase_script, output, returncode)[0]
+
+    @staticmethod
+    def parse_changeset_states(liquibase_script: str, output: str, returncode: int) -> tuple[list[dict], int]:
+        """
+        根据 update-testing-rollback 的输出解析每个 changeSet 的执行结果和验证结束时仍在库中的 changeSet 数
+
+        update-testing-rollback 先依次更新全部 changeSet, 再倒序回滚全部, 最后依次再次更新全部,
+        遇到第一个失败就停止。只有 更新 -> 回滚 -> 再更新 都完成的 changeSet 才是 success;
+        失败的 changeSet 取 "Migration failed for changeset" 中的, 没有该信息时取最后一个开始但没有完成的步骤;
+        执行过但没有完成全部步骤的为 unverified, 没有执行的为 not_run。
+
+        Returns:
+            ([{"id", "author", "status", "message"}], 仍在库中(changelog 表中有记录)的 changeSet 数)
+        """
+        runs: Counter = Counter()
+        rolled_back = set()
+        applied = set()
+        started = set()
+        # 正在执行的步骤 (changeSet, "update"/"rollback"), 回滚没有完成日志, 下一个步骤开始时视为完成
+        current = failed = None
+        reason = "changeSet执行或回滚失败"
+
+        def _finish_rollback():
+            if current is not None and current[1] == "rollback":
+                rolled_back.add(current[0])
+                applied.discard(current[0])
+
+        for line in output.splitlines():
+            match = _FAILED_RE.search(line)
+            if match:
+                failed = _changeset_key(match.group(1))
+                reason = line.strip()
+                continue
+            match = _RAN_RE.search(line)
+            if match:
+                _finish_rollback()
+                key = _changeset_key(match.group(1))
+                runs[key] += 1
+                applied.add(key)
+                started.add(key)
+                current = None
+                continue
+            match = _RUNNING_RE.search(line)
+            if match:
+                _finish_rollback()
+                current = (_changeset_key(match.group(1)), "update")
+                started.add(current[0])
+                continue
+            match = _ROLLING_BACK_RE.search(line)
+            if match:
+                _finish_rollback()
+                current = (_changeset_key(match.group(1)), "rollback")
+                started.add(current[0])
+        if returncode == 0:
+            _finish_rollback()
+        elif failed is None and current is not None:
+            failed = current[0]
+
+        results = []
+        for author, change_id in _CHANGESET_RE.findall(liquibase_script):
+            key = (change_id, author)
+            item = {"id": change_id, "author": author}
+            if key == failed:
+                item["status"] = "error"
+                item["message"] = reason
+            elif runs[key] >= 2 and key in rolled_back:
+                item["status"] = "success"
+                item["message"] = "更新和回滚验证通过"
+            elif key in started:
+                item["status"] = "unverified"
+                item["message"] = (
+                    "回滚没有执行, 没有完成验证" if key not in rolled_back else "回滚后没有再次更新, 没有完成验证"
+                )
+            else:
+                item["status"] = "not_run"
+                item["message"] = "changeSet没有执行"
+            results.append(item)
+        return results, len(applied)
+
+    def _execute_update_rollback(self) -> dict:
+        """
+        分别调用 update 和 rollbackCount 1 验证(两次启动 liquibase)
+        """
+        db_name = json.loads(self.db_config)["db_name"]
+        with self._validation_env(db_name) as (workspace, tables, target):
+            result = self._run_update_rollback(workspace.path, db_name, tables, target)
+            if result.get("status") != "success":
+                workspace.mark_failed()
+        return result
+
+    def _run_update_rollback(self, search_path: str, db_name: str, tables: ChangelogTables, target: str) -> dict:
+        change_log_file = self.create_change_file(db_name, self.liquibase_script, search_path)
+        cmd = self._build_cmd(search_path, change_log_file, "update", tables=tables, target=target)
+        rollback_cmd = self._build_cmd(
+            search_path, change_log_file, "rollbackCount", "1", tables=tables, target=target
+        )
         print("执行命令:", " ".join(cmd))
         print("执行命令:", " ".join(rollback_cmd))
         result = {}
         try:
-            liquibase_output = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            liquibase_output = get_runner().run(cmd, check=True)
             print(liquibase_output.stdout)
             print(liquibase_output.stderr)
             if liquibase_output.returncode == 0:
@@ -70,7 +474,7 @@ class LiquibaseUtils:
                 result["status"] = "error"
                 result["message"] = liquibase_output.stderr
                 
-            rollback_result = subprocess.run(rollback_cmd, capture_output=True, text=True, check=True)
+            rollback_result = get_runner().run(rollback_cmd, check=True)
             print(rollback_result.stdout)
             print(rollback_result.stderr)
             if rollback_result.returncode == 0:
@@ -98,10 +502,14 @@ class LiquibaseUtils:
 
         return result_dict
 
-    def create_change_file(self, db_name: str, liquibase_script:str):
+    def create_change_file(self, db_name: str, liquibase_script:str, directory: str):
+        """
+        在工作目录中写入 changelog, 返回相对工作目录的文件名
+        文件名与以前相同, DATABASECHANGELOG 中记录的 FILENAME 不变
+        """
         now_str = datetime.now().strftime("%Y_%m_%d")
         file_path = f"chanageSet_{db_name}_{now_str}.sql"
-        with open(file_path, 'w', encoding='utf-8') as f:
+        with open(os.path.join(directory, file_path), 'w', encoding='utf-8') as f:
             f.write("--liquibase formatted sql\n")
             f.write("\n")
             f.write(liquibase_script)
@@ -112,28 +520,21 @@ class LiquibaseUtils:
         使用 Liquibase 执行 changeLog 变更文件。
         验证大模型生成回滚语句是否有效
         """
-        db_info = json.loads(self.db_config)
-        url = db_info["db_url"]
-        db_name = db_info["db_name"]
-        db_user = db_info["username"]
-        db_pwd = db_info["pwd"]
-        db_url = f"jdbc:mysql://{url}/{db_name}"
-        change_log_file = self.create_change_file(db_name, self.liquibase_script)
-        cmd = [
-            "liquibase",
-            f"--driver=com.mysql.cj.jdbc.Driver",
-            f"--changeLogFile={change_log_file}",
-            f"--url={db_url}",
-            f"--username={db_user}",
-            f"--password={db_pwd}",
-            f"--searchPath=.",
-            f"updateSQL"
-        ]
+        db_name = json.loads(self.db_config)["db_name"]
+        with self._validation_env(db_name) as (workspace, tables, target):
+            result = self._run_update_sql(workspace.path, db_name, tables, target)
+            if result["status"] != "success":
+                workspace.mark_failed()
+        return result
+
+    def _run_update_sql(self, search_path: str, db_name: str, tables: ChangelogTables, target: str) -> dict:
+        change_log_file = self.create_change_file(db_name, self.liquibase_script, search_path)
+        cmd = self._build_cmd(search_path, change_log_file, "updateSQL", tables=tables, target=target)
 
         print("执行命令:", " ".join(cmd))
         result = {}
         try:
-            liquibase_output = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            liquibase_output = get_runner().run(cmd, check=True)
             print(liquibase_output.stdout)
             print(liquibase_output.stderr)
             result["status"] = "success"
@@ -150,12 +551,15 @@ class LiquibaseUtils:
     def create_liquibase_change_id(db_name: str):
         """
         生成Liquibase 的changeSet的ID
-        根据应用名称进行递增
+        按数据库名称和日期递增, 重启和多个 worker 之间不会重复
         """
-        change_id = CHANGESET_ID.get(db_name, 1)
-        change_id = change_id + 1
-        CHANGESET_ID[db_name] = change_id
-        return {"status":"success", "change_id": change_id}
+        day = datetime.now().strftime("%Y%m%d")
+        change_id = get_change_id_allocator().allocate(db_name, day)
+        return {
+            "status": "success",
+            "change_id": change_id,
+            "changeset_id": f"T-{db_name}-{day}-{change_id:03d}",
+        }
 
     
 @dataclass
@@ -164,7 +568,7 @@ class DatabaseUtil:
     def __init__(self, db_config: str):
         self.db_config = db_config
 
-    def query_result_of_prod_by_sql(self, sql: str):
+    def query_result_of_prod_by_sql(self, sql: str, mode: str = "capped", page_size: int = MAX_AFFECTED_ROWS):
         """
         根据db信息查询变更的sql在生产数据库影响的记录数
         影响的记录大于1条则需要拆分变更的sql
@@ -177,38 +581,159 @@ class DatabaseUtil:
                 "count": 0,
                 "data": []
             }
-        db_info = json.loads(self.db_config)
-        url = db_info["db_url"]
-        db_name = db_info["db_name"]
-        db_user = db_info["username"]
-        db_pwd = quote(db_info["pwd"])
-
-        db_url = f"mysql+pymysql://{db_user}:{db_pwd}@{url}/{db_name}"
-        engine = create_engine(db_url)
-        if self.if_only_read(engine, "tmp_private_validate"):
-            return self.query_update_record(engine, sql)
+        engine = self.get_engine()
+        privilege = self.check_read_only(engine)
+        if privilege["read_only"]:
+            result = self.query_update_record(engine, sql, mode, page_size)
+            result["privilege"] = privilege
+            return result
         return  {
                 "status": "error",
                 "message":"请提供只读权限的用户",
                 "count": 0,
-                "data": []
+                "data": [],
+                "privilege": privilege
                 }
 
-    def query_update_record(self, engine, sql: str):
+    def check_read_only(self, engine) -> dict:
+        """
+        判断连接用户是否只读
+        优先根据 SHOW GRANTS 判断(按地址和用户缓存), 查询授权失败时退回临时表探测
+        """
+        db_info = json.loads(self.db_config)
+        try:
+            return get_privilege_cache().check(
+                engine, db_info["db_url"], db_info["username"], db_info["db_name"]
+            )
+        except SQLAlchemyError:
+            return {
+                "read_only": self.if_only_read(engine, "tmp_private_validate"),
+                "reason": "无法查询授权信息, 根据临时表的读写结果判断",
+                "source": "probe",
+                "cached": False,
+            }
+
+    def engine_key(self) -> tuple:
+        """engine 注册表中的 key: (地址, 库名, 用户, 方言)"""
+        db_info = json.loads(self.db_config)
+        dialect = get_dialect(db_info.get("dialect")).name
+        return (db_info["db_url"], db_info["db_name"], db_info["username"], dialect)
+
+    def get_engine(self):
+        """从进程级的注册表中获取(复用)数据库的 engine, 连接串由 dialect 决定"""
+        db_info = json.loads(self.db_config)
+        db_url = get_dialect(db_info.get("dialect")).sqlalchemy_url_for(db_info)
+        return get_engine_registry().get(self.engine_key(), db_url)
+
+    def schema_fingerprint(self):
+        """
+        计算数据库表结构(字段和索引)的指纹
+        表结构变化后指纹随之变化, 用于让缓存的 changeSet 失效
+        """
+        if self.db_config is None:
+            return {"status": "error", "message": "请提供db config"}
+        db_name = json.loads(self.db_config)["db_name"]
+        engine = self.get_engine()
+        with engine.connect() as conn:
+            columns = conn.execute(
+                text(
+                    "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, "
+                    "COLUMN_DEFAULT, COLUMN_KEY FROM information_schema.COLUMNS "
+                    "WHERE TABLE_SCHEMA = :db ORDER BY TABLE_NAME, ORDINAL_POSITION"
+                ),
+                {"db": db_name},
+            ).all()
+            indexes = conn.execute(
+                text(
+                    "SELECT TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME, "
+                    "NON_UNIQUE FROM information_schema.STATISTICS "
+                    "WHERE TABLE_SCHEMA = :db "
+                    "ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX"
+                ),
+                {"db": db_name},
+            ).all()
+        digest = hashlib.sha256()
+        for row in list(columns) + list(indexes):
+            digest.update(json.dumps([str(v) for v in row]).encode("utf-8"))
+        return {
+            "status": "success",
+            "fingerprint": digest.hexdigest(),
+            "tables": len({row[0] for row in columns}),
+        }
 
-        with engine.begin() as conn:
-            result = conn.execute(text(sql))
-            rows = result.mappings().all()
+    def query_update_record(self, engine, sql: str, mode: str = "capped", page_size: int = MAX_AFFECTED_ROWS):
+        """
+        查询变更影响的记录
 
-        datas = [dict(row) for row in rows]
+        Args:
+            mode: count 只返回记录数;
+                  capped 最多读取 MAX_AFFECTED_ROWS+1 条, 超过 MAX_AFFECTED_ROWS 条时 truncated 为 true;
+                  paged 打开服务端游标返回第一页, 用 cursor 调用 fetch_page 读取后续页
+        """
+        sql = sql.strip().rstrip(";")
+        if mode == "count":
+            with engine.connect() as conn:
+                count = conn.execute(text(to_count_sql(sql))).scalar()
+            return {"status": "success", "mode": mode, "count": count, "data": []}
+
+        if mode == "paged":
+            token = get_cursor_registry().open(engine, sql)
+            return self.fetch_page(token, page_size)
+
+        # 在 sql 的 LIMIT 中限制行数, 数据库只返回判断需要的行
+        # (提前关闭服务端游标时驱动会把剩余的行全部读完, 不能节省开销;
+        # 不包子查询, 多表 JOIN 的 SELECT * 在派生表中会有重复的列名)
+        with engine.connect() as conn:
+            rows = conn.execute(text(limit_sql(sql, MAX_AFFECTED_ROWS + 1))).mappings().all()
+        datas = [dict(row) for row in rows[:MAX_AFFECTED_ROWS]]
         output = {
             "status":"success",
+            "mode": "capped",
             "count": len(datas),
+            "truncated": len(rows) > MAX_AFFECTED_ROWS,
             "data": datas
         }
+        if output["truncated"]:
+            output["message"] = f"影响的记录超过{MAX_AFFECTED_ROWS}条, 只返回前{MAX_AFFECTED_ROWS}条"
 
         return output
 
+    @staticmethod
+    def fetch_page(cursor: str, page_size: int = MAX_AFFECTED_ROWS):
+        """读取分页查询的下一页"""
+        page = get_cursor_registry().fetch(cursor, max(1, min(page_size, MAX_PAGE_SIZE)))
+        return {
+            "status": "success",
+            "mode": "paged",
+            "count": len(page["data"]),
+            **page,
+        }
+
+    def estimate_affected_rows(self, change_sql: str):
+        """
+        用 EXPLAIN 估算变更 sql 在生产数据库影响的记录数, 不执行真实的查询
+        返回估算的行数、使用的索引和是否全表扫描, 估算值接近限制时 needs_exact_count 为 true
+        """
+        if self.db_config is None:
+            return {"status": "error", "message": "请提供db config"}
+        try:
+            select_sql = to_select_sql(change_sql)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        engine = self.get_engine()
+        privilege = self.check_read_only(engine)
+        if not privilege["read_only"]:
+            return {"status": "error", "message": "请提供只读权限的用户", "privilege": privilege}
+        with engine.connect() as conn:
+            rows = conn.execute(text(f"EXPLAIN {select_sql}")).mappings().all()
+        return {
+            "status": "success",
+            "select_sql": select_sql,
+            "limit": MAX_AFFECTED_ROWS,
+            **summarize_explain([dict(row) for row in rows], MAX_AFFECTED_ROWS, target_table(change_sql)),
+            "privilege": privilege,
+        }
+
     def if_only_read(self, engine, table_name: str) -> bool:
         """
 
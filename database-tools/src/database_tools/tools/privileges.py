@@ -0,0 +1,143 @@
+import os
+import re
+import time
+import threading
+from sqlalchemy import text
+
+# 权限检查结果的缓存时间(秒)
+PRIVILEGE_TTL = float(os.getenv("DATABASE_TOOLS_PRIVILEGE_TTL", "300"))
+
+# 可以修改数据或表结构的权限
+WRITE_PRIVILEGES = {
+    "ALL",
+    "ALL PRIVILEGES",
+    "INSERT",
+    "UPDATE",
+    "DELETE",
+    "CREATE",
+    "DROP",
+    "ALTER",
+    "INDEX",
+    "TRIGGER",
+    "CREATE VIEW",
+    "CREATE ROUTINE",
+    "ALTER ROUTINE",
+    "CREATE TEMPORARY TABLES",
+    "EVENT",
+    "EXECUTE",
+    "FILE",
+    "SUPER",
+}
+
+_GRANT_RE = re.compile(
+    r"^GRANT\s+(.+?)\s+ON\s+(?:(?:TABLE|FUNCTION|PROCEDURE)\s+)?(\S+)\s+TO\s", re.IGNORECASE
+)
+# 授予角色: GRANT `role`@`%` TO `user`@`%`
+_ROLE_GRANT_RE = re.compile(r"^GRANT\s+[`'\"][^`'\"]+[`'\"]@", re.IGNORECASE)
+
+
+def _db_matches(pattern: str, db_name: str) -> bool:
+    """
+    授权语句中的库名是否匹配目标库, 库名中可以使用 % 和 _ 通配符(\\_ 转义)
+    """
+    if pattern == "*":
+        return True
+    regex = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\" and i + 1 < len(pattern):
+            regex.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        regex.append(".*" if char == "%" else "." if char == "_" else re.escape(char))
+        i += 1
+    return re.fullmatch("".join(regex), db_name) is not None
+
+
+def parse_grants(grants: list[str], db_name: str) -> dict:
+    """
+    根据 SHOW GRANTS 的结果判断用户对 db_name 是否只读
+
+    Returns:
+        {"read_only": bool, "reason": str}
+    """
+    for grant in grants:
+        if _ROLE_GRANT_RE.match(grant):
+            # 角色的权限不会展开在 SHOW GRANTS 中, 无法确认
+            return {"read_only": False, "reason": f"用户通过角色授权, 无法确认只读: {grant}"}
+        match = _GRANT_RE.match(grant)
+        if not match:
+            continue
+        privileges, target = match.groups()
+        scope_db = target.split(".", 1)[0].strip("`'\"")
+        if not _db_matches(scope_db, db_name):
+            continue
+        # 去掉列级授权中的列名, 如 SELECT (id, name)
+        privileges = re.sub(r"\([^)]*\)", "", privileges)
+        for privilege in privileges.split(","):
+            privilege = " ".join(privilege.split()).upper()
+            if privilege in WRITE_PRIVILEGES:
+                return {"read_only": False, "reason": f"用户拥有 {privilege} 权限: {grant}"}
+    return {"read_only": True, "reason": "用户只有只读权限"}
+
+
+class PrivilegeCache:
+    """
+    按 (地址, 用户) 缓存 SHOW GRANTS 的结果
+
+    同一个用户在缓存有效期内不需要再访问数据库,
+    权限变化后可以通过 invalidate 立即失效。
+    """
+
+    def __init__(self, ttl: float = PRIVILEGE_TTL):
+        self.ttl = ttl
+        self._grants: dict[tuple, tuple[float, list[str]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def check(self, engine, host: str, user: str, db_name: str) -> dict:
+        """
+        判断用户对 db_name 是否只读
+
+        Returns:
+            {"read_only": bool, "reason": str, "source": "grants", "cached": bool}
+        """
+        key = (host, user)
+        now = time.time()
+        with self._lock:
+            cached = self._grants.get(key)
+            hit = cached is not None and now - cached[0] < self.ttl
+            if hit:
+                self.hits += 1
+                grants = cached[1]
+            else:
+                self.misses += 1
+        if not hit:
+            with engine.connect() as conn:
+                grants = [row[0] for row in conn.execute(text("SHOW GRANTS"))]
+            with self._lock:
+                self._grants[key] = (now, grants)
+        result = parse_grants(grants, db_name)
+        result["source"] = "grants"
+        result["cached"] = hit
+        return result
+
+    def invalidate(self, host: str | None = None, user: str | None = None):
+        """清除缓存, 不传参数时清除全部"""
+        with self._lock:
+            for key in list(self._grants):
+                if (host is None or key[0] == host) and (user is None or key[1] == user):
+                    del self._grants[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users": len(self._grants), "hits": self.hits, "misses": self.misses}
+
+
+_privilege_cache = PrivilegeCache()
+
+
+def get_privilege_cache() -> PrivilegeCache:
+    return _privilege_cache
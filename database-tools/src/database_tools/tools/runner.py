@@ -0,0 +1,399 @@
+import os
+import json
+import time
+import queue
+import shlex
+import logging
+import threading
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+# liquibase 的执行方式: subprocess 每次启动一个 liquibase 进程, pool 使用常驻的 worker 进程池
+RUNNER = os.getenv("LIQUIBASE_RUNNER", "subprocess")
+# 常驻 worker 的启动命令, 见 database-tools/worker/LiquibaseWorker.java
+WORKER_CMD = os.getenv("LIQUIBASE_WORKER_CMD", "")
+# worker 进程数
+POOL_SIZE = int(os.getenv("LIQUIBASE_RUNNER_POOL_SIZE", "2"))
+# 每个 worker 执行多少次后重启, 避免 liquibase 的静态状态和内存不断累积
+MAX_JOBS = int(os.getenv("LIQUIBASE_RUNNER_MAX_JOBS", "50"))
+# 启动时预先拉起所有 worker
+WARMUP = os.getenv("LIQUIBASE_RUNNER_WARMUP", "true").lower() in ("1", "true", "yes")
+# 等待空闲 worker 的最长时间(秒), 超时后退回一次性进程执行
+QUEUE_TIMEOUT = float(os.getenv("LIQUIBASE_RUNNER_QUEUE_TIMEOUT", "30"))
+# 单条命令的最长执行时间(秒)
+RUN_TIMEOUT = float(os.getenv("LIQUIBASE_RUNNER_TIMEOUT", "300"))
+# worker 启动完成的最长等待时间(秒)
+START_TIMEOUT = float(os.getenv("LIQUIBASE_RUNNER_START_TIMEOUT", "60"))
+
+
+class LiquibaseRunner:
+    """
+    执行 liquibase 命令的接口
+
+    run 接收完整的命令行(第一个参数为 liquibase), 返回 subprocess.CompletedProcess,
+    调用方不需要关心命令是由新进程还是常驻进程执行的。
+    传入 on_output 时每输出一行回调一次; 不能边执行边输出的实现在执行结束后依次回调。
+    """
+
+    # 是否能在执行过程中回调输出
+    streams_output = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._errors = 0
+        self._seconds = 0.0
+
+    def run(
+        self, args: list[str], timeout: float | None = None, check: bool = False, on_output=None
+    ) -> subprocess.CompletedProcess:
+        start = time.perf_counter()
+        try:
+            if on_output is not None and self.streams_output:
+                result = self._run(list(args), timeout or RUN_TIMEOUT, on_output)
+            else:
+                result = self._run(list(args), timeout or RUN_TIMEOUT)
+                if on_output is not None:
+                    for line in f"{result.stdout}\n{result.stderr}".splitlines():
+                        on_output(line)
+        except subprocess.TimeoutExpired as e:
+            result = subprocess.CompletedProcess(args, -1, "", f"liquibase 执行超时({e.timeout}秒)")
+        finally:
+            with self._lock:
+                self._runs += 1
+                self._seconds += time.perf_counter() - start
+        if result.returncode != 0:
+            with self._lock:
+                self._errors += 1
+            if check:
+                raise subprocess.CalledProcessError(
+                    result.returncode, args, output=result.stdout, stderr=result.stderr
+                )
+        return result
+
+    def _run(self, args: list[str], timeout: float) -> subprocess.CompletedProcess:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "runner": type(self).__name__,
+                "runs": self._runs,
+                "errors": self._errors,
+                "avg_seconds": round(self._seconds / self._runs, 3) if self._runs else 0,
+            }
+
+    def close(self):
+        pass
+
+
+class SubprocessRunner(LiquibaseRunner):
+    """每次执行都启动一个新的 liquibase 进程(默认)"""
+
+    streams_output = True
+
+    def _run(self, args: list[str], timeout: float, on_output=None) -> subprocess.CompletedProcess:
+        if on_output is None:
+            return subprocess.run(args, capture_output=True, text=True, timeout=timeout)
+        proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1)
+        outputs = {"stdout": [], "stderr": []}
+        lock = threading.Lock()
+
+        def _read(name, stream):
+            # liquibase 的日志在 stderr, 命令结果在 stdout, 分别读取并按行回调
+            for line in stream:
+                outputs[name].append(line)
+                with lock:
+                    on_output(line.rstrip("\n"))
+
+        readers = [
+            threading.Thread(target=_read, args=("stdout", proc.stdout), daemon=True),
+            threading.Thread(target=_read, args=("stderr", proc.stderr), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+        try:
+            returncode = proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            for reader in readers:
+                reader.join(5)
+        return subprocess.CompletedProcess(args, returncode, "".join(outputs["stdout"]), "".join(outputs["stderr"]))
+
+
+class FakeRunner(LiquibaseRunner):
+    """
+    测试用的 runner, 不启动 liquibase
+
+    handler(args) 返回 CompletedProcess, 不传时所有命令都返回成功,
+    执行过的命令记录在 calls 中
+    """
+
+    def __init__(self, handler=None):
+        super().__init__()
+        self.handler = handler
+        self.calls: list[list[str]] = []
+
+    def _run(self, args: list[str], timeout: float) -> subprocess.CompletedProcess:
+        self.calls.append(args)
+        if self.handler is not None:
+            return self.handler(args)
+        return subprocess.CompletedProcess(args, 0, "Liquibase command executed successfully", "")
+
+
+class _Worker:
+    """
+    常驻的 liquibase worker 进程
+
+    协议: 每行一个 JSON
+        worker 启动完成: {"ready": true}
+        请求: {"args": ["--url=...", "update"]}
+        响应: {"returncode": 0, "stdout": "...", "stderr": "..."}
+    """
+
+    def __init__(self, cmd: list[str]):
+        self.jobs = 0
+        self.proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+
+    def wait_ready(self, timeout: float):
+        self._read(timeout)
+
+    def execute(self, args: list[str], timeout: float) -> subprocess.CompletedProcess:
+        self.jobs += 1
+        self.proc.stdin.write(json.dumps({"args": args[1:]}) + "\n")
+        self.proc.stdin.flush()
+        response = self._read(timeout)
+        return subprocess.CompletedProcess(
+            args, response["returncode"], response.get("stdout", ""), response.get("stderr", "")
+        )
+
+    def _read(self, timeout: float) -> dict:
+        # 超时后杀掉进程, 让阻塞的 readline 返回
+        timer = threading.Timer(timeout, self.proc.kill)
+        timer.start()
+        try:
+            while True:
+                line = self.proc.stdout.readline()
+                if not line:
+                    if timer.finished.is_set():
+                        raise subprocess.TimeoutExpired(self.proc.args, timeout)
+                    raise RuntimeError("liquibase worker 已退出")
+                line = line.strip()
+                # 跳过 worker 启动时的其它输出
+                if line.startswith("{"):
+                    return json.loads(line)
+        finally:
+            timer.cancel()
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def close(self):
+        if self.alive:
+            try:
+                self.proc.stdin.close()
+                self.proc.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.proc.kill()
+
+
+class WorkerPoolRunner(LiquibaseRunner):
+    """
+    常驻 liquibase worker 进程池
+
+    每个 worker 是一个已经加载好 liquibase 和 jdbc 驱动的 JVM, 省去每次 2~4 秒的冷启动。
+    worker 执行 max_jobs 次或出错后重启, 没有空闲 worker 时最多等待 queue_timeout 秒,
+    超时或 worker 无法启动时退回一次性进程执行。
+    """
+
+    def __init__(
+        self,
+        cmd: list[str],
+        size: int = POOL_SIZE,
+        max_jobs: int = MAX_JOBS,
+        warmup: bool = WARMUP,
+        queue_timeout: float = QUEUE_TIMEOUT,
+        fallback: LiquibaseRunner | None = None,
+    ):
+        super().__init__()
+        self.cmd = cmd
+        self.size = max(1, size)
+        self.max_jobs = max(1, max_jobs)
+        self.queue_timeout = queue_timeout
+        self.fallback = fallback or SubprocessRunner()
+        self._idle: queue.Queue[_Worker] = queue.Queue()
+        # 已启动和正在启动的 worker 数
+        self._total = 0
+        self._busy = 0
+        self._waiting = 0
+        self._started = 0
+        self._recycled = 0
+        self._fallbacks = 0
+        self._start_seconds = 0.0
+        self._closed = False
+        if warmup:
+            for _ in range(self.size):
+                self._spawn_async()
+
+    def _reserve(self) -> bool:
+        with self._lock:
+            if self._closed or self._total >= self.size:
+                return False
+            self._total += 1
+            return True
+
+    def _spawn(self) -> _Worker:
+        """启动一个 worker, 调用前需要先 _reserve"""
+        start = time.perf_counter()
+        worker = None
+        try:
+            worker = _Worker(self.cmd)
+            worker.wait_ready(START_TIMEOUT)
+        except Exception:
+            if worker is not None:
+                worker.proc.kill()
+            with self._lock:
+                self._total -= 1
+            raise
+        with self._lock:
+            self._started += 1
+            self._start_seconds += time.perf_counter() - start
+        return worker
+
+    def _spawn_async(self):
+        if not self._reserve():
+            return
+
+        def _start():
+            try:
+                self._idle.put(self._spawn())
+            except Exception as e:
+                logger.warning(f"liquibase worker 启动失败: {e}")
+
+        threading.Thread(target=_start, name="liquibase-worker-start", daemon=True).start()
+
+    def _acquire(self) -> _Worker | None:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        if self._reserve():
+            try:
+                return self._spawn()
+            except Exception as e:
+                logger.warning(f"liquibase worker 启动失败: {e}")
+                return None
+        with self._lock:
+            self._waiting += 1
+        try:
+            return self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            return None
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def _release(self, worker: _Worker, healthy: bool):
+        if healthy and worker.alive and worker.jobs < self.max_jobs and not self._closed:
+            self._idle.put(worker)
+            return
+        worker.close()
+        with self._lock:
+            self._total -= 1
+            self._recycled += 1
+        # 预先拉起替换的 worker, 下一次调用不需要等待冷启动
+        self._spawn_async()
+
+    def _run(self, args: list[str], timeout: float) -> subprocess.CompletedProcess:
+        worker = self._acquire()
+        if worker is None:
+            with self._lock:
+                self._fallbacks += 1
+            return self.fallback.run(args, timeout)
+
+        with self._lock:
+            self._busy += 1
+        healthy = False
+        try:
+            result = worker.execute(args, timeout)
+            # 执行失败后 liquibase 的状态不可靠, 换一个新的 worker
+            healthy = result.returncode == 0
+            return result
+        except (OSError, ValueError, KeyError, RuntimeError) as e:
+            return subprocess.CompletedProcess(args, -1, "", f"liquibase worker 执行失败: {e}")
+        finally:
+            with self._lock:
+                self._busy -= 1
+            self._release(worker, healthy)
+
+    def stats(self) -> dict:
+        result = super().stats()
+        with self._lock:
+            result.update(
+                {
+                    "size": self.size,
+                    "max_jobs": self.max_jobs,
+                    "workers": self._total,
+                    "idle": self._idle.qsize(),
+                    "busy": self._busy,
+                    "waiting": self._waiting,
+                    "started": self._started,
+                    "recycled": self._recycled,
+                    "fallbacks": self._fallbacks,
+                    "avg_start_seconds": (
+                        round(self._start_seconds / self._started, 3) if self._started else 0
+                    ),
+                }
+            )
+        return result
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_runner: LiquibaseRunner | None = None
+_runner_lock = threading.Lock()
+
+
+def create_runner(kind: str = RUNNER, **kwargs) -> LiquibaseRunner:
+    if kind == "pool":
+        if not WORKER_CMD:
+            logger.warning("未配置 LIQUIBASE_WORKER_CMD, 使用一次性进程执行 liquibase")
+            return SubprocessRunner()
+        return WorkerPoolRunner(shlex.split(WORKER_CMD), **kwargs)
+    return SubprocessRunner()
+
+
+def get_runner() -> LiquibaseRunner:
+    """进程级共享的 liquibase runner"""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = create_runner()
+        return _runner
+
+
+def set_runner(runner: LiquibaseRunner) -> LiquibaseRunner:
+    """替换进程级的 runner(启动参数或测试中使用), 返回原来的 runner"""
+    global _runner
+    with _runner_lock:
+        previous, _runner = _runner, runner
+    return previous
@@ -0,0 +1,436 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import logging
+import threading
+import contextlib
+from collections import deque
+from sqlalchemy import text
+from database_tools.tools.engines import get_engine_registry
+from database_tools.tools.dialects import get_dialect
+from database_tools.tools.workspace import get_workspace_manager
+
+logger = logging.getLogger(__name__)
+
+# 是否在沙箱库中验证 changeSet: off 直接在 db_config 指定的开发库上验证, on 租用沙箱库
+SANDBOX = os.getenv("DATABASE_TOOLS_SANDBOX", "off")
+# 每个目标库预热的沙箱库个数, 也是同一个库同时验证的上限
+SANDBOX_POOL_SIZE = int(os.getenv("DATABASE_TOOLS_SANDBOX_POOL_SIZE", "2"))
+# 沙箱库都在使用中时等待的时间(秒)
+SANDBOX_LEASE_TIMEOUT = float(os.getenv("DATABASE_TOOLS_SANDBOX_LEASE_TIMEOUT", "60"))
+# 缓存的表结构多久重新读取一次(秒), 表结构变化后重建沙箱库
+SANDBOX_DDL_TTL = float(os.getenv("DATABASE_TOOLS_SANDBOX_DDL_TTL", "600"))
+# 沙箱库名前缀
+SANDBOX_PREFIX = "sbx_"
+
+
+def ddl_digest(ddl: list[tuple[str, str]]) -> str:
+    digest = hashlib.sha256()
+    for name, sql in ddl:
+        digest.update(f"{name}\0{sql}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class MySQLSandboxBackend:
+    """
+    在开发库所在的 MySQL 实例上用 CREATE DATABASE 创建沙箱库
+
+    表结构取自 SHOW CREATE TABLE, db_config 中的用户需要有 CREATE/DROP DATABASE 权限
+    """
+
+    def __init__(self, db_config: str):
+        self.db_info = json.loads(db_config)
+
+    def _engine(self, db_name: str = ""):
+        info = self.db_info
+        url = get_dialect("mysql").sqlalchemy_url_for({**info, "db_name": db_name})
+        return get_engine_registry().get((info["db_url"], db_name, info["username"], "mysql"), url)
+
+    def fetch_ddl(self) -> list[tuple[str, str]]:
+        with self._engine(self.db_info["db_name"]).connect() as conn:
+            tables = conn.execute(
+                text(
+                    "SELECT TABLE_NAME FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = :db AND TABLE_TYPE = 'BASE TABLE' ORDER BY TABLE_NAME"
+                ),
+                {"db": self.db_info["db_name"]},
+            ).scalars().all()
+            ddl = []
+            for table in tables:
+                create_sql = conn.execute(text(f"SHOW CREATE TABLE `{table}`")).one()[1]
+                # AUTO_INCREMENT 的当前值与结构无关
+                ddl.append((table, " ".join(p for p in create_sql.split() if not p.startswith("AUTO_INCREMENT="))))
+        return ddl
+
+    def create(self, name: str, ddl: list[tuple[str, str]]):
+        with self._engine().connect() as conn:
+            conn.execute(text(f"CREATE DATABASE `{name}`"))
+            conn.execute(text(f"USE `{name}`"))
+            conn.execute(text("SET FOREIGN_KEY_CHECKS = 0"))
+            try:
+                for _, create_sql in ddl:
+                    conn.execute(text(create_sql))
+            finally:
+                conn.execute(text("SET FOREIGN_KEY_CHECKS = 1"))
+            conn.commit()
+
+    def fingerprint(self, name: str) -> str:
+        with self._engine().connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_DEFAULT, COLUMN_KEY "
+                    "FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = :db "
+                    "ORDER BY TABLE_NAME, ORDINAL_POSITION"
+                ),
+                {"db": name},
+            ).all()
+            rows += conn.execute(
+                text(
+                    "SELECT TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME, NON_UNIQUE "
+                    "FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = :db "
+                    "ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX"
+                ),
+                {"db": name},
+            ).all()
+        return hashlib.sha256(json.dumps([[str(v) for v in row] for row in rows]).encode("utf-8")).hexdigest()
+
+    def reset(self, name: str, tables: set[str]):
+        """删除验证中新建的表(如 DATABASECHANGELOG), 清空其它表的数据"""
+        with self._engine().connect() as conn:
+            existing = conn.execute(
+                text("SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = :db"),
+                {"db": name},
+            ).scalars().all()
+            conn.execute(text("SET FOREIGN_KEY_CHECKS = 0"))
+            try:
+                for table in existing:
+                    if table in tables:
+                        conn.execute(text(f"TRUNCATE TABLE `{name}`.`{table}`"))
+                    else:
+                        conn.execute(text(f"DROP TABLE IF EXISTS `{name}`.`{table}`"))
+            finally:
+                conn.execute(text("SET FOREIGN_KEY_CHECKS = 1"))
+            conn.commit()
+
+    def drop(self, name: str):
+        with self._engine().connect() as conn:
+            conn.execute(text(f"DROP DATABASE IF EXISTS `{name}`"))
+            conn.commit()
+
+    def db_config(self, name: str) -> str:
+        return json.dumps({**self.db_info, "db_name": name})
+
+
+class SQLiteSandboxBackend:
+    """
+    嵌入式的 SQLite 沙箱, 用于本地测试
+
+    db_config 的 db_url 为源 SQLite 文件, 表结构建成模板文件后, 每个沙箱库复制一份模板
+    """
+
+    def __init__(self, db_config: str, root: str | None = None):
+        self.db_info = json.loads(db_config)
+        self.root = root or get_workspace_manager().shared_dir("sandboxes")
+        self._templates: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, f"{name}.db")
+
+    def fetch_ddl(self) -> list[tuple[str, str]]:
+        with contextlib.closing(sqlite3.connect(self.db_info["db_url"])) as conn:
+            rows = conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+                "ORDER BY CASE type WHEN 'table' THEN 0 ELSE 1 END, name"
+            ).fetchall()
+        return [(name, sql) for name, sql in rows]
+
+    def _template(self, ddl: list[tuple[str, str]]) -> str:
+        key = ddl_digest(ddl)
+        with self._lock:
+            path = self._templates.get(key)
+            if path is None or not os.path.exists(path):
+                path = self._path(f"template_{key[:16]}")
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+                with contextlib.closing(sqlite3.connect(path)) as conn:
+                    for _, create_sql in ddl:
+                        conn.execute(create_sql)
+                    conn.commit()
+                self._templates[key] = path
+            return path
+
+    def create(self, name: str, ddl: list[tuple[str, str]]):
+        # 复制模板文件比逐条执行 DDL 快
+        shutil.copyfile(self._template(ddl), self._path(name))
+
+    def fingerprint(self, name: str) -> str:
+        with contextlib.closing(sqlite3.connect(self._path(name))) as conn:
+            rows = conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY type, name").fetchall()
+        return hashlib.sha256(json.dumps(rows).encode("utf-8")).hexdigest()
+
+    def reset(self, name: str, tables: set[str]):
+        with contextlib.closing(sqlite3.connect(self._path(name))) as conn:
+            existing = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+                )
+            ]
+            for table in existing:
+                if table in tables:
+                    conn.execute(f'DELETE FROM "{table}"')
+                else:
+                    conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+            conn.commit()
+
+    def drop(self, name: str):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._path(name))
+
+    def db_config(self, name: str) -> str:
+        return json.dumps({**self.db_info, "db_url": self._path(name), "db_name": name})
+
+
+def create_backend(db_config: str):
+    """根据 db_config 中的 dialect 选择沙箱的实现"""
+    dialect = get_dialect(json.loads(db_config).get("dialect")).name
+    if dialect == "sqlite":
+        return SQLiteSandboxBackend(db_config)
+    if dialect == "mysql":
+        return MySQLSandboxBackend(db_config)
+    raise ValueError(f"沙箱不支持的数据库类型: {dialect}")
+
+
+class Sandbox:
+    __slots__ = ("name", "db_config", "ddl_version", "fingerprint", "tables")
+
+    def __init__(self, name: str, db_config: str, ddl_version: str, fingerprint: str, tables: set[str]):
+        self.name = name
+        self.db_config = db_config
+        self.ddl_version = ddl_version
+        # 刚创建时的表结构指纹, 归还时不一致说明回滚没有还原表结构, 需要重建
+        self.fingerprint = fingerprint
+        self.tables = tables
+
+
+class SandboxPool:
+    """
+    一个目标库的沙箱库池
+
+    沙箱库按缓存的表结构(DDL)创建, 不包含数据。验证时租用一个, 结束后归还:
+    表结构没有变化时清空数据后复用, 回滚没有还原表结构时删除重建。
+    """
+
+    def __init__(
+        self,
+        backend,
+        prefix: str,
+        size: int = SANDBOX_POOL_SIZE,
+        lease_timeout: float = SANDBOX_LEASE_TIMEOUT,
+        ddl_ttl: float = SANDBOX_DDL_TTL,
+    ):
+        self.backend = backend
+        self.prefix = prefix
+        self.size = max(1, size)
+        self.lease_timeout = lease_timeout
+        self.ddl_ttl = ddl_ttl
+        self._idle: deque[Sandbox] = deque()
+        self._total = 0
+        self._seq = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._ddl: list[tuple[str, str]] | None = None
+        self._ddl_version = ""
+        self._ddl_at = 0.0
+        self._ddl_lock = threading.Lock()
+        self.leases = 0
+        self.waits = 0
+        self.resets = 0
+        self.reclones = 0
+
+    def _current_ddl(self) -> tuple[list[tuple[str, str]], str]:
+        """读取(缓存的)表结构, 返回 (DDL, 版本)"""
+        with self._ddl_lock:
+            if self._ddl is None or time.time() - self._ddl_at > self.ddl_ttl:
+                ddl = self.backend.fetch_ddl()
+                version = ddl_digest(ddl)
+                if self._ddl is not None and version != self._ddl_version:
+                    logger.info(f"{self.prefix} 表结构变化, 重建沙箱库")
+                self._ddl, self._ddl_version, self._ddl_at = ddl, version, time.time()
+            return self._ddl, self._ddl_version
+
+    def _next_name(self) -> str:
+        with self._cond:
+            self._seq += 1
+            return f"{self.prefix}{self._seq}"
+
+    def _create(self) -> Sandbox:
+        ddl, version = self._current_ddl()
+        name = self._next_name()
+        self.backend.drop(name)
+        self.backend.create(name, ddl)
+        return Sandbox(
+            name,
+            self.backend.db_config(name),
+            version,
+            self.backend.fingerprint(name),
+            {table for table, _ in ddl},
+        )
+
+    def warm(self):
+        """预热到 size 个沙箱库"""
+        while True:
+            with self._cond:
+                if self._closed or self._total >= self.size:
+                    return
+                self._total += 1
+            try:
+                sandbox = self._create()
+            except Exception as e:
+                logger.warning(f"预热沙箱库失败: {e}")
+                with self._cond:
+                    self._total -= 1
+                    self._cond.notify()
+                return
+            with self._cond:
+                self._idle.append(sandbox)
+                self._cond.notify()
+
+    @contextlib.contextmanager
+    def lease(self):
+        """租用一个沙箱库, 结束时重置后归还"""
+        deadline = time.monotonic() + self.lease_timeout
+        sandbox = None
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("沙箱池已关闭")
+            while not self._idle and self._total >= self.size:
+                self.waits += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    raise TimeoutError(f"等待沙箱库超时({self.lease_timeout}秒)")
+            if self._idle:
+                sandbox = self._idle.popleft()
+            else:
+                self._total += 1
+            self.leases += 1
+        try:
+            if sandbox is None:
+                sandbox = self._create()
+            elif sandbox.ddl_version != self._current_ddl()[1]:
+                self._discard(sandbox)
+                sandbox = self._create()
+        except BaseException:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        try:
+            yield sandbox
+        finally:
+            self._release(sandbox)
+
+    def _discard(self, sandbox: Sandbox):
+        try:
+            self.backend.drop(sandbox.name)
+        except Exception as e:
+            logger.warning(f"删除沙箱库 {sandbox.name} 失败: {e}")
+
+    def _release(self, sandbox: Sandbox):
+        try:
+            if self._closed:
+                raise RuntimeError("沙箱池已关闭")
+            self.backend.reset(sandbox.name, sandbox.tables)
+            if self.backend.fingerprint(sandbox.name) == sandbox.fingerprint:
+                self.resets += 1
+            else:
+                # 回滚没有还原表结构, 重建
+                self.reclones += 1
+                self._discard(sandbox)
+                sandbox = self._create()
+        except Exception as e:
+            if not self._closed:
+                logger.warning(f"重置沙箱库 {sandbox.name} 失败: {e}")
+            self._discard(sandbox)
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append(sandbox)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for sandbox in idle:
+            self._discard(sandbox)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self.size,
+                "total": self._total,
+                "idle": len(self._idle),
+                "leases": self.leases,
+                "waits": self.waits,
+                "resets": self.resets,
+                "reclones": self.reclones,
+            }
+
+
+class SandboxManager:
+    """按目标库(地址/库名)管理沙箱库池, 第一次使用时创建并在后台预热"""
+
+    def __init__(self, size: int = SANDBOX_POOL_SIZE):
+        self.size = size
+        self._pools: dict[tuple, SandboxPool] = {}
+        self._lock = threading.Lock()
+
+    def get_pool(self, db_config: str) -> SandboxPool:
+        db_info = json.loads(db_config)
+        key = (db_info["db_url"], db_info["db_name"], get_dialect(db_info.get("dialect")).name)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                # 库名中带上进程号, 多个 worker 共用一个实例时不会冲突
+                prefix = f"{SANDBOX_PREFIX}{db_info['db_name'][:32]}_{os.getpid()}_"
+                pool = self._pools[key] = SandboxPool(create_backend(db_config), prefix, self.size)
+                threading.Thread(target=pool.warm, name=f"warm-{prefix}", daemon=True).start()
+            return pool
+
+    def lease(self, db_config: str):
+        return self.get_pool(db_config).lease()
+
+    def close_all(self):
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            pools = dict(self._pools)
+        return {f"{key[0]}/{key[1]}": pool.stats() for key, pool in pools.items()}
+
+
+_sandbox_manager: SandboxManager | None = None
+_sandbox_lock = threading.Lock()
+
+
+def get_sandbox_manager() -> SandboxManager:
+    """进程级共享的沙箱库管理器"""
+    global _sandbox_manager
+    with _sandbox_lock:
+        if _sandbox_manager is None:
+            _sandbox_manager = SandboxManager()
+        return _sandbox_manager
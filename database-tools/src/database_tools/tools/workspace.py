@@ -0,0 +1,141 @@
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+import contextlib
+
+logger = logging.getLogger(__name__)
+
+
+def _default_root() -> str:
+    """优先使用内存文件系统 /dev/shm, 不可写时使用系统临时目录"""
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return os.path.join("/dev/shm", "database_tools")
+    return os.path.join(tempfile.gettempdir(), "database_tools")
+
+
+# 每次工具调用的工作目录所在的根目录
+WORKSPACE_ROOT = os.getenv("DATABASE_TOOLS_WORKSPACE_ROOT") or _default_root()
+# 验证失败时保留工作目录, 便于排查(默认删除)
+KEEP_FAILED_WORKSPACE = os.getenv("DATABASE_TOOLS_KEEP_FAILED_WORKSPACE", "false").lower() in ("1", "true", "yes")
+# 启动时清理多久以前遗留的工作目录(秒), 进程被强制结束时目录来不及删除
+STALE_WORKSPACE_AGE = float(os.getenv("DATABASE_TOOLS_STALE_WORKSPACE_AGE", "86400"))
+# 根目录下长期保存文件的子目录(沙箱库和嵌入式数据库的模板), 不会被清理
+SHARED_DIRS = {"sandboxes", "embedded"}
+
+
+class Workspace:
+    """
+    一次工具调用独占的工作目录, changelog 文件写在这里
+
+    liquibase 使用 --searchPath=<工作目录> 和相对路径的 changeLogFile,
+    DATABASECHANGELOG 中记录的文件名与以前相同, 常驻 worker 不依赖当前目录。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.failed = False
+
+    def write_file(self, name: str, content: str) -> str:
+        """写入文件, 返回相对工作目录的文件名"""
+        with open(os.path.join(self.path, name), "w", encoding="utf-8") as f:
+            f.write(content)
+        return name
+
+    def mark_failed(self):
+        """标记本次调用失败, 开启 KEEP_FAILED_WORKSPACE 时保留工作目录"""
+        self.failed = True
+
+
+class WorkspaceManager:
+    """
+    创建和清理工作目录
+
+    每次调用在 WORKSPACE_ROOT 下创建唯一的目录, 调用结束(包括异常)时删除,
+    失败且开启 keep_failed 时保留并记录日志。
+    """
+
+    def __init__(self, root: str = WORKSPACE_ROOT, keep_failed: bool = KEEP_FAILED_WORKSPACE):
+        self.root = root
+        self.keep_failed = keep_failed
+        self._active: set[str] = set()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.kept = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    @contextlib.contextmanager
+    def workspace(self, prefix: str = "ws"):
+        # 目录名中只保留安全的字符
+        prefix = "".join(c if c.isalnum() or c in "-_" else "_" for c in prefix)[:40]
+        path = tempfile.mkdtemp(prefix=f"{prefix}_", dir=self.root)
+        with self._lock:
+            self._active.add(path)
+            self.created += 1
+        ws = Workspace(path)
+        try:
+            yield ws
+        except BaseException:
+            ws.mark_failed()
+            raise
+        finally:
+            with self._lock:
+                self._active.discard(path)
+            if ws.failed and self.keep_failed:
+                with self._lock:
+                    self.kept += 1
+                logger.warning(f"验证失败, 保留工作目录 {path}")
+            else:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def shared_dir(self, name: str) -> str:
+        """长期保存文件的子目录, name 需要在 SHARED_DIRS 中"""
+        if name not in SHARED_DIRS:
+            raise ValueError(f"未登记的共享目录: {name}")
+        path = os.path.join(self.root, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def purge_stale(self, max_age: float = STALE_WORKSPACE_AGE) -> int:
+        """删除遗留的工作目录(不包括正在使用的), 返回删除的个数"""
+        now = time.time()
+        removed = 0
+        with self._lock:
+            active = set(self._active)
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name in SHARED_DIRS or path in active or not os.path.isdir(path):
+                continue
+            try:
+                if now - os.path.getmtime(path) < max_age:
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "root": self.root,
+                "active": len(self._active),
+                "created": self.created,
+                "kept": self.kept,
+                "keep_failed": self.keep_failed,
+            }
+
+
+_workspace_manager: WorkspaceManager | None = None
+_workspace_lock = threading.Lock()
+
+
+def get_workspace_manager() -> WorkspaceManager:
+    """进程级共享的工作目录管理器"""
+    global _workspace_manager
+    with _workspace_lock:
+        if _workspace_manager is None:
+            _workspace_manager = WorkspaceManager()
+        return _workspace_manager
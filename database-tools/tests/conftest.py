@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+from database_tools.tools import liqubase
+from database_tools.tools.runner import FakeRunner, set_runner
+from database_tools.tools.workspace import WorkspaceManager
+
+
+@pytest.fixture
+def db_config(tmp_path) -> str:
+    return json.dumps(
+        {"dialect": "sqlite", "db_url": str(tmp_path / "dev.db"), "db_name": "dev", "username": "", "pwd": ""}
+    )
+
+
+@pytest.fixture
+def use_runner(tmp_path, monkeypatch):
+    """安装 FakeRunner(handler), 工作目录放在临时目录中"""
+    workspaces = WorkspaceManager(str(tmp_path / "workspaces"))
+    monkeypatch.setattr(liqubase, "get_workspace_manager", lambda: workspaces)
+    previous = []
+
+    def _use(handler) -> FakeRunner:
+        runner = FakeRunner(handler)
+        previous.append(set_runner(runner))
+        return runner
+
+    yield _use
+    if previous:
+        set_runner(previous[0])
@@ -0,0 +1,64 @@
+"""构造 changeSet 脚本和 liquibase 日志, 配合 FakeRunner 使用"""
+import subprocess
+
+CHANGELOG_FILE = "changelog.sql"
+_LOG = "[2026-01-01 10:00:00] INFO [liquibase.changelog]"
+
+
+def changeset(author: str, change_id: str, sql: str = "UPDATE t SET a = 1 WHERE id = 1;") -> str:
+    return f"--changeset {author}:{change_id}\n{sql}\n--rollback UPDATE t SET a = 0 WHERE id = 1;\n"
+
+
+def script(*changesets: str) -> str:
+    return "--liquibase formatted sql\n" + "\n".join(changesets)
+
+
+def completed(args, lines: list[str], returncode: int = 0) -> subprocess.CompletedProcess:
+    return subprocess.CompletedProcess(args, returncode, "", "\n".join(lines))
+
+
+def update_testing_rollback(
+    args, *changesets: tuple[str, str], fail: tuple[str, str] | None = None, stage: str = "update"
+) -> subprocess.CompletedProcess:
+    """
+    按 liquibase update-testing-rollback 的执行顺序构造 --log-level=INFO 的输出:
+    依次更新全部 changeSet -> 倒序回滚全部 -> 依次再次更新全部, 遇到第一个失败就退出
+
+    Args:
+        changesets: (作者, id), 按 changelog 中的顺序
+        fail: 失败的 changeSet (作者, id)
+        stage: 失败的阶段 update/rollback/reupdate
+    """
+    lines = []
+
+    def identifier(author, change_id):
+        return f"{CHANGELOG_FILE}::{change_id}::{author}"
+
+    def update(phase):
+        for author, change_id in changesets:
+            lines.append(f"{_LOG} Running Changeset: {identifier(author, change_id)}")
+            if (author, change_id) == fail and stage == phase:
+                lines.append(
+                    f"Unexpected error running Liquibase: Migration failed for changeset "
+                    f"{identifier(author, change_id)}:"
+                )
+                lines.append("     Reason: liquibase.exception.DatabaseException: Unknown column 'b'")
+                return False
+            lines.append(f"{_LOG} ChangeSet {identifier(author, change_id)} ran successfully in 3ms")
+        return True
+
+    def rollback():
+        for author, change_id in reversed(changesets):
+            lines.append(f"{_LOG} Rolling Back Changeset: {identifier(author, change_id)}")
+            if (author, change_id) == fail and stage == "rollback":
+                lines.append(
+                    "Unexpected error running Liquibase: liquibase.exception.RollbackFailedException: "
+                    "liquibase.exception.DatabaseException: Table 't_bak' doesn't exist"
+                )
+                return False
+        return True
+
+    ok = update("update") and rollback() and update("reupdate")
+    if ok:
+        lines.append("Liquibase command 'update-testing-rollback' was executed successfully.")
+    return completed(args, lines, 0 if ok else 1)
@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import create_engine, event, text
+
+from database_tools.tools.explain import to_select_sql
+from database_tools.tools.liqubase import MAX_AFFECTED_ROWS, DatabaseUtil
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE a (id INTEGER, name TEXT)"))
+        conn.execute(text("CREATE TABLE b (id INTEGER, a_id INTEGER)"))
+        for i in range(MAX_AFFECTED_ROWS + 50):
+            conn.execute(text("INSERT INTO a VALUES (:id, :name)"), {"id": i, "name": f"n{i}"})
+            conn.execute(text("INSERT INTO b VALUES (:id, :id)"), {"id": i})
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+    engine.statements = statements
+    return engine
+
+
+def test_join_query_is_not_wrapped_in_a_derived_table(engine):
+    # MySQL 的派生表不允许重复的列名(a.id 和 b.id), JOIN 的 SELECT * 不能包子查询
+    sql = to_select_sql("UPDATE a JOIN b ON a.id = b.a_id SET a.name = 'x' WHERE b.id >= 10")
+    util = DatabaseUtil("{}")
+
+    capped = util.query_update_record(engine, sql)
+    assert capped["count"] == MAX_AFFECTED_ROWS
+    assert capped["truncated"] is True
+
+    counted = util.query_update_record(engine, sql, mode="count")
+    assert counted["count"] == MAX_AFFECTED_ROWS + 40
+
+    assert not any("affected_rows" in statement for statement in engine.statements)
+    assert engine.statements[0].endswith(f"LIMIT {MAX_AFFECTED_ROWS + 1}")
+    assert engine.statements[1].startswith("SELECT COUNT(*) FROM a JOIN b")
+
+
+def test_capped_query_keeps_smaller_limit(engine):
+    result = DatabaseUtil("{}").query_update_record(engine, "SELECT * FROM a ORDER BY id LIMIT 3")
+    assert [row["id"] for row in result["data"]] == [0, 1, 2]
+    assert result["truncated"] is False
@@ -0,0 +1,42 @@
+import threading
+
+from database_tools.tools.change_id import ChangeIdAllocator
+
+
+def test_allocate_increments_per_db_and_day(tmp_path):
+    allocator = ChangeIdAllocator(str(tmp_path / "ids.db"), block_size=2)
+    assert [allocator.allocate("app", "20260101") for _ in range(5)] == [1, 2, 3, 4, 5]
+    assert allocator.allocate("other", "20260101") == 1
+    assert allocator.allocate("app", "20260102") == 1
+
+
+def test_restart_continues_after_reserved_block(tmp_path):
+    path = str(tmp_path / "ids.db")
+    first = ChangeIdAllocator(path, block_size=10)
+    assert first.allocate("app", "20260101") == 1
+    # 没有用完的序号被跳过
+    assert ChangeIdAllocator(path, block_size=10).allocate("app", "20260101") == 11
+
+
+def test_concurrent_allocators_never_share_an_id(tmp_path):
+    path = str(tmp_path / "ids.db")
+    allocators = [ChangeIdAllocator(path, block_size=3) for _ in range(4)]
+    results: list[int] = []
+    results_lock = threading.Lock()
+    start = threading.Barrier(16)
+
+    def worker(allocator: ChangeIdAllocator):
+        start.wait()
+        ids = [allocator.allocate("app", "20260101") for _ in range(50)]
+        with results_lock:
+            results.extend(ids)
+
+    # 每个分配器由多个线程共用, 模拟多个 worker 进程中的并发请求
+    threads = [threading.Thread(target=worker, args=(allocators[i % 4],)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 16 * 50
+    assert len(set(results)) == len(results)
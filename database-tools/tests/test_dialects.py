@@ -0,0 +1,33 @@
+import pytest
+from sqlalchemy.engine import make_url
+
+from database_tools.tools.dialects import DIALECTS, get_dialect
+
+DB_INFO = {"db_url": "localhost:3306", "db_name": "app", "username": "dev@corp", "pwd": "p@ss:word/1"}
+# pyproject.toml 中声明的 SQLAlchemy 驱动
+DECLARED_DRIVERS = {"pymysql", "psycopg", "pysqlite"}
+
+
+@pytest.mark.parametrize("name", [name for name, dialect in DIALECTS.items() if dialect.sqlalchemy_url])
+def test_engine_url_for_each_dialect(name):
+    url = make_url(DIALECTS[name].sqlalchemy_url_for(DB_INFO))
+
+    assert url.get_dialect().name == name
+    assert url.get_driver_name() in DECLARED_DRIVERS
+    if name != "sqlite":
+        assert (url.username, url.password, url.database) == ("dev@corp", "p@ss:word/1", "app")
+
+
+def test_dialect_without_sqlalchemy_driver():
+    with pytest.raises(ValueError):
+        DIALECTS["h2"].sqlalchemy_url_for(DB_INFO)
+
+
+@pytest.mark.parametrize("name, expected", [(None, "mysql"), ("PG", "postgresql"), ("mariadb", "mysql")])
+def test_aliases(name, expected):
+    assert get_dialect(name).name == expected
+
+
+def test_unknown_dialect():
+    with pytest.raises(ValueError):
+        get_dialect("oracle")
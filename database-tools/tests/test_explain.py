@@ -0,0 +1,74 @@
+import pytest
+
+from database_tools.tools.explain import limit_sql, summarize_explain, target_table, to_count_sql
+
+
+@pytest.mark.parametrize(
+    "sql, target",
+    [
+        ("UPDATE t SET a = 1 WHERE id = 1", "t"),
+        ("UPDATE `db`.`t` SET a = 1", "t"),
+        ("UPDATE t AS x SET a = 1", "x"),
+        ("UPDATE t x JOIN y ON x.id = y.id SET a = 1", "x"),
+        ("UPDATE a JOIN b ON a.id = b.id SET b.x = 1 WHERE a.y = 2", "b"),
+        ("UPDATE a JOIN b ON a.id = b.id SET `b`.`x` = 1", "b"),
+        ("UPDATE a JOIN b ON 1 SET a.x = IF(b.c = 1, 2, 3), b.y = 2", "a"),
+        ("UPDATE t SET a = 'x.y=1'", "t"),
+        ("DELETE FROM db.t WHERE id = 1", "t"),
+        ("DELETE LOW_PRIORITY FROM t WHERE id = 1", "t"),
+        ("DELETE a FROM a JOIN b ON a.id = b.id", "a"),
+        ("DELETE FROM t1 USING t1 JOIN t2 ON t1.id = t2.id", "t1"),
+        ("SELECT * FROM t1 JOIN t2 ON t1.id = t2.id", "t1"),
+    ],
+)
+def test_target_table(sql, target):
+    assert target_table(sql) == target
+
+
+def _row(table, rows, type_="ref", key=None, filtered=100):
+    return {"table": table, "type": type_, "key": key, "rows": rows, "filtered": filtered}
+
+
+def test_summarize_uses_target_table_not_first_row():
+    # 优化器可能先扫描被关联的表, 目标表不在第一行
+    rows = [_row("b", 10, key="idx_b"), _row("a", 500, type_="ALL", filtered=50)]
+    summary = summarize_explain(rows, 100, target_table("UPDATE a JOIN b ON a.id = b.id SET a.x = 1"))
+    assert summary["estimated_rows"] == 250
+    assert summary["index"] is None
+    assert summary["full_scan"] is True
+
+
+def test_summarize_falls_back_to_first_row():
+    summary = summarize_explain([_row("t", 40, key="PRIMARY")], 100, "unknown")
+    assert summary["estimated_rows"] == 40
+    assert summary["index"] == "PRIMARY"
+
+
+@pytest.mark.parametrize(
+    "sql, expected",
+    [
+        ("SELECT * FROM t WHERE id > 1;", "SELECT * FROM t WHERE id > 1 LIMIT 101"),
+        ("SELECT * FROM t LIMIT 500", "SELECT * FROM t LIMIT 101"),
+        ("SELECT * FROM t LIMIT 5", "SELECT * FROM t LIMIT 5"),
+        ("SELECT * FROM t LIMIT 20, 500", "SELECT * FROM t LIMIT 20, 101"),
+        ("SELECT * FROM t limit 500 offset 20", "SELECT * FROM t LIMIT 101 OFFSET 20"),
+        ("SELECT * FROM t WHERE id IN (SELECT id FROM s LIMIT 5)", "SELECT * FROM t WHERE id IN (SELECT id FROM s LIMIT 5) LIMIT 101"),
+        ("SELECT * FROM t WHERE note = 'no limit'", "SELECT * FROM t WHERE note = 'no limit' LIMIT 101"),
+    ],
+)
+def test_limit_sql(sql, expected):
+    assert limit_sql(sql, 101) == expected
+
+
+@pytest.mark.parametrize(
+    "sql, expected",
+    [
+        ("SELECT * FROM a JOIN b ON a.id = b.a_id WHERE b.id < 5", "SELECT COUNT(*) FROM a JOIN b ON a.id = b.a_id WHERE b.id < 5"),
+        ("select a.*, (SELECT 1 FROM s) AS x FROM a;", "SELECT COUNT(*) FROM a"),
+        ("SELECT DISTINCT a FROM t", "SELECT COUNT(*) FROM (SELECT DISTINCT a FROM t) AS affected_rows"),
+        ("SELECT a FROM t GROUP BY a", "SELECT COUNT(*) FROM (SELECT a FROM t GROUP BY a) AS affected_rows"),
+        ("SELECT * FROM t LIMIT 5", "SELECT COUNT(*) FROM (SELECT * FROM t LIMIT 5) AS affected_rows"),
+    ],
+)
+def test_to_count_sql(sql, expected):
+    assert to_count_sql(sql) == expected
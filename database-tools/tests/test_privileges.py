@@ -0,0 +1,91 @@
+import pytest
+
+from database_tools.tools.privileges import parse_grants
+
+
+@pytest.mark.parametrize(
+    "grant",
+    [
+        "GRANT ALL PRIVILEGES ON *.* TO `root`@`%`",
+        "GRANT ALL ON `app`.* TO `dev`@`%`",
+        "GRANT SELECT, INSERT, UPDATE ON `app`.* TO `dev`@`%`",
+        "grant select, delete on app.* to 'dev'@'%'",
+        "GRANT SELECT, CREATE TEMPORARY TABLES ON `app`.* TO `dev`@`%`",
+        "GRANT EXECUTE ON PROCEDURE `app`.`refresh` TO `dev`@`%`",
+    ],
+)
+def test_write_privileges(grant):
+    result = parse_grants(["GRANT USAGE ON *.* TO `dev`@`%`", grant], "app")
+    assert result["read_only"] is False
+    assert grant in result["reason"]
+
+
+def test_read_only_privileges():
+    grants = [
+        "GRANT USAGE ON *.* TO `reader`@`%`",
+        "GRANT SELECT, SHOW VIEW ON `app`.* TO `reader`@`%`",
+    ]
+    assert parse_grants(grants, "app")["read_only"] is True
+
+
+def test_no_grants_is_read_only():
+    assert parse_grants([], "app")["read_only"] is True
+
+
+@pytest.mark.parametrize(
+    "grant, read_only",
+    [
+        ("GRANT SELECT (`id`, `name`) ON `app`.`users` TO `dev`@`%`", True),
+        ("GRANT SELECT (`id`), UPDATE (`nick_name`, `open_id`) ON `app`.`users` TO `dev`@`%`", False),
+        ("GRANT INSERT (id) ON TABLE app.users TO 'dev'@'%'", False),
+    ],
+)
+def test_column_level_grants(grant, read_only):
+    assert parse_grants([grant], "app")["read_only"] is read_only
+
+
+def test_global_grant_applies_to_every_database():
+    grants = ["GRANT SELECT ON `app`.* TO `dev`@`%`", "GRANT UPDATE ON *.* TO `dev`@`%`"]
+    assert parse_grants(grants, "app")["read_only"] is False
+    assert parse_grants(grants, "other")["read_only"] is False
+
+
+def test_database_scoped_grant_only_applies_to_that_database():
+    grants = ["GRANT SELECT ON *.* TO `dev`@`%`", "GRANT ALL PRIVILEGES ON `other`.* TO `dev`@`%`"]
+    assert parse_grants(grants, "app")["read_only"] is True
+    assert parse_grants(grants, "other")["read_only"] is False
+
+
+@pytest.mark.parametrize(
+    "scope, db_name, read_only",
+    [
+        ("`app%`", "app_test", False),
+        ("`app\\_%`", "app_test", False),
+        ("`app\\_%`", "apptest", True),
+        ("`app_`", "app1", False),
+        ("`app_`", "app12", True),
+    ],
+)
+def test_database_wildcards(scope, db_name, read_only):
+    grants = [f"GRANT INSERT ON {scope}.* TO `dev`@`%`"]
+    assert parse_grants(grants, db_name)["read_only"] is read_only
+
+
+def test_with_grant_option():
+    read_grant = "GRANT SELECT ON `app`.* TO `dev`@`%` WITH GRANT OPTION"
+    write_grant = "GRANT SELECT, UPDATE ON `app`.* TO `dev`@`%` WITH GRANT OPTION"
+    assert parse_grants([read_grant], "app")["read_only"] is True
+    assert parse_grants([write_grant], "app")["read_only"] is False
+
+
+@pytest.mark.parametrize(
+    "grant",
+    [
+        "GRANT `app_writer`@`%` TO `dev`@`%`",
+        "GRANT 'reader'@'%', 'writer'@'%' TO 'dev'@'%'",
+    ],
+)
+def test_role_grants_are_not_trusted(grant):
+    result = parse_grants(["GRANT USAGE ON *.* TO `dev`@`%`", grant], "app")
+    assert result["read_only"] is False
+    assert "角色" in result["reason"]
@@ -0,0 +1,98 @@
+import pytest
+
+from database_tools.tools.liqubase import LiquibaseUtils
+
+from .liquibase_output import changeset, completed, update_testing_rollback
+
+
+def test_build_changelog_keeps_order_and_strips_headers():
+    changesets = [
+        "--liquibase formatted sql\n" + changeset("bob", "2"),
+        changeset("alice", "1"),
+        "--Liquibase formatted SQL\n" + changeset("carol", "3"),
+    ]
+    changelog = LiquibaseUtils.build_changelog(changesets)
+
+    assert changelog.lower().count("--liquibase formatted sql") == 0
+    assert changelog.index("bob:2") < changelog.index("alice:1") < changelog.index("carol:3")
+    assert changelog.endswith("\n")
+
+
+def test_build_changelog_allows_several_changesets_per_script():
+    changelog = LiquibaseUtils.build_changelog([changeset("alice", "1") + changeset("alice", "2")])
+    assert changelog.index("alice:1") < changelog.index("alice:2")
+
+
+@pytest.mark.parametrize(
+    "changesets, message",
+    [
+        ([], "请提供"),
+        ([changeset("alice", "1"), "UPDATE t SET a = 1;"], "第2个脚本缺少"),
+        ([changeset("alice", "1"), changeset("alice", "1")], "重复"),
+    ],
+)
+def test_build_changelog_rejects_invalid_scripts(changesets, message):
+    with pytest.raises(ValueError, match=message):
+        LiquibaseUtils.build_changelog(changesets)
+
+
+def test_validate_changelog_maps_results_and_counts(db_config, use_runner):
+    changesets = [("alice", "1"), ("bob", "2"), ("carol", "3"), ("dave", "4")]
+    liquibase_script = LiquibaseUtils.build_changelog([changeset(*item) for item in changesets])
+
+    def handler(args):
+        if "update-testing-rollback" in args:
+            return update_testing_rollback(args, *changesets, fail=("carol", "3"), stage="reupdate")
+        return completed(args, [])
+
+    runner = use_runner(handler)
+    result = LiquibaseUtils(db_config, liquibase_script).validate_changelog()
+
+    assert [(item["author"], item["id"], item["status"]) for item in result["changesets"]] == [
+        ("alice", "1", "success"),
+        ("bob", "2", "success"),
+        ("carol", "3", "error"),
+        ("dave", "4", "unverified"),
+    ]
+    assert (result["total"], result["passed"], result["failed"], result["unverified"], result["not_run"]) == (
+        4, 2, 1, 1, 0
+    )
+    assert result["status"] == "error"
+    # 合并后的 changelog 只执行一次 update-testing-rollback
+    assert sum("update-testing-rollback" in args for args in runner.calls) == 1
+    assert "--count=2" in runner.calls[-1]
+
+
+def test_validate_changelog_counts_not_run(db_config, use_runner):
+    changesets = [("alice", "1"), ("bob", "2"), ("carol", "3")]
+    liquibase_script = LiquibaseUtils.build_changelog([changeset(*item) for item in changesets])
+    use_runner(lambda args: update_testing_rollback(args, *changesets, fail=("bob", "2")))
+    result = LiquibaseUtils(db_config, liquibase_script).validate_changelog()
+
+    assert (result["passed"], result["failed"], result["unverified"], result["not_run"]) == (0, 1, 1, 1)
+
+
+def test_validate_changelog_reports_progress(db_config, use_runner):
+    changesets = [("alice", "1"), ("bob", "2")]
+    liquibase_script = LiquibaseUtils.build_changelog([changeset(*item) for item in changesets])
+
+    def handler(args):
+        if "update-testing-rollback" in args:
+            return update_testing_rollback(args, *changesets, fail=("bob", "2"), stage="reupdate")
+        return completed(args, [])
+
+    use_runner(handler)
+    progress = []
+    LiquibaseUtils(db_config, liquibase_script).validate_changelog(
+        lambda done, total, message: progress.append((done, total, message))
+    )
+
+    assert [(done, total) for done, total, _ in progress] == [(1, 6), (2, 6), (3, 6), (4, 6), (5, 6), (5, 6)]
+    assert [message for _, _, message in progress] == [
+        "changeSet alice:1 更新成功",
+        "changeSet bob:2 更新成功",
+        "changeSet bob:2 回滚",
+        "changeSet alice:1 回滚",
+        "changeSet alice:1 回滚后再次更新成功, 验证通过",
+        "changeSet bob:2 验证失败",
+    ]
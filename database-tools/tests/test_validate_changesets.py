@@ -0,0 +1,237 @@
+import sys
+import subprocess
+import textwrap
+
+from database_tools.tools import liqubase
+from database_tools.tools.liqubase import LiquibaseUtils
+from database_tools.tools.runner import WorkerPoolRunner
+
+from .liquibase_output import changeset, completed, script, update_testing_rollback
+
+
+def _command(args: list[str]) -> str:
+    return "rollback-count" if "rollback-count" in args else args[-1]
+
+
+def _count(args: list[str]) -> int:
+    return int(next(arg for arg in args if arg.startswith("--count=")).split("=", 1)[1])
+
+
+ALICE, BOB, CAROL = ("alice", "1"), ("bob", "2"), ("carol", "3")
+SCRIPT = script(changeset(*ALICE), changeset(*BOB), changeset(*CAROL))
+
+
+def _states(**kwargs):
+    output = update_testing_rollback(["liquibase"], ALICE, BOB, CAROL, **kwargs)
+    results, applied = LiquibaseUtils.parse_changeset_states(
+        SCRIPT, f"{output.stdout}\n{output.stderr}", output.returncode
+    )
+    return [item["status"] for item in results], applied
+
+
+def test_parse_all_pass():
+    assert _states() == (["success", "success", "success"], 3)
+
+
+def test_parse_update_failure_leaves_earlier_changesets_unverified():
+    # 第一阶段在 bob 失败, alice 已更新但没有回滚过
+    assert _states(fail=BOB, stage="update") == (["unverified", "error", "not_run"], 1)
+
+
+def test_parse_rollback_failure():
+    # 倒序回滚: carol 回滚成功, bob 回滚失败, alice 没有回滚
+    assert _states(fail=BOB, stage="rollback") == (["unverified", "error", "unverified"], 2)
+
+
+def test_parse_reupdate_failure():
+    # 全部回滚后再次更新: alice 完成三步, bob 失败, carol 回滚后没有再次更新
+    assert _states(fail=BOB, stage="reupdate") == (["success", "error", "unverified"], 1)
+
+
+def test_parse_blames_unfinished_step_without_failure_line():
+    output = "\n".join(
+        [
+            "INFO Running Changeset: changelog.sql::1::alice",
+            "INFO ChangeSet changelog.sql::1::alice ran successfully in 3ms",
+            "INFO Running Changeset: changelog.sql::2::bob",
+        ]
+    )
+    results, applied = LiquibaseUtils.parse_changeset_states(SCRIPT, output, 1)
+    assert [item["status"] for item in results] == ["unverified", "error", "not_run"]
+    assert applied == 1
+
+
+def test_parse_changeset_results_messages():
+    output = update_testing_rollback(["liquibase"], ALICE, BOB, CAROL, fail=BOB)
+    results = LiquibaseUtils.parse_changeset_results(SCRIPT, output.stderr, output.returncode)
+    assert "Migration failed" in results[1]["message"]
+    assert results[0]["message"] == "回滚没有执行, 没有完成验证"
+
+
+def test_validate_changesets_reports_each_changeset(db_config, use_runner):
+    def handler(args):
+        if _command(args) == "update-testing-rollback":
+            return update_testing_rollback(args, ALICE, BOB, CAROL, fail=BOB, stage="rollback")
+        return completed(args, [])
+
+    runner = use_runner(handler)
+    result = LiquibaseUtils(db_config, SCRIPT).validate_changesets()
+
+    assert result["status"] == "error"
+    assert [(item["id"], item["status"]) for item in result["changesets"]] == [
+        ("1", "unverified"),
+        ("2", "error"),
+        ("3", "unverified"),
+    ]
+    # 开发库不会重置, 回滚 changelog 表中仍有记录的 alice 和 bob
+    assert [_command(args) for args in runner.calls] == ["update-testing-rollback", "rollback-count"]
+    assert _count(runner.calls[1]) == 2
+
+
+def test_validate_changesets_all_pass(db_config, use_runner):
+    runner = use_runner(
+        lambda args: update_testing_rollback(args, ALICE, BOB, CAROL)
+        if _command(args) == "update-testing-rollback"
+        else completed(args, [])
+    )
+    progress = []
+    result = LiquibaseUtils(db_config, SCRIPT).validate_changesets(
+        lambda done, total, message: progress.append((done, total))
+    )
+
+    assert result["status"] == "success"
+    assert all(item["status"] == "success" for item in result["changesets"])
+    assert _count(runner.calls[-1]) == 3
+    assert progress[-1] == (9, 9)
+
+
+def test_validate_changesets_skips_cleanup_when_nothing_is_applied(db_config, use_runner):
+    runner = use_runner(lambda args: update_testing_rollback(args, ALICE, BOB, CAROL, fail=ALICE))
+    result = LiquibaseUtils(db_config, SCRIPT).validate_changesets()
+
+    assert [item["status"] for item in result["changesets"]] == ["error", "not_run", "not_run"]
+    assert [_command(args) for args in runner.calls] == ["update-testing-rollback"]
+
+
+def test_validate_changesets_timeout(db_config, use_runner):
+    def handler(args):
+        raise subprocess.TimeoutExpired(args, 300)
+
+    runner = use_runner(handler)
+    result = LiquibaseUtils(db_config, SCRIPT).validate_changesets()
+
+    assert result["status"] == "error"
+    assert "超时" in result["message"]
+    assert [item["status"] for item in result["changesets"]] == ["not_run"] * 3
+    # 没有执行的 changeSet, 不需要回滚
+    assert len(runner.calls) == 1
+
+
+def test_validate_changesets_reports_rollback_failure(db_config, use_runner):
+    liquibase_script = script(changeset(*ALICE))
+
+    def handler(args):
+        if _command(args) == "rollback-count":
+            return completed(args, ["rollback failed"], returncode=1)
+        return update_testing_rollback(args, ALICE)
+
+    use_runner(handler)
+    result = LiquibaseUtils(db_config, liquibase_script).validate_changesets()
+
+    assert result["changesets"][0]["status"] == "success"
+    assert "回滚开发库中的变更失败" in result["message"]
+
+
+_WORKER = textwrap.dedent(
+    """
+    import os, sys, json
+    print(json.dumps({"ready": True}), flush=True)
+    for line in sys.stdin:
+        args = json.loads(line)["args"]
+        returncode = 1 if "fail" in args else 0
+        print(json.dumps({"returncode": returncode, "stdout": str(os.getpid())}), flush=True)
+    """
+)
+
+
+def test_worker_pool_recycles_workers(tmp_path):
+    worker = tmp_path / "worker.py"
+    worker.write_text(_WORKER)
+    runner = WorkerPoolRunner([sys.executable, str(worker)], size=1, max_jobs=2, warmup=False)
+    try:
+        pids = [runner.run(["liquibase", "update"]).stdout for _ in range(3)]
+        # 执行 max_jobs 次后换新的 worker
+        assert pids[0] == pids[1] != pids[2]
+
+        failed_pid = runner.run(["liquibase", "fail"]).stdout
+        assert failed_pid == pids[2]
+        # 执行失败的 worker 不再复用
+        assert runner.run(["liquibase", "update"]).stdout != failed_pid
+
+        stats = runner.stats()
+        assert stats["recycled"] == 2
+        assert stats["fallbacks"] == 0
+    finally:
+        runner.close()
+
+
+class _EmbeddedValidator:
+    def __init__(self, output):
+        self.output = output
+
+    def run(self, db_config, liquibase_script):
+        return self.output
+
+
+def _use_embedded(monkeypatch, output):
+    monkeypatch.setattr(liqubase, "EMBEDDED_FAST_PATH", "on")
+    monkeypatch.setattr(liqubase, "get_embedded_validator", lambda: _EmbeddedValidator(output))
+
+
+def test_embedded_success_still_validates_on_dev(db_config, use_runner, monkeypatch):
+    # H2 没有数据, 全部通过也要到开发库验证, 以开发库的结果为准
+    _use_embedded(monkeypatch, update_testing_rollback(["liquibase"], ALICE, BOB, CAROL))
+    runner = use_runner(
+        lambda args: update_testing_rollback(args, ALICE, BOB, CAROL, fail=CAROL)
+        if _command(args) == "update-testing-rollback"
+        else completed(args, [])
+    )
+    result = LiquibaseUtils(db_config, SCRIPT).validate_changesets()
+
+    assert result["status"] == "error"
+    assert [item["status"] for item in result["changesets"]] == ["unverified", "unverified", "error"]
+    assert "embedded" not in {item.get("stage") for item in result["changesets"]}
+    assert _command(runner.calls[0]) == "update-testing-rollback"
+
+
+def test_embedded_failure_rejects_early(db_config, use_runner, monkeypatch):
+    _use_embedded(monkeypatch, update_testing_rollback(["liquibase"], ALICE, BOB, CAROL, fail=BOB))
+    scripts = []
+
+    def handler(args):
+        if _command(args) == "update-testing-rollback":
+            return update_testing_rollback(args, ALICE, CAROL)
+        return completed(args, [])
+
+    monkeypatch.setattr(
+        LiquibaseUtils,
+        "create_change_file",
+        lambda self, db_name, liquibase_script, directory: scripts.append(liquibase_script) or "changelog.sql",
+    )
+    use_runner(handler)
+    progress = []
+    result = LiquibaseUtils(db_config, SCRIPT).validate_changesets(
+        lambda done, total, message: progress.append((done, total, message))
+    )
+
+    # bob 在 H2 中失败, 不再到开发库验证, 其它 changeSet 在开发库中通过
+    assert "--changeset bob:2" not in scripts[0]
+    assert "--changeset alice:1" in scripts[0] and "--changeset carol:3" in scripts[0]
+    assert [(item["id"], item["status"], item.get("stage")) for item in result["changesets"]] == [
+        ("1", "success", None),
+        ("2", "error", "embedded"),
+        ("3", "success", None),
+    ]
+    assert result["status"] == "error"
+    assert result["message"].startswith("嵌入式数据库验证失败")
+    assert progress[0][:2] == (3, 9) and progress[-1][:2] == (9, 9)
@@ -0,0 +1,96 @@
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.List;
+import java.util.Map;
+
+import liquibase.integration.commandline.LiquibaseCommandLine;
+import org.yaml.snakeyaml.Yaml;
+
+/**
+ * 常驻的 liquibase 进程, 供 database_tools.tools.runner.WorkerPoolRunner 使用
+ *
+ * 编译: javac -cp "$LIQUIBASE_HOME/internal/lib/*" -d . LiquibaseWorker.java
+ * 启动: java -cp "$LIQUIBASE_HOME/internal/lib/*:." LiquibaseWorker
+ *
+ * 协议: 每行一个 JSON
+ *   启动完成: {"ready": true}
+ *   请求(标准输入): {"args": ["--url=...", "update"]}
+ *   响应(标准输出): {"returncode": 0, "stdout": "...", "stderr": "..."}
+ */
+public class LiquibaseWorker {
+
+    public static void main(String[] argv) throws Exception {
+        PrintStream protocol = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        // JSON 是 YAML 的子集, 直接用 liquibase 自带的 snakeyaml 解析请求
+        Yaml yaml = new Yaml();
+
+        // 预先加载 liquibase 和 jdbc 驱动
+        new LiquibaseCommandLine();
+        try {
+            Class.forName("com.mysql.cj.jdbc.Driver");
+        } catch (ClassNotFoundException ignored) {
+        }
+        protocol.println("{\"ready\": true}");
+
+        String line;
+        while ((line = in.readLine()) != null) {
+            if (line.trim().isEmpty()) {
+                continue;
+            }
+            Map<String, Object> request = yaml.load(line);
+            List<String> args = new ArrayList<>();
+            for (Object arg : (List<?>) request.get("args")) {
+                args.add(String.valueOf(arg));
+            }
+
+            ByteArrayOutputStream out = new ByteArrayOutputStream();
+            ByteArrayOutputStream err = new ByteArrayOutputStream();
+            PrintStream oldOut = System.out;
+            PrintStream oldErr = System.err;
+            System.setOut(new PrintStream(out, true, "UTF-8"));
+            System.setErr(new PrintStream(err, true, "UTF-8"));
+            int code;
+            try {
+                code = new LiquibaseCommandLine().execute(args.toArray(new String[0]));
+            } catch (Throwable t) {
+                t.printStackTrace();
+                code = 1;
+            } finally {
+                System.out.flush();
+                System.err.flush();
+                System.setOut(oldOut);
+                System.setErr(oldErr);
+            }
+            protocol.println("{\"returncode\": " + code
+                    + ", \"stdout\": " + quote(out.toString("UTF-8"))
+                    + ", \"stderr\": " + quote(err.toString("UTF-8")) + "}");
+        }
+    }
+
+    private static String quote(String value) {
+        StringBuilder sb = new StringBuilder("\"");
+        for (char c : value.toCharArray()) {
+            switch (c) {
+                case '"': sb.append("\\\""); break;
+                case '\\': sb.append("\\\\"); break;
+                case '\n': sb.append("\\n"); break;
+                case '\r': sb.append("\\r"); break;
+                case '\t': sb.append("\\t"); break;
+                default:
+                    if (c < 0x20) {
+                        sb.append(String.format("\\u%04x", (int) c));
+                    } else {
+                        sb.append(c);
+                    }
+            }
+        }
+        return sb.append('"').toString();
+    }
+}
@@ -1,11 +1,12 @@
 
 from langchain_openai import ChatOpenAI
-from pathlib import Path
+from liquibase_agent.agent.cache import agent_cache, prompt_cache
 
 
 class BaseAgent:
     deepseek_api_key = ""  # 替换为你的 DeepSeek API Key
     base_url = "https://api.deepseek.com"
+    model = "deepseek-chat"  # DeepSeek 模型
 
     def __init__(self, deepseek_api_key=None, base_url=None):
         self.deepseek_api_key = deepseek_api_key or self.deepseek_api_key
@@ -22,17 +23,28 @@ class BaseAgent:
             system prompt 内容
         """
         try:
-            path = Path(file_path)
-            if path.exists():
-                with open(path, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    print(f"Loaded system prompt from: {file_path}")
-                    return content
+            # 只有文件 mtime 变化时才重新读取
+            entry = prompt_cache.load(file_path)
+            if entry is not None:
+                return entry[1]
             else:
                 return self._get_default_system_prompt()
         except Exception as e:
             print(f"Error loading system prompt: {e}, using default")
-            return self.get_default_system_prompt()
+            return self._get_default_system_prompt()
+
+    async def get_agent(self, prompt_file: str | tuple[str, ...]):
+        """
+        从进程级缓存中获取编译好的 agent
+
+        Args:
+            prompt_file: system prompt 文件路径, 多个文件时按顺序拼接
+        """
+        return await agent_cache.get_agent(self, prompt_file)
+
+    def model_key(self) -> tuple:
+        """agent 缓存中区分模型的 key"""
+        return (self.model, self.base_url, self.deepseek_api_key)
 
     def _get_default_system_prompt(self) -> str:
         """获取默认的 system prompt"""
@@ -45,7 +57,7 @@ class BaseAgent:
         # Create agent with your MCP tools
         # 初始化 DeepSeek 模型
         llm = ChatOpenAI(
-            model="deepseek-chat",  # DeepSeek 模型
+            model=self.model,  # DeepSeek 模型
             # model="deepseek-reasoner",  # DeepSeek 模型
             temperature=0,
             openai_api_key=self.deepseek_api_key,
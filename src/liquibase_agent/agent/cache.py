@@ -0,0 +1,155 @@
+import os
+import time
+import json
+import asyncio
+import hashlib
+import threading
+from pathlib import Path
+
+from langchain.agents import create_agent
+
+from liquibase_agent.tools.liquibase import get_mcp_pool, list_tools
+
+# MCP 工具列表的缓存时间(秒)
+TOOLS_TTL = float(os.getenv("LIQUIBASE_AGENT_TOOLS_TTL", "300"))
+
+
+class PromptCache:
+    """
+    system prompt 文件缓存, 只有文件 mtime 变化时才重新读取
+    """
+
+    def __init__(self):
+        self._entries: dict[str, tuple[float, str, str]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, file_path: str) -> tuple[float, str, str] | None:
+        """
+        返回 (mtime, content, version), 文件不存在时返回 None
+        version 为内容的哈希, 用于区分 prompt 版本
+        """
+        path = Path(file_path)
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            entry = self._entries.get(file_path)
+            if entry is not None and entry[0] == mtime:
+                return entry
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+        print(f"Loaded system prompt from: {file_path}")
+        version = hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+        entry = (mtime, content, version)
+        with self._lock:
+            self._entries[file_path] = entry
+        return entry
+
+
+class ToolCache:
+    """
+    MCP 工具列表缓存
+
+    超过 TTL 或者调用 invalidate(服务端通知工具变更) 后重新拉取,
+    工具 schema 变化时 version 递增, 用于让编译好的 agent 失效。
+    """
+
+    def __init__(self, ttl: float = TOOLS_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self._tools = None
+        self._fingerprint = None
+        self._loaded_at = 0.0
+        self._lock: asyncio.Lock | None = None
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+    def _expired(self) -> bool:
+        return self._tools is None or time.monotonic() - self._loaded_at > self.ttl
+
+    async def get(self):
+        """返回 (tools, version)"""
+        if not self._expired():
+            return self._tools, self.version
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._expired():
+                tools = await list_tools()
+                fingerprint = self._fingerprint_of(tools)
+                if fingerprint != self._fingerprint:
+                    self._fingerprint = fingerprint
+                    self.version += 1
+                self._tools = tools
+                self._loaded_at = time.monotonic()
+        return self._tools, self.version
+
+    @staticmethod
+    def _fingerprint_of(tools) -> str:
+        schemas = [
+            {
+                "name": tool.name,
+                "description": tool.description,
+                "args": tool.args,
+            }
+            for tool in tools
+        ]
+        payload = json.dumps(schemas, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AgentCache:
+    """
+    编译好的 agent 缓存, key 为 (模型, prompt 文件, prompt mtime, 工具版本)
+    """
+
+    def __init__(self, prompts: PromptCache, tools: ToolCache):
+        self.prompts = prompts
+        self.tools = tools
+        self._llms = {}
+        self._agents = {}
+
+    async def get_agent(self, base_agent, prompt_file: str | tuple[str, ...]):
+        """
+        prompt_file 为多个文件时, 按顺序拼接成一个 system prompt
+        """
+        tools, tools_version = await self.tools.get()
+        prompt_files = prompt_file if isinstance(prompt_file, tuple) else (prompt_file,)
+        prompt_mtimes = []
+        for file_path in prompt_files:
+            prompt = self.prompts.load(file_path)
+            prompt_mtimes.append(prompt[0] if prompt else None)
+        model_key = base_agent.model_key()
+        key = (model_key, prompt_files, tuple(prompt_mtimes), tools_version)
+
+        agent = self._agents.get(key)
+        if agent is not None:
+            return agent
+
+        llm = self._llms.get(model_key)
+        if llm is None:
+            llm = base_agent.create_deepseek()
+            self._llms[model_key] = llm
+        agent = create_agent(
+            model=llm,
+            tools=tools,
+            system_prompt="\n\n".join(
+                base_agent.load_system_prompt(file_path=file_path)
+                for file_path in prompt_files
+            ),
+        )
+        # 旧版本的 prompt/工具对应的 agent 不会再被使用
+        self._agents = {
+            k: v for k, v in self._agents.items() if k[:2] != key[:2]
+        }
+        self._agents[key] = agent
+        return agent
+
+
+prompt_cache = PromptCache()
+tool_cache = ToolCache()
+# 服务端通知工具列表变化时, 下次使用前重新拉取
+get_mcp_pool().add_tool_change_listener(tool_cache.invalidate)
+agent_cache = AgentCache(prompt_cache, tool_cache)
@@ -1,9 +1,6 @@
-from langchain.agents import create_agent
-
 import json
 from liquibase_agent.tracer.tracer import AgentTracer
 from langchain_core.messages import AIMessage
-from liquibase_agent.tools.liquibase import list_tools
 from liquibase_agent.agent.baseagent import BaseAgent
 
 
@@ -21,17 +18,8 @@ class CheckChangesetAgent(BaseAgent):
     async def check_changesets(self, change_sets: str):
         if change_sets is None or len(change_sets) == 0:
             return "请提供检验的change sets"
-        # Load tools from your MCP serv
-        tools = await list_tools()
-
-        llm = self.create_deepseek()
-        agent = create_agent(
-            model=llm,
-            tools=tools,
-            system_prompt=super().load_system_prompt(
-                file_path="prompt/check_changeset_prompt.md"
-            ),
-        )
+        # 工具列表、模型和 system prompt 都从进程级缓存中获取
+        agent = await self.get_agent("prompt/check_changeset_prompt.md")
 
         db_config = json.dumps(self.db_config)
         tracer = AgentTracer(log_file="logs/trace_log.json")
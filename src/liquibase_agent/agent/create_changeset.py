@@ -1,13 +1,24 @@
+import re
 import asyncio
-from langchain.agents import create_agent
 import json
 from liquibase_agent.tracer.tracer import AgentTracer
 from langchain_core.messages import AIMessage
 from liquibase_agent.agent.baseagent import BaseAgent
+from liquibase_agent.agent.cache import prompt_cache
+from liquibase_agent.agent.result_cache import (
+    get_result_cache,
+    get_schema_fingerprint,
+    is_cacheable,
+    make_cache_key,
+    render_cache_template,
+    to_cache_template,
+)
 
-from liquibase_agent.tools.liquibase import list_tools
 from liquibase_agent import agent
 
+# 批量输出中每条 sql 的小节标题
+BATCH_SECTION_RE = re.compile(r"^#{2,4}\s*第\s*(\d+)\s*条\s*$", re.MULTILINE)
+
 
 class CreateChangesetAgent(BaseAgent):
     deepseek_api_key = (
@@ -29,6 +40,8 @@ class CreateChangesetAgent(BaseAgent):
     db_name = "default_db"
     author = ("admin",)
     env = "prod"
+    prompt_file = "prompt/create_changeset_prompt.md"
+    batch_prompt_file = "prompt/create_changeset_batch_prompt.md"
 
     def __init__(self, dev_db_config, prod_db_config, db_name, author, env):
         super().__init__(deepseek_api_key=self.deepseek_api_key, base_url=self.base_url)
@@ -41,33 +54,209 @@ class CreateChangesetAgent(BaseAgent):
     async def question(self, sql: str):
         if sql is None or sql == "":
             return "请提供sql"
-        # Load tools from your MCP service
-        tools = await list_tools()
-
-        llm = super().create_deepseek()
-        # llm = create_gemini()
-
-        agent = create_agent(
-            model=llm,
-            tools=tools,
-            system_prompt=super().load_system_prompt(
-                file_path="prompt/create_changeset_prompt.md"
-            ),
+        # 相同的 sql、配置、prompt 和表结构直接返回缓存的 changeSet
+        cache_key = await self.result_cache_key(sql)
+        changeset = await self.load_cached(cache_key)
+        if changeset is not None:
+            return {"status": "success", "message": changeset, "cached": True}
+
+        return await self._question_uncached(sql, cache_key)
+
+    async def load_cached(self, cache_key: str | None) -> str | None:
+        """
+        读取缓存的 changeSet 并分配新的 changeSet ID, 未命中时返回 None
+        """
+        if cache_key is None:
+            return None
+        # sqlite 的读写放到线程中执行, 不阻塞共享事件循环上的其它请求
+        template = await asyncio.to_thread(lambda: get_result_cache().get(cache_key))
+        if template is None:
+            return None
+        return await render_cache_template(template, self.db_name)
+
+    async def save_cached(self, cache_key: str | None, changeset: str):
+        """缓存验证通过的 changeSet, ID 替换为占位符"""
+        if cache_key is None:
+            return
+        template = to_cache_template(changeset)
+        if template is not None:
+            await asyncio.to_thread(lambda: get_result_cache().put(cache_key, template))
+
+    async def result_cache_key(self, sql: str):
+        """
+        计算结果缓存的 key, 回滚依赖生产数据的语句, 或无法获取 prompt、表结构指纹时返回 None(不使用缓存)
+        """
+        if not is_cacheable(sql):
+            return None
+        prompt = prompt_cache.load(self.prompt_file)
+        fingerprint = await get_schema_fingerprint(self.dev_db_config)
+        if prompt is None or fingerprint is None:
+            return None
+        return make_cache_key(
+            sql,
+            db_name=self.db_name,
+            env=self.env,
+            author=self.author,
+            prompt_version=prompt[2],
+            schema_fingerprint=fingerprint,
         )
 
+    async def _question(self, sql: str):
+        # 工具列表、模型和 system prompt 都从进程级缓存中获取
+        agent = await self.get_agent(self.prompt_file)
+
         # Use agent to validate a liquibase changeset
-        prod_db_config = json.dumps(self.prod_db_config)
-        dev_db_config = json.dumps(self.dev_db_config)
         tracer = AgentTracer(log_file="logs/trace_log.json")
-        query_content = f"请对sql {sql},生成liquibase changeSet, db_config :{dev_db_config}, prod_db_config:{prod_db_config}, db_name 为{self.db_name}, 在{self.env}境执行，作者:{self.author}"
         response = await agent.ainvoke(
-            {
-                "messages": [{"role": "user", "content": query_content}],
-            },
+            self.build_input(sql),
             config={"callbacks": [tracer]},
         )
         return self.extract_final_answer(response)
 
+    async def question_batch(self, sql_list: list[str]) -> list[dict]:
+        """
+        一次大模型调用为多条 sql 生成 changeSet, 返回值与 sql_list 一一对应
+        批量结果中失败或缺失的 sql 回退到单条生成
+        """
+        results: list[dict | None] = [None] * len(sql_list)
+        cache_keys = [await self.result_cache_key(sql) for sql in sql_list]
+        pending = []
+        for i, (sql, cache_key) in enumerate(zip(sql_list, cache_keys)):
+            changeset = await self.load_cached(cache_key)
+            if changeset is not None:
+                results[i] = {"status": "success", "message": changeset, "cached": True}
+            else:
+                pending.append(i)
+
+        if len(pending) > 1:
+            agent = await self.get_agent((self.prompt_file, self.batch_prompt_file))
+            tracer = AgentTracer(log_file="logs/trace_log.json")
+            try:
+                response = await agent.ainvoke(
+                    self.build_batch_input([sql_list[i] for i in pending]),
+                    config={"callbacks": [tracer]},
+                )
+                sections = self.extract_batch_answer(response)
+            except Exception as e:
+                print(f"Batch question failed: {e}, fallback to single question")
+                sections = {}
+            for number, i in enumerate(pending, 1):
+                result = sections.get(number)
+                if result is not None and result["status"] == "success":
+                    results[i] = result
+                    await self.save_cached(cache_keys[i], result["message"])
+
+        # 批量失败的 sql 走单条生成
+        fallback = [i for i in pending if results[i] is None]
+        fallback_results = await asyncio.gather(
+            *(self._question_uncached(sql_list[i], cache_keys[i]) for i in fallback)
+        )
+        for i, result in zip(fallback, fallback_results):
+            results[i] = result
+        return results
+
+    async def _question_uncached(self, sql: str, cache_key: str | None):
+        result = await self._question(sql)
+        if result["status"] == "success":
+            await self.save_cached(cache_key, result["message"])
+        return result
+
+    def build_batch_input(self, sql_list: list[str]):
+        prod_db_config = json.dumps(self.prod_db_config)
+        dev_db_config = json.dumps(self.dev_db_config)
+        numbered = "\n".join(
+            f"第{number}条: {sql}" for number, sql in enumerate(sql_list, 1)
+        )
+        query_content = f"请对以下{len(sql_list)}条sql分别生成liquibase changeSet, db_config :{dev_db_config}, prod_db_config:{prod_db_config}, db_name 为{self.db_name}, 在{self.env}境执行，作者:{self.author}\n{numbered}"
+        return {
+            "messages": [{"role": "user", "content": query_content}],
+        }
+
+    def extract_batch_answer(self, resp) -> dict[int, dict]:
+        """
+        按 `### 第N条` 拆分批量输出, 返回 {编号: 结果}
+        """
+        message = resp["messages"][-1]
+        if not isinstance(message, AIMessage) or not isinstance(message.content, str):
+            return {}
+        sections = {}
+        matches = list(BATCH_SECTION_RE.finditer(message.content))
+        for pos, match in enumerate(matches):
+            end = (
+                matches[pos + 1].start()
+                if pos + 1 < len(matches)
+                else len(message.content)
+            )
+            text = message.content[match.end():end]
+            content = self.extract_sql_content(text)
+            if content is None:
+                sections[int(match.group(1))] = {"status": "error", "message": text.strip()}
+            else:
+                sections[int(match.group(1))] = {"status": "success", "message": content}
+        return sections
+
+    def build_input(self, sql: str):
+        prod_db_config = json.dumps(self.prod_db_config)
+        dev_db_config = json.dumps(self.dev_db_config)
+        query_content = f"请对sql {sql},生成liquibase changeSet, db_config :{dev_db_config}, prod_db_config:{prod_db_config}, db_name 为{self.db_name}, 在{self.env}境执行，作者:{self.author}"
+        return {
+            "messages": [{"role": "user", "content": query_content}],
+        }
+
+    async def stream_question(self, sql: str):
+        """
+        流式生成 changeSet, 边执行边产出事件:
+            {"type": "token", "content": ...}            大模型输出的 token
+            {"type": "tool_start", "name": ..., "input": ...}  开始调用工具
+            {"type": "tool_end", "name": ..., "output": ...}   工具调用结束
+            {"type": "final", "result": {...}}          与 question 的返回值相同
+        """
+        if sql is None or sql == "":
+            yield {"type": "final", "result": {"status": "error", "message": "请提供sql"}}
+            return
+        cache_key = await self.result_cache_key(sql)
+        changeset = await self.load_cached(cache_key)
+        if changeset is not None:
+            result = {"status": "success", "message": changeset, "cached": True}
+            yield {"type": "final", "result": result}
+            return
+
+        agent = await self.get_agent(self.prompt_file)
+        tracer = AgentTracer(log_file="logs/trace_log.json")
+        result = None
+        async for event in agent.astream_events(
+            self.build_input(sql),
+            config={"callbacks": [tracer]},
+            version="v2",
+        ):
+            kind = event["event"]
+            if kind == "on_chat_model_stream":
+                content = event["data"]["chunk"].content
+                if isinstance(content, str) and content:
+                    yield {"type": "token", "content": content}
+            elif kind == "on_tool_start":
+                yield {
+                    "type": "tool_start",
+                    "name": event["name"],
+                    "input": event["data"].get("input"),
+                }
+            elif kind == "on_tool_end":
+                output = event["data"].get("output")
+                yield {
+                    "type": "tool_end",
+                    "name": event["name"],
+                    "output": getattr(output, "content", output),
+                }
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                # 最外层 graph 结束, output 为最终的 state
+                result = self.extract_final_answer(event["data"]["output"])
+
+        if result is None:
+            result = {"status": "error", "message": "agent 没有返回结果"}
+        if result["status"] == "success":
+            await self.save_cached(cache_key, result["message"])
+        yield {"type": "final", "result": result}
+
     def extract_final_answer(self, resp):
 
         messages = resp["messages"]
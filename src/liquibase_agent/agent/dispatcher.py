@@ -0,0 +1,196 @@
+import os
+import re
+import queue
+import asyncio
+
+from liquibase_agent.agent.loop import submit
+
+# 单次上传最多同时处理的 sql 条数
+UPLOAD_CONCURRENCY = int(os.getenv("LIQUIBASE_AGENT_UPLOAD_CONCURRENCY", "4"))
+# 整个进程最多同时运行的 agent 数(所有上传共享)
+PROCESS_CONCURRENCY = int(os.getenv("LIQUIBASE_AGENT_PROCESS_CONCURRENCY", "16"))
+
+# 批量模式下一次大模型调用最多包含的 sql 条数
+MAX_BATCH_SIZE = int(os.getenv("LIQUIBASE_AGENT_MAX_BATCH_SIZE", "10"))
+# 默认批量大小, 1 表示不批量
+DEFAULT_BATCH_SIZE = int(os.getenv("LIQUIBASE_AGENT_BATCH_SIZE", "1"))
+# 一个批次中 sql 的 token 预算(按 4 个字符 1 个 token 估算)
+BATCH_TOKEN_BUDGET = int(os.getenv("LIQUIBASE_AGENT_BATCH_TOKEN_BUDGET", "2000"))
+
+# 只有简单的 INSERT 和 ADD COLUMN 适合批量生成
+_BATCHABLE_RE = re.compile(
+    r"^\s*(INSERT\s+INTO\s"
+    r"|ALTER\s+TABLE\s+\S+\s+ADD\s+(?!(INDEX|KEY|UNIQUE|PRIMARY|CONSTRAINT|FOREIGN"
+    r"|FULLTEXT|SPATIAL|PARTITION)\b))",
+    re.IGNORECASE,
+)
+
+# 只在后台事件循环中创建和使用
+_process_semaphore: asyncio.Semaphore | None = None
+
+
+def resolve_concurrency(value) -> int:
+    """
+    解析请求中的并发数, 限制在 [1, UPLOAD_CONCURRENCY] 之间
+    """
+    try:
+        concurrency = int(value)
+    except (TypeError, ValueError):
+        return UPLOAD_CONCURRENCY
+    return max(1, min(concurrency, UPLOAD_CONCURRENCY))
+
+
+def resolve_batch_size(value) -> int:
+    """
+    解析请求中的批量大小, 限制在 [1, MAX_BATCH_SIZE] 之间
+    """
+    try:
+        batch_size = int(value)
+    except (TypeError, ValueError):
+        batch_size = DEFAULT_BATCH_SIZE
+    return max(1, min(batch_size, MAX_BATCH_SIZE))
+
+
+def is_batchable(sql) -> bool:
+    return bool(_BATCHABLE_RE.match(str(sql)))
+
+
+def _estimate_tokens(sql) -> int:
+    return len(str(sql)) // 4 + 1
+
+
+def _iter_groups(items, batch_size: int):
+    """
+    把连续的可批量 sql 合并为一组, 每组不超过 batch_size 条和 token 预算
+    其它 sql 单独成组
+    """
+    group = []
+    tokens = 0
+    for idx, sql in items:
+        if batch_size > 1 and is_batchable(sql):
+            cost = _estimate_tokens(sql)
+            if group and (len(group) >= batch_size or tokens + cost > BATCH_TOKEN_BUDGET):
+                yield group
+                group, tokens = [], 0
+            group.append((idx, sql))
+            tokens += cost
+            continue
+        if group:
+            yield group
+            group, tokens = [], 0
+        yield [(idx, sql)]
+    if group:
+        yield group
+
+
+def _get_process_semaphore() -> asyncio.Semaphore:
+    global _process_semaphore
+    if _process_semaphore is None:
+        _process_semaphore = asyncio.Semaphore(PROCESS_CONCURRENCY)
+    return _process_semaphore
+
+
+async def _run_group(agent, group: list, events: queue.Queue | None) -> list[dict]:
+    async with _get_process_semaphore():
+        try:
+            if len(group) > 1:
+                return await agent.question_batch([str(sql) for _, sql in group])
+            idx, sql = group[0]
+            if events is None:
+                return [await agent.question(str(sql))]
+            result = None
+            async for event in agent.stream_question(str(sql)):
+                if event["type"] == "final":
+                    result = event["result"]
+                else:
+                    events.put(("event", idx, event))
+            return [result]
+        except Exception as e:
+            return [{"status": "error", "message": str(e)} for _ in group]
+
+
+def dispatch_questions(
+    agent,
+    sql_iter,
+    concurrency: int = UPLOAD_CONCURRENCY,
+    stream: bool = False,
+    batch_size: int = 1,
+    skip: set[int] | None = None,
+):
+    """
+    并发调用 agent.question 处理多条 sql
+
+    Args:
+        agent: CreateChangesetAgent
+        sql_iter: sql 语句(str 或 SqlStatement)的可迭代对象, 按需读取
+        concurrency: 本次调用最多同时进行的大模型调用数
+        stream: 是否转发 agent.stream_question 的中间事件
+        batch_size: 大于 1 时, 连续的简单 sql 合并为一次 agent.question_batch 调用
+        skip: 不需要处理的 sql 编号(如中断前已经完成的), 不会产出任何结果
+
+    Yields:
+        ("event", idx, sql, event): stream 为 True 时 agent 的中间事件(token/工具调用)
+        ("progress", idx, sql, result): 某条 sql 处理完成(按完成顺序)
+        ("result", idx, sql, result): 按 sql 原始顺序输出的结果
+    """
+    skip = skip or set()
+    groups = _iter_groups(
+        ((idx, sql) for idx, sql in enumerate(sql_iter, 1) if idx not in skip),
+        batch_size,
+    )
+    events = queue.Queue()
+    # 组内第一条 sql 的 idx -> (组, future)
+    running = {}
+    sqls = {}
+    finished = {}
+    next_idx = 1
+    exhausted = False
+    # 等待前面的 sql 完成、暂存在 finished 中的结果最多条数,
+    # 达到后不再读取新的 sql, 避免某条 sql 很慢时暂存的结果无限增长
+    window = 2 * concurrency
+
+    try:
+        while True:
+            # 补齐窗口, 保证同时运行的调用不超过 concurrency
+            while (
+                not exhausted
+                and len(running) < concurrency
+                and len(finished) < window
+            ):
+                try:
+                    group = next(groups)
+                except StopIteration:
+                    exhausted = True
+                    break
+                key = group[0][0]
+                future = submit(_run_group(agent, group, events if stream else None))
+                future.add_done_callback(
+                    lambda f, key=key: events.put(("done", key, f))
+                )
+                running[key] = (group, future)
+                sqls.update(group)
+
+            if not running:
+                break
+
+            kind, key, payload = events.get()
+            if kind == "event":
+                yield "event", key, sqls[key], payload
+                continue
+
+            group, _ = running.pop(key)
+            for (idx, sql), result in zip(group, payload.result()):
+                del sqls[idx]
+                finished[idx] = (sql, result)
+                yield "progress", idx, sql, result
+
+            # 按顺序输出已经连续完成的结果
+            while next_idx in finished or next_idx in skip:
+                if next_idx in finished:
+                    sql, result = finished.pop(next_idx)
+                    yield "result", next_idx, sql, result
+                next_idx += 1
+    finally:
+        # 调用方提前退出(如客户端断开)时取消还在运行的 sql
+        for _, future in running.values():
+            future.cancel()
@@ -0,0 +1,112 @@
+import queue
+import atexit
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class BackgroundLoop:
+    """
+    在后台线程中运行的常驻事件循环
+
+    Flask 的同步请求通过 submit/run 把协程提交到这里执行,
+    agent、MCP 会话、LLM 客户端等异步资源可以在请求之间复用,
+    避免每条 sql 都用 asyncio.run 新建和销毁事件循环。
+    """
+
+    def __init__(self, name: str = "agent-loop"):
+        self.name = name
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """获取事件循环, 未启动时自动启动"""
+        if self._loop is None:
+            self.start()
+        return self._loop
+
+    def start(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def _run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=_run, name=self.name, daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
+
+    def submit(self, coro) -> Future:
+        """提交协程, 返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: float | None = None):
+        """提交协程并阻塞等待结果"""
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        with self._lock:
+            if self._loop is None:
+                return
+            loop, thread = self._loop, self._thread
+            self._loop = None
+            self._thread = None
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        loop.close()
+
+
+_background_loop = BackgroundLoop()
+atexit.register(_background_loop.stop)
+
+
+def get_background_loop() -> BackgroundLoop:
+    return _background_loop
+
+
+def submit(coro) -> Future:
+    """把协程提交到进程级的后台事件循环"""
+    return _background_loop.submit(coro)
+
+
+def run_coroutine(coro, timeout: float | None = None):
+    """在进程级的后台事件循环中运行协程并等待结果"""
+    return _background_loop.run(coro, timeout)
+
+
+def iterate(agen):
+    """
+    在后台事件循环中消费异步生成器, 返回同步迭代器
+    同步迭代器被提前关闭(如客户端断开)时取消后台任务
+    """
+    items = queue.Queue()
+    done = object()
+
+    async def _drain():
+        try:
+            async for item in agen:
+                items.put((item, None))
+        except BaseException as e:
+            items.put((done, e))
+            raise
+        items.put((done, None))
+
+    future = submit(_drain())
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        future.cancel()
@@ -0,0 +1,244 @@
+import os
+import re
+import time
+import json
+import sqlite3
+import hashlib
+import threading
+
+from liquibase_agent.tools.liquibase import get_mcp_pool
+
+# 缓存文件位置
+RESULT_CACHE_PATH = os.getenv(
+    "LIQUIBASE_AGENT_RESULT_CACHE", "/tmp/liquibase_agent_result_cache.db"
+)
+# 最多缓存的条数
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("LIQUIBASE_AGENT_RESULT_CACHE_ENTRIES", "10000"))
+# 缓存内容的总大小上限(字节)
+RESULT_CACHE_MAX_BYTES = int(
+    os.getenv("LIQUIBASE_AGENT_RESULT_CACHE_BYTES", str(64 * 1024 * 1024))
+)
+# 缓存有效期(秒)
+RESULT_CACHE_MAX_AGE = float(os.getenv("LIQUIBASE_AGENT_RESULT_CACHE_MAX_AGE", "86400"))
+# 表结构指纹的缓存时间(秒), 避免每条 sql 都查询 information_schema
+SCHEMA_FINGERPRINT_TTL = float(
+    os.getenv("LIQUIBASE_AGENT_SCHEMA_FINGERPRINT_TTL", "30")
+)
+
+# 缓存中保存的是去掉 changeSet ID 的模板, 命中时重新分配 ID, 避免重复的 changeSet ID
+CHANGESET_ID_PLACEHOLDER = "{{changeset_id}}"
+
+# 回滚语句不依赖生产数据的语句才缓存: DDL 的回滚来自表结构(已在 key 的表结构指纹中),
+# INSERT 的回滚按主键删除; UPDATE/DELETE/REPLACE 等的回滚是生成时从生产库读取的旧值, 缓存后会还原过期的数据
+CACHEABLE_STATEMENTS = {"CREATE", "ALTER", "DROP", "RENAME", "INSERT"}
+
+_LEADING_COMMENT_RE = re.compile(r"^(?:\s+|--[^\n]*(?:\n|$)|#[^\n]*(?:\n|$)|/\*.*?\*/|\()*", re.DOTALL)
+_ON_DUPLICATE_RE = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE)
+_CHANGESET_ID_RE = re.compile(r"^(\s*--changeset\s+[^:\s]+:)(\S+)", re.MULTILINE)
+_TOKEN_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`|\s+|[^'\"`\s]+")
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    规范化 sql: 合并引号外的空白, 去掉结尾的分号
+    引号内的内容保持不变
+    """
+    tokens = []
+    for token in _TOKEN_RE.findall(sql.strip()):
+        tokens.append(" " if token.isspace() else token)
+    return "".join(tokens).strip().rstrip(";").strip()
+
+
+def is_cacheable(sql: str) -> bool:
+    """sql 生成的 changeSet 是否可以缓存, 见 CACHEABLE_STATEMENTS"""
+    body = sql[_LEADING_COMMENT_RE.match(sql).end():]
+    verb = body.split(None, 1)[0].upper() if body.strip() else ""
+    if verb not in CACHEABLE_STATEMENTS:
+        return False
+    # INSERT ... ON DUPLICATE KEY UPDATE 会修改已有的记录
+    return not (verb == "INSERT" and _ON_DUPLICATE_RE.search(normalize_sql(body)))
+
+
+def make_cache_key(
+    sql: str,
+    db_name: str,
+    env: str,
+    author: str,
+    prompt_version: str,
+    schema_fingerprint: str,
+) -> str:
+    payload = json.dumps(
+        [normalize_sql(sql), db_name, env, author, prompt_version, schema_fingerprint],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def to_cache_template(changeset: str) -> str | None:
+    """把 changeSet 中的 ID 替换为占位符, 没有 --changeset 行时返回 None(不缓存)"""
+    template, count = _CHANGESET_ID_RE.subn(
+        lambda m: m.group(1) + CHANGESET_ID_PLACEHOLDER, changeset
+    )
+    return template if count else None
+
+
+async def render_cache_template(template: str, db_name: str) -> str | None:
+    """
+    通过 MCP 工具 create_change_id 为每个占位符分配新的 ID,
+    分配失败或者模板中没有占位符(旧版本的缓存)时返回 None(按未命中处理)
+    """
+    parts = template.split(CHANGESET_ID_PLACEHOLDER)
+    if len(parts) == 1:
+        return None
+    rendered = [parts[0]]
+    for part in parts[1:]:
+        try:
+            result = await get_mcp_pool().call_tool(
+                "create_change_id", {"db_name": db_name}
+            )
+            changeset_id = json.loads(result.content[0].text)["changeset_id"]
+        except Exception as e:
+            print(f"Error creating changeset id: {e}, skip result cache")
+            return None
+        rendered.append(changeset_id)
+        rendered.append(part)
+    return "".join(rendered)
+
+
+class ChangesetResultCache:
+    """
+    基于 sqlite 的 changeSet 结果缓存
+
+    key 为 (规范化 sql, db_name, env, author, prompt 版本, 表结构指纹) 的哈希,
+    value 为验证通过的 changeSet 模板(ID 为占位符)。按最近访问时间做 LRU 淘汰,
+    同时限制条数、总大小和有效期。
+    """
+
+    def __init__(
+        self,
+        path: str = RESULT_CACHE_PATH,
+        max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+        max_age: float = RESULT_CACHE_MAX_AGE,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS changeset_cache (
+                key TEXT PRIMARY KEY,
+                changeset TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_changeset_cache_accessed "
+            "ON changeset_cache (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT changeset, created_at FROM changeset_cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE changeset_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, changeset: str):
+        now = time.time()
+        size = len(changeset.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO changeset_cache "
+                "(key, changeset, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, changeset, size, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute(
+            "DELETE FROM changeset_cache WHERE created_at < ?", (now - self.max_age,)
+        )
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM changeset_cache"
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # 按最近访问时间从旧到新淘汰, 直到满足限制
+        evict = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM changeset_cache ORDER BY accessed_at"
+        ):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            evict.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM changeset_cache WHERE key = ?", evict)
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM changeset_cache"
+            ).fetchone()
+        return {"entries": count, "bytes": total, "hits": self.hits, "misses": self.misses}
+
+
+_fingerprints: dict[str, tuple[float, str]] = {}
+
+
+async def get_schema_fingerprint(db_config: dict) -> str | None:
+    """
+    通过 MCP 工具 schema-fingerprint 获取表结构指纹, 获取失败时返回 None(不使用缓存)
+    """
+    config = json.dumps(db_config, sort_keys=True)
+    now = time.monotonic()
+    entry = _fingerprints.get(config)
+    if entry is not None and now - entry[0] < SCHEMA_FINGERPRINT_TTL:
+        return entry[1]
+    try:
+        result = await get_mcp_pool().call_tool(
+            "schema-fingerprint", {"db_config": config}
+        )
+        data = json.loads(result.content[0].text)
+    except Exception as e:
+        print(f"Error loading schema fingerprint: {e}, skip result cache")
+        return None
+    if data.get("status") != "success":
+        return None
+    _fingerprints[config] = (now, data["fingerprint"])
+    return data["fingerprint"]
+
+
+_result_cache: ChangesetResultCache | None = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ChangesetResultCache:
+    """进程级共享的 changeSet 结果缓存"""
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ChangesetResultCache()
+        return _result_cache
@@ -0,0 +1,344 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 任务事件的持久化目录
+JOBS_DIR = os.getenv("LIQUIBASE_AGENT_JOBS_DIR", "/tmp/liquibase_agent_jobs")
+# 同时运行的任务数
+JOB_WORKERS = int(os.getenv("LIQUIBASE_AGENT_JOB_WORKERS", "4"))
+# 已结束的任务在内存中保留的时间(秒), 之后只能从磁盘回放
+JOB_MEMORY_TTL = float(os.getenv("LIQUIBASE_AGENT_JOB_MEMORY_TTL", "3600"))
+# 运行中的任务多久更新一次心跳(秒), 同时把缓冲的事件写入磁盘
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("LIQUIBASE_AGENT_JOB_HEARTBEAT_INTERVAL", "5"))
+# 心跳超过该时间(秒)没有更新, 认为运行任务的进程已经退出
+JOB_HEARTBEAT_TIMEOUT = float(os.getenv("LIQUIBASE_AGENT_JOB_HEARTBEAT_TIMEOUT", "30"))
+# 缓冲的事件达到该条数时写入磁盘
+JOB_FLUSH_EVENTS = int(os.getenv("LIQUIBASE_AGENT_JOB_FLUSH_EVENTS", "64"))
+# 读取其它进程中运行的任务时, 检查新事件的间隔(秒)
+JOB_POLL_INTERVAL = float(os.getenv("LIQUIBASE_AGENT_JOB_POLL_INTERVAL", "0.5"))
+# 只推送给在线客户端、不写入磁盘的事件(大模型的 token), 回放时没有这些事件
+TRANSIENT_EVENTS = {"token"}
+
+PENDING = "pending"
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+# 进程重启时没有跑完的任务
+INTERRUPTED = "interrupted"
+
+
+class Job:
+    """
+    一个后台生成任务
+
+    任务产生的每条 SSE 事件按顺序编号(从 1 开始), 除 token 外批量追加写入 events.jsonl,
+    客户端断开后可以通过 Last-Event-ID 从断点继续读取, 不需要重新调用大模型。
+
+    meta.json 中记录运行任务的进程和心跳时间, 多个 worker 共享任务目录时,
+    其它 worker 加载的任务会轮询磁盘上的新事件, 只有心跳超时才认为任务中断。
+    """
+
+    def __init__(self, job_id: str, job_dir: str, params: dict | None = None):
+        self.id = job_id
+        self.dir = job_dir
+        self.params = params or {}
+        self.status = PENDING
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.owner = {"host": socket.gethostname(), "pid": os.getpid()}
+        self.heartbeat_at = None
+        # 从磁盘加载、由其它进程运行的任务
+        self.remote = False
+        self._events: list[tuple[int, str, str]] = []
+        self._cond = threading.Condition()
+        self._file = None
+        self._unflushed = 0
+        # 已经读取的 events.jsonl 的位置(只用于从磁盘加载的任务)
+        self._offset = 0
+
+    @property
+    def done(self) -> bool:
+        return self.status in (FINISHED, FAILED, INTERRUPTED)
+
+    @property
+    def events_path(self) -> str:
+        return os.path.join(self.dir, "events.jsonl")
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.dir, "meta.json")
+
+    def open(self):
+        os.makedirs(self.dir, exist_ok=True)
+        self._file = open(self.events_path, "a", encoding="utf-8")
+        self._save_meta()
+
+    def emit(self, event: str, data: str) -> int:
+        """记录一条事件, 返回事件编号"""
+        with self._cond:
+            event_id = len(self._events) + 1
+            self._events.append((event_id, event, data))
+            if self._file is not None and event not in TRANSIENT_EVENTS:
+                self._file.write(
+                    json.dumps(
+                        {"id": event_id, "event": event, "data": data},
+                        ensure_ascii=False,
+                    )
+                    + "\n"
+                )
+                self._unflushed += 1
+                if self._unflushed >= JOB_FLUSH_EVENTS:
+                    self._flush()
+            self._cond.notify_all()
+        return event_id
+
+    def heartbeat(self):
+        """写入缓冲的事件并更新心跳时间"""
+        with self._cond:
+            if self.done:
+                return
+            self._flush()
+            self._save_meta()
+
+    def _flush(self):
+        if self._file is not None and self._unflushed:
+            self._file.flush()
+            self._unflushed = 0
+
+    def set_status(self, status: str, error: str | None = None):
+        with self._cond:
+            self.status = status
+            self.error = error
+            if self.done:
+                self.finished_at = time.time()
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+            else:
+                self._flush()
+            self._save_meta()
+            self._cond.notify_all()
+
+    def iter_events(self, after: int = 0, heartbeat: float = 15):
+        """
+        产出编号大于 after 的事件 (id, event, data), 任务结束后停止
+        等待超过 heartbeat 秒没有新事件时产出 None, 用于 SSE 心跳
+        """
+        # 从磁盘加载的任务中没有 token 事件, 编号不连续, 按编号查找
+        last_id = after
+        idle_since = time.monotonic()
+        while True:
+            with self._cond:
+                start = bisect.bisect_right(self._events, last_id, key=lambda e: e[0])
+                if start == len(self._events) and not self.done:
+                    if self.remote:
+                        self._cond.wait(min(heartbeat, JOB_POLL_INTERVAL))
+                        self._refresh()
+                    else:
+                        self._cond.wait(heartbeat)
+                    start = bisect.bisect_right(
+                        self._events, last_id, key=lambda e: e[0]
+                    )
+                batch = self._events[start:]
+                done = self.done
+            if not batch:
+                if done:
+                    return
+                if time.monotonic() - idle_since >= heartbeat:
+                    idle_since = time.monotonic()
+                    yield None
+                continue
+            yield from batch
+            last_id = batch[-1][0]
+            idle_since = time.monotonic()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "events": self._events[-1][0] if self._events else 0,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "params": self.params,
+            "owner": self.owner,
+            "heartbeat_at": self.heartbeat_at,
+        }
+
+    def _save_meta(self):
+        self.heartbeat_at = time.time()
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, self.meta_path)
+
+    def _owner_alive(self) -> bool:
+        """运行任务的进程是否还在(同一台机器上检查进程, 否则看心跳是否超时)"""
+        if self.heartbeat_at is None:
+            return False
+        if time.time() - self.heartbeat_at > JOB_HEARTBEAT_TIMEOUT:
+            return False
+        if self.owner.get("host") != socket.gethostname():
+            return True
+        try:
+            os.kill(self.owner.get("pid"), 0)
+        except ProcessLookupError:
+            return False
+        except (PermissionError, TypeError):
+            pass
+        return True
+
+    def _apply_meta(self, meta: dict):
+        self.created_at = meta.get("created_at", self.created_at)
+        self.finished_at = meta.get("finished_at")
+        self.error = meta.get("error")
+        self.status = meta.get("status", INTERRUPTED)
+        self.owner = meta.get("owner") or {}
+        self.heartbeat_at = meta.get("heartbeat_at")
+        if not self.done and not self._owner_alive():
+            # 任务没有跑完进程就退出了
+            self.status = INTERRUPTED
+        self.remote = not self.done
+
+    def _read_events(self):
+        """读取 events.jsonl 中新写入的完整行"""
+        try:
+            with open(self.events_path, "rb") as f:
+                f.seek(self._offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # 还没有写完的行, 下次再读
+                        break
+                    self._offset += len(line)
+                    try:
+                        item = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._events.append((item["id"], item["event"], item["data"]))
+        except FileNotFoundError:
+            pass
+
+    def _refresh(self):
+        """重新读取其它进程中运行的任务的事件和状态, 调用时需要持有 _cond"""
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            meta = None
+        # 先读事件再更新状态, 任务结束前写入的事件不会丢失
+        self._read_events()
+        if meta is not None:
+            self._apply_meta(meta)
+
+    @classmethod
+    def load(cls, job_id: str, job_dir: str) -> "Job | None":
+        """
+        从磁盘加载任务(只用于回放事件)
+        其它进程还在运行的任务保持运行状态, 读取事件时轮询新写入的事件
+        """
+        try:
+            with open(os.path.join(job_dir, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        job = cls(job_id, job_dir, meta.get("params"))
+        job._read_events()
+        job._apply_meta(meta)
+        return job
+
+
+class JobManager:
+    """
+    后台任务管理: 生成任务 id, 在线程池中运行任务, 按 id 查询任务
+    """
+
+    def __init__(self, jobs_dir: str = JOBS_DIR, workers: int = JOB_WORKERS):
+        self.jobs_dir = jobs_dir
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="changeset-job"
+        )
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._heartbeat_thread: threading.Thread | None = None
+
+    def submit(self, runner, params: dict | None = None) -> Job:
+        """
+        创建并提交任务
+
+        Args:
+            runner: runner(job), 通过 job.emit 输出事件
+            params: 记录在任务元数据中的参数
+        """
+        job_id = uuid.uuid4().hex
+        job = Job(job_id, os.path.join(self.jobs_dir, job_id), params)
+        job.open()
+        with self._lock:
+            self._prune()
+            self._jobs[job_id] = job
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(
+                    target=self._heartbeat_loop, name="job-heartbeat", daemon=True
+                )
+                self._heartbeat_thread.start()
+        self._executor.submit(self._run, job, runner)
+        return job
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(JOB_HEARTBEAT_INTERVAL)
+            with self._lock:
+                jobs = [job for job in self._jobs.values() if not job.done]
+            for job in jobs:
+                try:
+                    job.heartbeat()
+                except OSError as e:
+                    print(f"Error saving job {job.id} heartbeat: {e}")
+
+    def _run(self, job: Job, runner):
+        job.set_status(RUNNING)
+        try:
+            runner(job)
+        except Exception as e:
+            job.emit("message", f"任务执行失败: {e}")
+            job.emit("done", "end")
+            job.set_status(FAILED, str(e))
+        else:
+            job.set_status(FINISHED)
+
+    def get(self, job_id: str) -> Job | None:
+        if not job_id.isalnum():
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        return Job.load(job_id, os.path.join(self.jobs_dir, job_id))
+
+    def _prune(self):
+        now = time.time()
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.done and now - job.finished_at > JOB_MEMORY_TTL
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+_job_manager: JobManager | None = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """进程级共享的任务管理器"""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager()
+        return _job_manager
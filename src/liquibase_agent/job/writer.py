@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import fcntl
+import hashlib
+from datetime import datetime
+
+# changeSet 文件所在目录, 与 /download 路由一致
+CHANGELOG_DIR = os.getenv("LIQUIBASE_AGENT_CHANGELOG_DIR", "/tmp")
+# 写入多少条后 fsync 一次
+FSYNC_EVERY = int(os.getenv("LIQUIBASE_AGENT_FSYNC_EVERY", "20"))
+# 距离上次 fsync 超过多少秒后 fsync 一次
+FSYNC_INTERVAL = float(os.getenv("LIQUIBASE_AGENT_FSYNC_INTERVAL", "2"))
+
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """分块计算文件的 sha256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class WriterLockedError(RuntimeError):
+    """相同 key 的写入器正在其它任务中使用"""
+
+
+def _fsync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+class ChangelogWriter:
+    """
+    增量、可恢复的 changeSet 文件写入器
+
+    每条 sql 处理完就把 changeSet 片段追加到 <最终文件名>.<key>.part, 定期 fsync,
+    fsync 之后才把对应的 sql 编号和片段在文件中的起止偏移写入 .index。
+    进程崩溃后用相同的 key 重新打开时, 截断到 index 记录的最后偏移,
+    并返回已经生成成功的编号。恢复后重新生成的 sql 会追加在编号更大的片段之后,
+    所以全部完成时按编号顺序重新拼接片段写入最终文件(liquibase 按文件中的顺序执行 changeSet)。
+    打开期间独占锁定 .index, 同一文件的并发上传不会写入同一个 .part。
+    """
+
+    def __init__(
+        self,
+        db_name: str,
+        key: str,
+        directory: str = CHANGELOG_DIR,
+        fsync_every: int = FSYNC_EVERY,
+        fsync_interval: float = FSYNC_INTERVAL,
+    ):
+        now_str = datetime.now().strftime("%Y_%m_%d")
+        self.file_name = f"changeSet_{db_name}_{now_str}.sql"
+        self.final_path = os.path.join(directory, self.file_name)
+        self.part_path = f"{self.final_path}.{key[:16]}.part"
+        self.index_path = f"{self.part_path}.index"
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.done: set[int] = set()
+        # sql 编号 -> 片段在 .part 中的 (起始偏移, 结束偏移)
+        self._fragments: dict[int, tuple[int, int]] = {}
+        self._file = None
+        self._index = None
+        self._pending: list[dict] = []
+        self._last_sync = time.monotonic()
+
+    def open(self) -> set[int]:
+        """
+        打开写入器, 返回上次中断前已经生成成功的 sql 编号
+
+        Raises:
+            WriterLockedError: 相同 key 的写入器正在使用
+        """
+        self._index = open(self.index_path, "a+", encoding="utf-8")
+        try:
+            fcntl.flock(self._index.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._index.close()
+            self._index = None
+            raise WriterLockedError(f"{self.file_name} 正在其它任务中生成, 请稍后重试")
+
+        offset = 0
+        if os.path.exists(self.part_path):
+            self._index.seek(0)
+            for line in self._index.read().splitlines():
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    # 崩溃时写了一半的行
+                    break
+                if "start" not in item:
+                    # 没有记录片段位置的旧版本 index, 无法按编号重新拼接, 从头生成
+                    offset = 0
+                    break
+                self._fragments[item["index"]] = (item["start"], item["end"])
+                offset = item["end"]
+
+        if offset:
+            # 丢弃 index 中没有记录的尾部内容
+            self._file = open(self.part_path, "r+b")
+            self._file.truncate(offset)
+            self._file.seek(offset)
+            self.done = set(self._fragments)
+        else:
+            self._fragments.clear()
+            self._index.truncate(0)
+            self._file = open(self.part_path, "wb")
+            self._file.write("--liquibase formatted sql\n".encode("utf-8"))
+            _fsync(self._file)
+        return set(self.done)
+
+    def append(self, idx: int, result: str):
+        """
+        写入第 idx 条 sql 生成的 changeSet
+        生成失败的 sql 不记录, 重新上传时会再次生成
+        """
+        lines = [f"\n/* [第{[idx]}条] */\n"]
+        lines.extend(line + "\n" for line in str(result).splitlines())
+        start = self._file.tell()
+        self._file.write("".join(lines).encode("utf-8"))
+        self._fragments[idx] = (start, self._file.tell())
+        self.done.add(idx)
+        self._pending.append({"index": idx, "start": start, "end": self._file.tell()})
+        if (
+            len(self._pending) >= self.fsync_every
+            or time.monotonic() - self._last_sync >= self.fsync_interval
+        ):
+            self.sync()
+
+    def sync(self):
+        """fsync 文件内容, 再记录对应的 index"""
+        if self._file is None:
+            return
+        _fsync(self._file)
+        for item in self._pending:
+            self._index.write(json.dumps(item) + "\n")
+        self._pending.clear()
+        _fsync(self._index)
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        """保存进度并关闭, 保留 .part 和 .index 以便恢复"""
+        if self._file is None:
+            return
+        self.sync()
+        self._file.close()
+        self._index.close()
+        self._file = None
+        self._index = None
+
+    def commit(self) -> str:
+        """全部完成, 按 sql 编号顺序拼接片段, 原子地替换最终文件, 返回文件名"""
+        # 持有锁直到 .part 和 .index 处理完
+        self.sync()
+        tmp_path = f"{self.part_path}.tmp"
+        with open(self.part_path, "rb") as part, open(tmp_path, "wb") as out:
+            out.write("--liquibase formatted sql\n".encode("utf-8"))
+            for idx in sorted(self._fragments):
+                start, end = self._fragments[idx]
+                part.seek(start)
+                out.write(part.read(end - start))
+            _fsync(out)
+        os.replace(tmp_path, self.final_path)
+        os.remove(self.part_path)
+        os.remove(self.index_path)
+        self.close()
+        return self.file_name
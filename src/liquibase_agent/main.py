@@ -6,13 +6,21 @@ from flask import (
     session,
     send_from_directory,
 )
-import re
 import os
+import itertools
 import uuid
-import asyncio
 import json
-from datetime import datetime
+import hashlib
 from liquibase_agent.agent.create_changeset import CreateChangesetAgent
+from liquibase_agent.agent.dispatcher import (
+    dispatch_questions,
+    resolve_batch_size,
+    resolve_concurrency,
+)
+from liquibase_agent.agent.loop import iterate
+from liquibase_agent.job.manager import get_job_manager
+from liquibase_agent.job.writer import ChangelogWriter, file_digest
+from liquibase_agent.sql.splitter import iter_sql_statements
 
 app = Flask(__name__)
 
@@ -24,13 +32,76 @@ def index():
     return render_template("index.html")
 
 
-def sse_event(event, data):
+def sse_event(event, data, event_id=None):
     """
     生成一条标准 SSE 事件
     """
+    if event_id is not None:
+        return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
     return f"event: {event}\ndata: {data}\n\n"
 
 
+def agent_event(event, idx=None):
+    """
+    把 agent 的中间事件转换为 SSE 的 (event, data)
+    token 的内容可能包含换行, 以 json 形式放在 data 中
+    """
+    prefix = f"[第{idx}条sql]" if idx is not None else ""
+    if event["type"] == "token":
+        data = {"index": idx, "content": event["content"]}
+        return "token", json.dumps(data, ensure_ascii=False)
+    if event["type"] == "tool_start":
+        return "message", f"{prefix}调用工具 {event['name']}"
+    return "message", f"{prefix}工具 {event['name']} 调用完成"
+
+
+def job_response(job, after: int = 0):
+    """
+    以 SSE 输出任务中编号大于 after 的事件
+    第一条事件为任务 id, 客户端断开后可以带上 Last-Event-ID 续读
+    """
+
+    def generate():
+        if after == 0:
+            yield sse_event("job", json.dumps({"job_id": job.id}))
+        for item in job.iter_events(after=after):
+            if item is None:
+                # 心跳, 防止代理断开空闲连接
+                yield ": keepalive\n\n"
+                continue
+            event_id, event, data = item
+            yield sse_event(event, data, event_id=event_id)
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return Response("Job not found", status=404)
+    return Response(json.dumps(job.to_dict()), mimetype="application/json")
+
+
+@app.route("/api/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return Response("Job not found", status=404)
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get(
+        "last_event_id", "0"
+    )
+    try:
+        after = max(0, int(last_event_id))
+    except ValueError:
+        return Response("Invalid Last-Event-ID", status=400)
+    return job_response(job, after=after)
+
+
 @app.route("/api/upload", methods=["POST"])
 def create_changeset():
     if "file" not in request.files:
@@ -50,54 +121,100 @@ def create_changeset():
         dev_db_config = session["dev_db_config"]
         prod_db_config = session["prod_db_config"]
         db_name = session["db_name"]
-        change_sets = []
+        author = request.form.get("author", "admin")
+        env = request.form.get("env", "prod")
         agent = CreateChangesetAgent(
             dev_db_config=dev_db_config,
             prod_db_config=prod_db_config,
             db_name=db_name,
-            author=request.form.get("author", "admin"),
-            env=request.form.get("env", "prod"),
+            author=author,
+            env=env,
         )
-
-        def generate():
-            sql_list = parse_sql_file(filepath)
-            if not sql_list:
-                yield sse_event("message", "No SQL found.")
+        concurrency = resolve_concurrency(request.form.get("concurrency"))
+        batch_size = resolve_batch_size(request.form.get("batch_size"))
+        # 同一个文件、相同参数重新上传时, 从上次中断的位置继续生成
+        resume_key = hashlib.sha256(
+            f"{file_digest(filepath)}:{author}:{env}".encode("utf-8")
+        ).hexdigest()
+
+        def run_job(job):
+            # 流式拆分 sql, 第一条语句拆出后就开始调用 LLM
+            statements = iter_sql_statements(filepath)
+            first = next(statements, None)
+            if first is None:
+                job.emit("message", "No SQL found.")
+                job.emit("done", "end")
                 return
 
-            for idx, sql in enumerate(sql_list, 1):
-                yield sse_event("message", f"[正在解析第{idx}条sql:]{sql}")
-
-                # LLM 调用
-                result = asyncio.run(agent.question(sql))
-                if result["status"] == "success":
-                    yield sse_event("message", "生成的ChangeSet如下:")
-                    change_sets.append(
-                        {"index": idx, "sql": sql, "result": result["message"]}
+            # 每条 sql 处理完就追加写入 changeSet 文件, 中断后可以续写
+            writer = ChangelogWriter(db_name, key=resume_key)
+            skip = writer.open()
+            if skip:
+                job.emit(
+                    "message", f"检测到上次未完成的生成, 跳过已处理的{len(skip)}条sql"
+                )
+
+            finished = 0
+            try:
+                # 并发调用 LLM, 结果按 sql 顺序输出, token 和工具调用实时转发
+                for kind, idx, stmt, result in dispatch_questions(
+                    agent,
+                    itertools.chain([first], statements),
+                    concurrency=concurrency,
+                    stream=True,
+                    batch_size=batch_size,
+                    skip=skip,
+                ):
+                    if kind == "event":
+                        job.emit(*agent_event(result, idx))
+                        continue
+                    if kind == "progress":
+                        finished += 1
+                        job.emit(
+                            "message", f"[进度] 已完成{finished}条, 第{idx}条sql处理完成"
+                        )
+                        continue
+
+                    sql = stmt.sql
+                    job.emit(
+                        "result",
+                        json.dumps({"index": idx, **result}, ensure_ascii=False),
                     )
-                    # 按行输出
-                    for line in result["message"].split("\n"):
-                        yield sse_event("message", f"{line}")
-                else:
-                    yield sse_event(
-                        "message", f"解析第{idx}条sql生成ChangeSet失败，原因如下:"
+                    job.emit(
+                        "message", f"[正在解析第{idx}条sql(第{stmt.line}行):]{sql}"
                     )
-                    yield sse_event("message", result["message"])
-                    yield sse_event("message", "如果进行修改，请重新输入修改后的sql")
-            # 所有sql处理完后，写入changeSet文件
-            file_name = write_list_split_by_newline(
-                change_sets, db_name, mode="w", encoding="utf-8"
-            )
-            yield sse_event("message", "changeSet文件已生成，可以点击右上角的链接下载")
+                    if result["status"] == "success":
+                        if result.get("cached"):
+                            job.emit("message", "生成的ChangeSet如下(命中缓存):")
+                        else:
+                            job.emit("message", "生成的ChangeSet如下:")
+                        writer.append(idx, result["message"])
+                        # 按行输出
+                        for line in result["message"].split("\n"):
+                            job.emit("message", f"{line}")
+                    else:
+                        job.emit(
+                            "message", f"解析第{idx}条sql生成ChangeSet失败，原因如下:"
+                        )
+                        job.emit("message", result["message"])
+                        job.emit("message", "如果进行修改，请重新输入修改后的sql")
+            except BaseException:
+                # 保存已完成的部分, 重新上传同一文件时继续
+                writer.close()
+                raise
+            # 所有sql处理完后，原子地生成最终的changeSet文件
+            file_name = writer.commit()
+            job.emit("message", "changeSet文件已生成，可以点击右上角的链接下载")
             url = f"http://127.0.0.1:5001/download/{file_name}"
-            yield sse_event("control", json.dumps({"url": url}))
-            yield sse_event("done", "end")
+            job.emit("control", json.dumps({"url": url}))
+            job.emit("done", "end")
 
-        return Response(
-            generate(),
-            mimetype="text/event-stream",
-            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # 在后台任务中生成, 客户端断开不影响生成, 可通过 /api/jobs/<id>/events 续读
+        job = get_job_manager().submit(
+            run_job, params={"db_name": db_name, "file": file.filename}
         )
+        session["job_id"] = job.id
+        return job_response(job)
 
     except Exception as e:
         return Response(f"An error occurred: {str(e)}", 500)
@@ -139,33 +256,10 @@ def cache_db_info(file_path: str, forms: dict):
 def parse_sql_file(path: str) -> list[str]:
     """
     读取 SQL 文件，以 ; 结尾拆分 SQL 语句
-    支持处理 \\n、空格、注释等
+    支持处理 \\n、空格、注释、引号中的分号和 DELIMITER
+    大文件请直接使用 iter_sql_statements 流式处理
     """
-    with open(path, encoding="utf-8") as f:
-        content = f.read()
-
-    # 去掉注释（-- 注释）
-    content = re.sub(r"--.*", "", content)
-
-    # 按 ; 拆分，并 strip 过滤空字符串
-    sql_list = [stmt.strip() for stmt in content.split(";") if stmt.strip()]
-    return sql_list
-
-
-def write_list_split_by_newline(data_list, db_name, mode="w", encoding="utf-8"):
-    now_str = datetime.now().strftime("%Y_%m_%d")
-    file_name = f"changeSet_{db_name}_{now_str}.sql"
-    file_path = f"/tmp/{file_name}"
-    with open(file_path, mode, encoding=encoding) as f:
-        f.write("--liquibase formatted sql\n")
-        for item in data_list:
-            idx = item["index"]
-            result = item["result"]
-            f.write("\n")
-            f.write(f"/* [第{[idx]}条] */\n")
-            for line in str(result).splitlines():
-                f.write(line + "\n")
-    return file_name
+    return [stmt.sql for stmt in iter_sql_statements(path)]
 
 
 BASE_DIR = "/tmp"
@@ -199,12 +293,19 @@ def repaire_sql():
     )
 
     def generate():
-        # LLM 调用
-        result = asyncio.run(
-            agent.question(prompt_sql)
-        )
+        # LLM 调用, token 和工具调用实时转发
+        result = None
+        for event in iterate(agent.stream_question(prompt_sql)):
+            if event["type"] == "final":
+                result = event["result"]
+            else:
+                yield sse_event(*agent_event(event))
+        yield sse_event("result", json.dumps(result, ensure_ascii=False))
         if result["status"] == "success":
-            yield sse_event("message", "生成的ChangeSet如下:")
+            if result.get("cached"):
+                yield sse_event("message", "生成的ChangeSet如下(命中缓存):")
+            else:
+                yield sse_event("message", "生成的ChangeSet如下:")
             # 按行输出
             for line in result["message"].split("\n"):
                 yield sse_event("message", f"{line}")
@@ -0,0 +1,204 @@
+import re
+import codecs
+import functools
+from dataclasses import dataclass
+
+# 每次从文件/请求流中读取的大小
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_DELIMITER_RE = re.compile(r"\s*DELIMITER\s+(\S+)", re.IGNORECASE)
+
+_NORMAL = 0
+_QUOTE = 1
+_BLOCK_COMMENT = 2
+
+_QUOTES = "'\"`"
+# 引号中需要处理的字符: 结束引号和反斜杠转义, 反引号中没有转义
+_QUOTE_END = {q: re.compile(r"[\\%s]" % q) for q in "'\""}
+_BACKTICK_END = re.compile("`")
+
+
+@functools.lru_cache(maxsize=16)
+def _token_re(delimiter: str) -> re.Pattern:
+    """普通状态下需要处理的记号, 分隔符优先"""
+    return re.compile(
+        "%s|['\"`]|/\\*|#|--(?=\\s|$)" % re.escape(delimiter)
+    )
+
+
+@dataclass
+class SqlStatement:
+    """拆分出的一条 sql 语句"""
+
+    sql: str
+    # 语句起止行号(从 1 开始)
+    line: int
+    end_line: int
+
+    def __str__(self):
+        return self.sql
+
+
+class SqlSplitter:
+    """
+    按行增量拆分 sql 语句的状态机
+
+    能识别单引号、双引号、反引号中的分隔符, `--`、`#` 行注释,
+    `/* */` 块注释以及 mysql 客户端的 DELIMITER 指令。
+    行注释会被去掉, 块注释(可能是优化器提示)保留在语句中。
+    """
+
+    def __init__(self, delimiter: str = ";"):
+        self.delimiter = delimiter
+        self._state = _NORMAL
+        self._quote = ""
+        self._parts: list[str] = []
+        self._has_content = False
+        self._start_line = 0
+        self._line_no = 0
+
+    def feed_line(self, line: str) -> list[SqlStatement]:
+        """输入一行(包含行尾换行符), 返回该行结束的语句"""
+        self._line_no += 1
+        statements = []
+        parts = self._parts
+        i = 0
+        n = len(line)
+
+        if self._state == _NORMAL and not self._has_content:
+            match = _DELIMITER_RE.match(line)
+            if match:
+                self.delimiter = match.group(1)
+                return statements
+
+        # 按特殊字符跳跃扫描, 中间的普通内容整段追加
+        while i < n:
+            if self._state == _BLOCK_COMMENT:
+                end = line.find("*/", i)
+                if end < 0:
+                    parts.append(line[i:])
+                    break
+                parts.append(line[i : end + 2])
+                self._state = _NORMAL
+                i = end + 2
+                continue
+
+            if self._state == _QUOTE:
+                pattern = _BACKTICK_END if self._quote == "`" else _QUOTE_END[self._quote]
+                match = pattern.search(line, i)
+                if match is None:
+                    parts.append(line[i:])
+                    break
+                end = match.end()
+                if match.group() == "\\":
+                    # 转义字符, 连同下一个字符一起追加
+                    end = min(end + 1, n)
+                else:
+                    self._state = _NORMAL
+                parts.append(line[i:end])
+                i = end
+                continue
+
+            match = _token_re(self.delimiter).search(line, i)
+            end = match.start() if match else n
+            if end > i:
+                text = line[i:end]
+                if not text.isspace():
+                    self._mark_content()
+                parts.append(text)
+            if match is None:
+                break
+            token = match.group()
+            i = match.end()
+            if token == self.delimiter:
+                statement = self._emit()
+                if statement is not None:
+                    statements.append(statement)
+            elif token in _QUOTES:
+                self._mark_content()
+                self._state = _QUOTE
+                self._quote = token
+                parts.append(token)
+            elif token == "/*":
+                self._state = _BLOCK_COMMENT
+                parts.append(token)
+            else:
+                # 行注释, 丢弃到行尾
+                if line.endswith("\n"):
+                    parts.append("\n")
+                break
+        return statements
+
+    def finish(self) -> SqlStatement | None:
+        """输入结束, 返回最后一条没有分隔符结尾的语句"""
+        return self._emit()
+
+    def _mark_content(self):
+        if not self._has_content:
+            self._has_content = True
+            self._start_line = self._line_no
+
+    def _emit(self) -> SqlStatement | None:
+        sql = "".join(self._parts).strip()
+        has_content = self._has_content
+        self._parts.clear()
+        self._has_content = False
+        if not has_content or not sql:
+            return None
+        return SqlStatement(sql=sql, line=self._start_line, end_line=self._line_no)
+
+
+def iter_lines(stream, chunk_size: int = DEFAULT_CHUNK_SIZE, encoding="utf-8"):
+    """
+    以固定大小分块读取流, 逐行产出文本(保留换行符)
+    支持文本流和二进制流
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    # 还没遇到换行符的内容, 避免超长行反复拼接
+    pending: list[str] = []
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        lines = chunk.split("\n")
+        if len(lines) == 1:
+            pending.append(chunk)
+            continue
+        pending.append(lines[0])
+        yield "".join(pending) + "\n"
+        for line in lines[1:-1]:
+            yield line + "\n"
+        pending = [lines[-1]]
+    pending.append(decoder.decode(b"", final=True))
+    tail = "".join(pending)
+    if tail:
+        yield tail
+
+
+def iter_sql_statements(
+    source, chunk_size: int = DEFAULT_CHUNK_SIZE, encoding: str = "utf-8"
+):
+    """
+    流式拆分 sql, 读到一条完整语句就立刻产出, 内存占用与文件大小无关
+
+    Args:
+        source: 文件路径或者可读的流(文件、请求流)
+        chunk_size: 每次读取的大小
+        encoding: 二进制流的编码
+
+    Yields:
+        SqlStatement
+    """
+    if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+        with open(source, "rb") as f:
+            yield from iter_sql_statements(f, chunk_size, encoding)
+        return
+
+    splitter = SqlSplitter()
+    for line in iter_lines(source, chunk_size, encoding):
+        yield from splitter.feed_line(line)
+    statement = splitter.finish()
+    if statement is not None:
+        yield statement
@@ -1,27 +1,346 @@
+import os
+import time
+import asyncio
+import contextlib
 
-from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
 from langchain_core.tools import BaseTool
+from mcp import ClientSession, McpError
+from mcp.client.streamable_http import streamablehttp_client
+from mcp.types import ServerNotification, ToolListChangedNotification
+
+# MCP 服务地址
+MCP_SERVER_URL = os.getenv("LIQUIBASE_AGENT_MCP_URL", "http://127.0.0.1:3000/mcp")
+# 连接池中最多保持的会话数
+MCP_POOL_SIZE = int(os.getenv("LIQUIBASE_AGENT_MCP_POOL_SIZE", "4"))
+# 会话空闲超过该时间(秒)后, 再次使用前先 ping 检查
+MCP_HEALTH_CHECK_INTERVAL = float(
+    os.getenv("LIQUIBASE_AGENT_MCP_HEALTH_CHECK_INTERVAL", "30")
+)
+MCP_CONNECT_TIMEOUT = float(os.getenv("LIQUIBASE_AGENT_MCP_CONNECT_TIMEOUT", "10"))
+# 只供服务内部使用, 不暴露给大模型的工具
+INTERNAL_TOOLS = {"schema-fingerprint", "server-stats", "invalidate-privilege-cache"}
+# 只读的工具, 调用过程中连接断开时可以安全地重试
+# 其它工具(验证会执行变更, create_change_id 会分配编号)只在请求没有发出时重试
+READ_ONLY_TOOLS = {
+    "query-affected-data-of-update",
+    "estimate-affected-rows",
+    "schema-fingerprint",
+    "server-stats",
+}
 
 
 class LiquibaseTool(BaseTool):
-    name = "liquibase"
-    description = "用于执行 Liquibase 相关操作的工具" 
+    name: str = "liquibase"
+    description: str = "用于执行 Liquibase 相关操作的工具"
+
+
+class LatencyCounter:
+    """记录次数、失败次数和耗时"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    @contextlib.contextmanager
+    def measure(self):
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_seconds": round(self.total_seconds, 6),
+            "avg_seconds": round(self.total_seconds / self.count, 6)
+            if self.count
+            else 0.0,
+            "max_seconds": round(self.max_seconds, 6),
+        }
+
+
+class _PooledSession:
+    """
+    一个常驻的 streamable-http MCP 会话
+
+    anyio 的上下文必须在同一个 task 中进入和退出,
+    所以会话在独立的 task 中打开, 直到 close 时才退出。
+    """
+
+    def __init__(self, url: str, message_handler):
+        self.url = url
+        self.session: ClientSession | None = None
+        self.last_used = time.monotonic()
+        self.broken = False
+        self._message_handler = message_handler
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def open(self, timeout: float):
+        self._task = asyncio.create_task(self._serve())
+        ready = asyncio.create_task(self._ready.wait())
+        done, _ = await asyncio.wait(
+            {self._task, ready}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+        )
+        if not self._ready.is_set():
+            ready.cancel()
+            if self._task in done:
+                # 抛出连接失败的原因
+                self._task.result()
+            await self.close()
+            raise ConnectionError(f"连接 MCP 服务 {self.url} 失败")
+
+    async def _serve(self):
+        async with streamablehttp_client(self.url) as (read, write, _):
+            async with ClientSession(
+                read, write, message_handler=self._message_handler
+            ) as session:
+                await session.initialize()
+                self.session = session
+                self._ready.set()
+                await self._closing.wait()
+
+    @property
+    def alive(self) -> bool:
+        return not self.broken and self._task is not None and not self._task.done()
+
+    async def ping(self, timeout: float) -> bool:
+        if not self.alive:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout)
+            return True
+        except Exception:
+            return False
+
+    async def close(self):
+        self._closing.set()
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._task, 5)
+        except BaseException:
+            self._task.cancel()
+
+
+class MCPClientPool:
+    """
+    MCP 客户端连接池
+
+    会话在多次 agent 调用之间复用, 空闲过久的会话使用前先做健康检查,
+    连接失败时丢弃并重连, 并分别统计会话建立和工具调用的耗时。
+    """
+
+    def __init__(
+        self,
+        url: str = MCP_SERVER_URL,
+        size: int = MCP_POOL_SIZE,
+        health_check_interval: float = MCP_HEALTH_CHECK_INTERVAL,
+        connect_timeout: float = MCP_CONNECT_TIMEOUT,
+    ):
+        self.url = url
+        self.size = max(1, size)
+        self.health_check_interval = health_check_interval
+        self.connect_timeout = connect_timeout
+        self.connection = {"transport": "streamable_http", "url": url}
+        self.latency = {
+            "session_setup": LatencyCounter(),
+            "health_check": LatencyCounter(),
+            "list_tools": LatencyCounter(),
+            "call_tool": LatencyCounter(),
+        }
+        self.reconnects = 0
+        self._idle: list[_PooledSession] = []
+        self._opened = 0
+        self._cond: asyncio.Condition | None = None
+        self._tool_change_listeners = []
+
+    def add_tool_change_listener(self, callback):
+        """服务端通知工具列表变化时回调"""
+        self._tool_change_listeners.append(callback)
+
+    async def _on_message(self, message):
+        if isinstance(message, ServerNotification) and isinstance(
+            message.root, ToolListChangedNotification
+        ):
+            for callback in self._tool_change_listeners:
+                callback()
+
+    def _get_cond(self) -> asyncio.Condition:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def _connect(self) -> _PooledSession:
+        pooled = _PooledSession(self.url, self._on_message)
+        with self.latency["session_setup"].measure():
+            await pooled.open(self.connect_timeout)
+        return pooled
+
+    async def _acquire(self) -> _PooledSession:
+        cond = self._get_cond()
+        async with cond:
+            while not self._idle and self._opened >= self.size:
+                await cond.wait()
+            if self._idle:
+                pooled = self._idle.pop()
+            else:
+                pooled = None
+                self._opened += 1
+
+        try:
+            if pooled is not None and not await self._healthy(pooled):
+                await pooled.close()
+                pooled = None
+                self.reconnects += 1
+            if pooled is None:
+                pooled = await self._connect()
+        except BaseException:
+            async with cond:
+                self._opened -= 1
+                cond.notify()
+            raise
+        return pooled
+
+    async def _healthy(self, pooled: _PooledSession) -> bool:
+        if not pooled.alive:
+            return False
+        if time.monotonic() - pooled.last_used < self.health_check_interval:
+            return True
+        with self.latency["health_check"].measure():
+            return await pooled.ping(self.connect_timeout)
+
+    async def _release(self, pooled: _PooledSession):
+        pooled.last_used = time.monotonic()
+        cond = self._get_cond()
+        if not pooled.alive:
+            await pooled.close()
+            async with cond:
+                self._opened -= 1
+                cond.notify()
+            return
+        async with cond:
+            self._idle.append(pooled)
+            cond.notify()
+
+    @contextlib.asynccontextmanager
+    async def session(self):
+        """从连接池中借出一个已初始化的 ClientSession"""
+        pooled = await self._acquire()
+        try:
+            yield pooled.session
+        except McpError:
+            # 协议层面的错误, 会话本身仍然可用
+            raise
+        except Exception:
+            pooled.broken = True
+            raise
+        finally:
+            await self._release(pooled)
+
+    async def _with_retry(self, counter: str, func, idempotent: bool = True):
+        # 连接断开时重连后重试一次
+        # 不是幂等的调用, 只有在请求还没有发出(借出会话失败)时才重试
+        for attempt in range(2):
+            sent = False
+            try:
+                async with self.session() as session:
+                    with self.latency[counter].measure():
+                        sent = True
+                        return await func(session)
+            except McpError:
+                raise
+            except Exception:
+                if attempt == 1 or (sent and not idempotent):
+                    raise
+                self.reconnects += 1
+
+    async def list_mcp_tools(self):
+        async def _list(session: ClientSession):
+            tools = []
+            cursor = None
+            while True:
+                page = await session.list_tools(cursor=cursor)
+                tools.extend(page.tools)
+                cursor = page.nextCursor
+                if not cursor:
+                    return tools
+
+        return await self._with_retry("list_tools", _list)
+
+    async def call_tool(self, name: str, arguments: dict):
+        return await self._with_retry(
+            "call_tool",
+            lambda session: session.call_tool(name, arguments),
+            idempotent=name in READ_ONLY_TOOLS,
+        )
+
+    async def _intercept(self, request, handler):
+        # 不走 langchain_mcp_adapters 每次新建会话的逻辑, 改用连接池中的会话
+        return await self.call_tool(request.name, request.args)
+
+    async def get_tools(self) -> list[BaseTool]:
+        tools = await self.list_mcp_tools()
+        return [
+            convert_mcp_tool_to_langchain_tool(
+                None,
+                tool,
+                connection=self.connection,
+                tool_interceptors=[self._intercept],
+                server_name="database",
+            )
+            for tool in tools
+            if tool.name not in INTERNAL_TOOLS
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "size": self.size,
+            "opened": self._opened,
+            "idle": len(self._idle),
+            "reconnects": self.reconnects,
+            "latency": {name: c.to_dict() for name, c in self.latency.items()},
+        }
+
+    async def close(self):
+        cond = self._get_cond()
+        async with cond:
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+        for pooled in idle:
+            await pooled.close()
+
+
+_mcp_pool: MCPClientPool | None = None
+
+
+def get_mcp_pool() -> MCPClientPool:
+    """进程级共享的 MCP 连接池"""
+    global _mcp_pool
+    if _mcp_pool is None:
+        _mcp_pool = MCPClientPool()
+    return _mcp_pool
 
 
 async def list_tools() -> list[BaseTool]:
     """
     列出 MCP 客户端中的所有工具
-    """ 
-    client = MultiServerMCPClient({
-            "database": {
-                "transport": "streamable_http",
-                # Replace with your actual server URL and port
-                "url": "http://127.0.0.1:3000/mcp",
-            }
-    })
-
+    """
     # Load tools from your MCP server
-    tools = await client.get_tools()
+    tools = await get_mcp_pool().get_tools()
     # Print available tools
     for tool in tools:
         print(f"Tool: {tool.name}")
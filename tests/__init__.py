@@ -0,0 +1,3 @@
+# SPDX-FileCopyrightText: 2025-present jerry <jerrytekton@gmail.com>
+#
+# SPDX-License-Identifier: MIT
@@ -0,0 +1,52 @@
+import pytest
+
+from liquibase_agent.agent.result_cache import (
+    CHANGESET_ID_PLACEHOLDER,
+    ChangesetResultCache,
+    is_cacheable,
+    to_cache_template,
+)
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "CREATE TABLE t (id INT)",
+        "alter table t add column a int;",
+        "DROP INDEX idx_a ON t",
+        "INSERT INTO t (id, a) VALUES (1, 'UPDATE')",
+        "/* 新增字段 */ -- 说明\n  ALTER TABLE t ADD COLUMN b INT",
+    ],
+)
+def test_cacheable_statements(sql):
+    assert is_cacheable(sql)
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        # 回滚语句是从生产库读取的旧值
+        "UPDATE t SET a = 1 WHERE id = 1",
+        "delete from t where id = 1",
+        "REPLACE INTO t (id, a) VALUES (1, 2)",
+        "INSERT INTO t (id, a) VALUES (1, 2) ON DUPLICATE KEY UPDATE a = 2",
+        "WITH x AS (SELECT 1) UPDATE t SET a = 1",
+        "-- ALTER TABLE t ADD b INT\nUPDATE t SET a = 1",
+        "",
+    ],
+)
+def test_statements_with_rollback_from_production_are_not_cached(sql):
+    assert not is_cacheable(sql)
+
+
+def test_template_replaces_changeset_ids(tmp_path):
+    changeset = "--liquibase formatted sql\n--changeset admin:T-app-20260101-001\nALTER TABLE t ADD b INT;\n"
+    template = to_cache_template(changeset)
+    assert "T-app-20260101-001" not in template
+    assert f"--changeset admin:{CHANGESET_ID_PLACEHOLDER}" in template
+    assert to_cache_template("ALTER TABLE t ADD b INT;") is None
+
+    cache = ChangesetResultCache(str(tmp_path / "cache.db"))
+    cache.put("key", template)
+    assert cache.get("key") == template
+    assert cache.get("missing") is None
@@ -0,0 +1,126 @@
+import io
+
+import pytest
+
+from liquibase_agent.sql.splitter import SqlSplitter, iter_lines, iter_sql_statements
+
+
+def split(text: str, chunk_size: int = 64 * 1024):
+    return [(s.sql, s.line, s.end_line) for s in iter_sql_statements(io.StringIO(text), chunk_size)]
+
+
+def sqls(text: str) -> list[str]:
+    return [sql for sql, _, _ in split(text)]
+
+
+def test_simple_statements():
+    assert sqls("SELECT 1;\nSELECT 2;\n") == ["SELECT 1", "SELECT 2"]
+
+
+def test_last_statement_without_delimiter():
+    assert sqls("SELECT 1;\nSELECT 2") == ["SELECT 1", "SELECT 2"]
+
+
+def test_empty_statements_are_skipped():
+    assert sqls(";;\n  ;\nSELECT 1;;\n") == ["SELECT 1"]
+
+
+@pytest.mark.parametrize("quote", ["'", '"', "`"])
+def test_delimiter_inside_quotes(quote):
+    text = f"INSERT INTO t VALUES ({quote}a;b{quote});\nSELECT 1;\n"
+    assert sqls(text) == [f"INSERT INTO t VALUES ({quote}a;b{quote})", "SELECT 1"]
+
+
+def test_doubled_quotes():
+    assert sqls("SELECT 'it''s; fine';\nSELECT \"a\"\"b;\";\n") == [
+        "SELECT 'it''s; fine'",
+        'SELECT "a""b;"',
+    ]
+
+
+def test_backslash_escape_in_string():
+    assert sqls("SELECT 'a\\';b';\nSELECT 2;\n") == ["SELECT 'a\\';b'", "SELECT 2"]
+
+
+def test_backslash_is_not_escape_in_backticks():
+    assert sqls("SELECT `a\\`;SELECT 2;\n") == ["SELECT `a\\`", "SELECT 2"]
+
+
+def test_quote_spanning_lines():
+    assert split("INSERT INTO t VALUES ('a;\nb');\n") == [("INSERT INTO t VALUES ('a;\nb')", 1, 2)]
+
+
+def test_block_comment_is_kept():
+    assert sqls("SELECT /*+ MAX_EXECUTION_TIME(1) ; */ 1;\n") == ["SELECT /*+ MAX_EXECUTION_TIME(1) ; */ 1"]
+
+
+def test_block_comment_spanning_lines():
+    assert sqls("/* a;\n b; */\nSELECT 1;\n") == ["/* a;\n b; */\nSELECT 1"]
+
+
+def test_comment_only_input_has_no_statement():
+    assert sqls("/* nothing */\n-- nothing;\n# nothing;\n") == []
+
+
+@pytest.mark.parametrize("comment", ["-- x; y", "#x; y", "--"])
+def test_line_comments_are_dropped(comment):
+    assert sqls(f"SELECT 1 {comment}\n, 2;\n") == ["SELECT 1 \n, 2"]
+
+
+def test_double_dash_without_space_is_not_comment():
+    assert sqls("SELECT 1--1;\n") == ["SELECT 1--1"]
+
+
+def test_comment_markers_inside_quotes():
+    assert sqls("SELECT '-- a', '# b', '/* c';\n") == ["SELECT '-- a', '# b', '/* c'"]
+
+
+def test_delimiter_switching():
+    text = (
+        "DELIMITER $$\n"
+        "CREATE PROCEDURE p()\n"
+        "BEGIN\n"
+        "  SELECT 1;\n"
+        "  SELECT 2;\n"
+        "END$$\n"
+        "DELIMITER ;\n"
+        "SELECT 3;\n"
+    )
+    assert split(text) == [
+        ("CREATE PROCEDURE p()\nBEGIN\n  SELECT 1;\n  SELECT 2;\nEND", 2, 6),
+        ("SELECT 3", 8, 8),
+    ]
+
+
+def test_delimiter_keyword_inside_statement_is_not_switch():
+    assert sqls("SELECT\nDELIMITER;\n") == ["SELECT\nDELIMITER"]
+
+
+def test_line_numbers():
+    text = "\n\nSELECT 1;\n-- comment\nUPDATE t\nSET a = 1\nWHERE b = 2;SELECT 3;\n"
+    assert split(text) == [
+        ("SELECT 1", 3, 3),
+        ("UPDATE t\nSET a = 1\nWHERE b = 2", 5, 7),
+        ("SELECT 3", 7, 7),
+    ]
+
+
+def test_small_chunks_give_same_result():
+    text = "INSERT INTO t VALUES ('a;b', \"c\");\n/* x */ SELECT 1; -- y\nSELECT 'é';\n" * 5
+    assert split(text, chunk_size=3) == split(text)
+
+
+def test_binary_stream():
+    data = "SELECT 'é';\nSELECT 2;\n".encode("utf-8")
+    assert [s.sql for s in iter_sql_statements(io.BytesIO(data), 1)] == ["SELECT 'é'", "SELECT 2"]
+
+
+def test_iter_lines_keeps_newlines():
+    assert list(iter_lines(io.StringIO("a\nbb\n\nc"), chunk_size=2)) == ["a\n", "bb\n", "\n", "c"]
+
+
+def test_feed_line_returns_finished_statements():
+    splitter = SqlSplitter()
+    statements = splitter.feed_line("SELECT 1; SELECT\n")
+    assert [s.sql for s in statements] == ["SELECT 1"]
+    assert splitter.finish().sql == "SELECT"
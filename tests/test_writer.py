@@ -0,0 +1,74 @@
+import re
+
+import pytest
+
+from liquibase_agent.job.writer import ChangelogWriter, WriterLockedError
+
+
+def changeset(idx: int) -> str:
+    return f"--changeset admin:T-app-{idx:03d}\nUPDATE t SET a = {idx} WHERE id = {idx};"
+
+
+def order(path) -> list[int]:
+    return [int(n) for n in re.findall(r"T-app-(\d+)", path.read_text(encoding="utf-8"))]
+
+
+def make_writer(tmp_path, **kwargs) -> ChangelogWriter:
+    return ChangelogWriter("app", key="0123456789abcdef", directory=str(tmp_path), **kwargs)
+
+
+def test_commit_writes_changesets(tmp_path):
+    writer = make_writer(tmp_path)
+    assert writer.open() == set()
+    for idx in (1, 2, 3):
+        writer.append(idx, changeset(idx))
+    file_name = writer.commit()
+
+    path = tmp_path / file_name
+    assert path.read_text(encoding="utf-8").startswith("--liquibase formatted sql\n")
+    assert order(path) == [1, 2, 3]
+    assert [p.name for p in tmp_path.iterdir()] == [file_name]
+
+
+def test_resume_fills_gap_in_statement_order(tmp_path):
+    writer = make_writer(tmp_path)
+    writer.open()
+    # 第 2 条生成失败, 不记录
+    for idx in (1, 3, 4):
+        writer.append(idx, changeset(idx))
+    writer.close()
+
+    resumed = make_writer(tmp_path)
+    assert resumed.open() == {1, 3, 4}
+    resumed.append(2, changeset(2))
+    resumed.append(5, changeset(5))
+    file_name = resumed.commit()
+
+    # 重新生成的第 2 条写在第 3、4 条之后, 最终文件仍按 sql 的顺序
+    assert order(tmp_path / file_name) == [1, 2, 3, 4, 5]
+
+
+def test_resume_drops_unsynced_tail(tmp_path):
+    writer = make_writer(tmp_path, fsync_every=100, fsync_interval=3600)
+    writer.open()
+    writer.append(1, changeset(1))
+    writer.sync()
+    writer.append(2, changeset(2))
+    # 模拟崩溃: 第 2 条已经写入 .part, 但还没有 fsync 和记录 index
+    writer._file.flush()
+
+    resumed = make_writer(tmp_path)
+    writer._index.close()
+    writer._file.close()
+    assert resumed.open() == {1}
+    resumed.append(2, changeset(2))
+    assert order(tmp_path / resumed.commit()) == [1, 2]
+
+
+def test_second_writer_is_rejected(tmp_path):
+    writer = make_writer(tmp_path)
+    writer.open()
+    with pytest.raises(WriterLockedError):
+        make_writer(tmp_path).open()
+    writer.close()
+    assert make_writer(tmp_path).open() == set()